@@ -1,8 +1,10 @@
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from db_control import models, schemas, crud, connect
-from db_control.routers import login, tablet, answers, question, user_info, recommend, priority, call_sales, store
+from db_control import models, schemas, crud, connect, bootstrap, metrics
+from db_control.logic.sales_call_dispatcher import get_dispatcher
+from db_control.routers import login, tablet, answers, question, user_info, recommend, priority, call_sales, store, admin, session
+from db_control.routers import metrics as metrics_router
 import os
 from dotenv import load_dotenv
 
@@ -22,8 +24,30 @@ app.add_middleware(
     allow_headers=["*"] # すべてのHTTPヘッダーを許可
 )
 
-# DB初期化
-models.Base.metadata.create_all(bind=connect.engine)
+# リクエストごとの所要時間・SQL 件数・外部呼び出し時間の計測（/metrics で出力）
+metrics.instrument_engine(connect.engine)
+connect.async_engine_hooks.append(metrics.instrument_engine)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# DB初期化（テーブル・インデックスの作成と確認。DB_BOOTSTRAP_ON_STARTUP=false なら行わない）
+# コネクションプールは起動を待たせないようにバックグラウンドで温めておく
+@app.on_event("startup")
+def startup_db():
+    if bootstrap.DB_BOOTSTRAP_ON_STARTUP:
+        bootstrap.bootstrap_schema()
+    connect.warm_up_pool_in_background()
+
+# 店員呼び出し通知の送信処理（outbox を読んで Slack に送る）
+SALES_CALL_DISPATCHER_ENABLED = os.getenv("SALES_CALL_DISPATCHER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+@app.on_event("startup")
+def start_sales_call_dispatcher():
+    if SALES_CALL_DISPATCHER_ENABLED:
+        get_dispatcher().start()
+
+@app.on_event("shutdown")
+def stop_sales_call_dispatcher():
+    get_dispatcher().stop()
 
 # ルーターを追加
 app.include_router(login.router)
@@ -35,6 +59,9 @@ app.include_router(answers.router)
 app.include_router(recommend.router)
 app.include_router(priority.router)
 app.include_router(call_sales.router)
+app.include_router(session.router)
+app.include_router(admin.router)
+app.include_router(metrics_router.router)
 
 
 @app.get("/")
@@ -0,0 +1,201 @@
+# ベンチマーク用の合成データ生成
+# カテゴリ・評価項目・設問・商品・店舗（タブレット・在庫・キャラクター）・採点ルールを指定件数で作成する
+#
+#   python benchmarks/catalog_generator.py --database-url sqlite:////tmp/bench.db --products 2000
+#
+# 既存のデータベースに対しては実行しないこと（空のデータベースを前提に ID を振る）
+import argparse
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LEVELS = [1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]
+BRANDS = ["Panasonic", "SHARP", "HITACHI", "TOSHIBA", "MITSUBISHI", "SONY"]
+
+
+# 生成件数の設定（products はカテゴリあたりの商品数）
+class GeneratorConfig:
+    def __init__(
+        self,
+        categories: int = 3,
+        products: int = 500,
+        metrics: int = 9,
+        questions: int = 11,
+        options: int = 2,
+        stores: int = 5,
+        tablets: int = 2,
+        stock_ratio: float = 0.6,
+        seed: int = 0
+    ):
+        self.categories = categories
+        self.products = products
+        self.metrics = metrics
+        self.questions = questions
+        self.options = options
+        self.stores = stores
+        self.tablets = tablets
+        self.stock_ratio = stock_ratio
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def _insert(conn, model, rows: list, chunk: int = 5000):
+    for start in range(0, len(rows), chunk):
+        conn.execute(model.__table__.insert(), rows[start:start + chunk])
+
+
+# 合成データを投入し、ベンチマークの操作に必要な ID を返す
+def generate(engine, config: GeneratorConfig) -> dict:
+    import bcrypt
+    from db_control import models
+
+    rng = random.Random(config.seed)
+    password = bcrypt.hashpw(b"password", bcrypt.gensalt(4)).decode()
+
+    categories, metrics, questions, options, rules = [], [], [], [], []
+    products, product_metrics = [], []
+    category_questions = {}
+    product_id = 0
+    for c in range(1, config.categories + 1):
+        categories.append({"id": c, "name": f"カテゴリ{c}"})
+        metric_ids = [(c - 1) * config.metrics + m for m in range(1, config.metrics + 1)]
+        metrics += [{"id": mid, "category_id": c, "name": f"評価項目{mid}"} for mid in metric_ids]
+
+        question_ids = [(c - 1) * config.questions + q for q in range(1, config.questions + 1)]
+        category_questions[c] = question_ids
+        for qid in question_ids:
+            questions.append({"id": qid, "category_id": c, "question_text": f"設問{qid}"})
+            for value in range(config.options):
+                options.append({"question_id": qid, "label": f"選択肢{value}", "value": value})
+                # 回答ごとに1〜2個の評価項目を加減点する
+                for mid in rng.sample(metric_ids, k=min(2, len(metric_ids))):
+                    rules.append({
+                        "question_id": qid,
+                        "value": value,
+                        "metrics_id": mid,
+                        "delta": rng.choice([0.25, 0.25, 0.5, -0.25]),
+                    })
+
+        for _ in range(config.products):
+            product_id += 1
+            products.append({
+                "id": product_id,
+                "name": f"商品{product_id}",
+                "brand": rng.choice(BRANDS),
+                "price": rng.randrange(10000, 400000, 100),
+                "width": round(rng.uniform(30, 90), 1),
+                "depth": round(rng.uniform(30, 80), 1),
+                "height": round(rng.uniform(40, 190), 1),
+                "description": f"合成データの商品{product_id}",
+                "image": f"products/{product_id}.png",
+                "category_id": c,
+            })
+            product_metrics += [
+                {"product_id": product_id, "metrics_id": mid, "level": rng.choice(LEVELS)}
+                for mid in metric_ids
+            ]
+
+    stores, tablets, characters, stocks = [], [], [], []
+    store_tablets = {}
+    for s in range(1, config.stores + 1):
+        stores.append({"id": s, "name": f"店舗{s}", "password": password, "prefecture": "東京都", "is_available": True})
+        characters.append({
+            "store_id": s,
+            "name": f"キャラクター{s}",
+            "image": f"characters/{s}.png",
+            "video": f"characters/{s}.mp4",
+            "voice_1": f"characters/{s}_1.mp3",
+            "voice_2": f"characters/{s}_2.mp3",
+            "message_1": "いらっしゃいませ",
+            "message_2": "お探しの商品はありますか？",
+        })
+        store_tablets[s] = [f"tablet-{s}-{t}" for t in range(1, config.tablets + 1)]
+        tablets += [
+            {"uuid": uuid, "store_id": s, "area": f"エリア{t}", "floor": f"{t}F"}
+            for t, uuid in enumerate(store_tablets[s], start=1)
+        ]
+        stocks += [
+            {"store_id": s, "product_id": pid, "number": rng.randint(1, 10)}
+            for pid in range(1, product_id + 1)
+            if rng.random() < config.stock_ratio
+        ]
+
+    with engine.begin() as conn:
+        _insert(conn, models.Category, categories)
+        _insert(conn, models.Metric, metrics)
+        _insert(conn, models.Question, questions)
+        _insert(conn, models.QuestionOption, options)
+        _insert(conn, models.ScoringRule, rules)
+        _insert(conn, models.Product, products)
+        _insert(conn, models.ProductMetrics, product_metrics)
+        _insert(conn, models.Store, stores)
+        _insert(conn, models.BicGirl, characters)
+        _insert(conn, models.Tablet, tablets)
+        _insert(conn, models.Stock, stocks)
+
+    return {
+        "categories": {c: category_questions[c] for c in category_questions},
+        "options": config.options,
+        "stores": store_tablets,
+        "counts": {
+            "categories": len(categories),
+            "metrics": len(metrics),
+            "questions": len(questions),
+            "scoring_rules": len(rules),
+            "products": len(products),
+            "product_metrics": len(product_metrics),
+            "stores": len(stores),
+            "tablets": len(tablets),
+            "stock": len(stocks),
+        },
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--categories", type=int, default=3)
+    parser.add_argument("--products", type=int, default=500, help="カテゴリあたりの商品数")
+    parser.add_argument("--metrics", type=int, default=9, help="カテゴリあたりの評価項目数")
+    parser.add_argument("--questions", type=int, default=11, help="カテゴリあたりの設問数")
+    parser.add_argument("--options", type=int, default=2, help="設問あたりの選択肢数")
+    parser.add_argument("--stores", type=int, default=5)
+    parser.add_argument("--tablets", type=int, default=2, help="店舗あたりのタブレット数")
+    parser.add_argument("--stock-ratio", type=float, default=0.6, help="店舗で在庫のある商品の割合")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args) -> GeneratorConfig:
+    return GeneratorConfig(
+        categories=args.categories,
+        products=args.products,
+        metrics=args.metrics,
+        questions=args.questions,
+        options=args.options,
+        stores=args.stores,
+        tablets=args.tablets,
+        stock_ratio=args.stock_ratio,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成データを投入")
+    parser.add_argument("--database-url", required=True)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    from db_control import bootstrap, connect
+
+    bootstrap.bootstrap_schema()
+    result = generate(connect.engine, config_from_args(args))
+    print(json.dumps(result["counts"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
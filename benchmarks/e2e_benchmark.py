@@ -0,0 +1,265 @@
+# オフラインのエンドツーエンドベンチマーク
+# 合成データを投入したローカルの SQLite に対して FastAPI アプリを起動し、
+# キオスクの一連の操作（user_info → question → answers → score → priority → confirm → call_sales）を実行する。
+# Slack 送信と Blob の SAS 署名はスタブに置き換える（外部へは接続しない）
+#
+#   python benchmarks/e2e_benchmark.py --products 2000 --sessions 300 --concurrency 4 --output e2e.json
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import catalog_generator  # noqa: E402
+
+ENDPOINTS = [
+    "POST /user_info",
+    "GET /question/{category_id}",
+    "POST /answers",
+    "POST /recommend/score",
+    "POST /priority",
+    "POST /recommend/confirm",
+    "POST /call_sales",
+]
+
+ERROR_SAMPLES = 3
+
+
+# Slack Webhook のスタブ（送信内容は捨てて件数だけ数える）
+class StubSlackSession:
+    class Response:
+        status_code = 200
+        text = "ok"
+
+    def __init__(self):
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, timeout=None):
+        with self._lock:
+            self.sent += 1
+        return self.Response()
+
+
+def install_stubs() -> StubSlackSession:
+    from db_control.logic import sas_signer
+    from db_control.logic.sales_call_dispatcher import get_dispatcher
+
+    # 署名計算の代わりに固定の URL を返す（キャッシュの挙動はそのまま）
+    class StubSigner(sas_signer.SasSigner):
+        def _generate(self, blob_name, now):
+            self.signs += 1
+            return f"https://stub.blob.core.windows.net/{self.container_name}/{blob_name}?sig=stub"
+
+    sas_signer._signer = StubSigner("stub", "stub", "media")
+    slack = StubSlackSession()
+    get_dispatcher()._http = slack
+    return slack
+
+
+# 最近傍順位法によるパーセンタイル
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+        # エラー内容の例（エンドポイントごとに最初の数件だけ）
+        self.error_samples = {endpoint: [] for endpoint in ENDPOINTS}
+        # 計測の有無に関係なく成功した回数（通知の到着待ちに使う）
+        self.succeeded = {endpoint: 0 for endpoint in ENDPOINTS}
+        self._lock = threading.Lock()
+        self.enabled = True
+
+    # 失敗したら記録して None を返す（呼び出し側はその操作の残りを打ち切る）
+    def call(self, endpoint: str, send):
+        started = time.perf_counter()
+        try:
+            response = send()
+            error = f"{response.status_code}: {response.text[:200]}" if response.status_code >= 400 else None
+        except Exception as e:
+            response, error = None, f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if error is None:
+                self.succeeded[endpoint] += 1
+            if self.enabled:
+                self.latencies[endpoint].append(elapsed)
+                if error is not None:
+                    self.errors[endpoint] += 1
+                    if len(self.error_samples[endpoint]) < ERROR_SAMPLES:
+                        self.error_samples[endpoint].append(error)
+        return None if error is not None else response
+
+    def summary(self, concurrency: int) -> dict:
+        result = {}
+        for endpoint in ENDPOINTS:
+            values = sorted(self.latencies[endpoint])
+            busy = sum(values)
+            result[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "error_samples": self.error_samples[endpoint],
+                "mean_ms": busy / len(values) * 1000 if values else 0.0,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000 if values else 0.0,
+                # このエンドポイントだけを同じ並列度で処理し続けた場合の処理能力
+                "throughput_rps": len(values) / busy * concurrency if busy else 0.0,
+            }
+        return result
+
+
+# 1人分のキオスク操作（途中で失敗したらその操作の残りは行わない）
+def run_session(client, recorder: Recorder, data: dict, rng: random.Random):
+    store_id = rng.choice(list(data["stores"]))
+    uuid = rng.choice(data["stores"][store_id])
+    category_id = rng.choice(list(data["categories"]))
+    question_ids = data["categories"][category_id]
+    choices = [(qid, rng.randrange(data["options"])) for qid in question_ids]
+
+    response = recorder.call("POST /user_info", lambda: client.post("/user_info", json={
+        "store_id": store_id,
+        "category_id": category_id,
+        "age": rng.randint(18, 80),
+        "gender": rng.choice(["male", "female", "other"]),
+        "household": rng.randint(1, 5),
+    }))
+    if response is None:
+        return
+    reception_id = response.json()["reception_id"]
+
+    if recorder.call("GET /question/{category_id}", lambda: client.get(f"/question/{category_id}")) is None:
+        return
+
+    if recorder.call("POST /answers", lambda: client.post("/answers", json={
+        "receptionId": reception_id,
+        "answers": [{"questionId": qid, "answer": value} for qid, value in choices],
+    })) is None:
+        return
+
+    response = recorder.call("POST /recommend/score", lambda: client.post("/recommend/score", json={
+        "receptionId": reception_id,
+        "answers": [{"questionId": qid, "value": value} for qid, value in choices],
+    }))
+    if response is None:
+        return
+    priorities = response.json()["priorities"]
+
+    if recorder.call("POST /priority", lambda: client.post("/priority", json={
+        "priorities": [
+            {"reception_id": reception_id, "metrics_id": p["metricsId"], "level": p["score"]}
+            for p in priorities
+        ],
+    })) is None:
+        return
+
+    if recorder.call("POST /recommend/confirm", lambda: client.post("/recommend/confirm", json={
+        "receptionId": reception_id,
+        "scores": {p["metricsId"]: p["score"] for p in priorities},
+    })) is None:
+        return
+
+    recorder.call("POST /call_sales", lambda: client.post("/call_sales", json={
+        "reception_id": reception_id,
+        "uuid": uuid,
+        "frontend_url": f"http://localhost:3000/staff/{reception_id}",
+    }))
+
+
+def run_sessions(client, recorder: Recorder, data: dict, sessions: int, concurrency: int, seed: int) -> float:
+    started = time.perf_counter()
+    if concurrency <= 1:
+        rng = random.Random(seed)
+        for _ in range(sessions):
+            run_session(client, recorder, data, rng)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(run_session, client, recorder, data, random.Random(seed + i))
+                for i in range(sessions)
+            ]
+            for future in futures:
+                future.result()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="キオスク操作のエンドツーエンドベンチマーク")
+    catalog_generator.add_arguments(parser)
+    parser.add_argument("--sessions", type=int, default=200, help="計測するキオスク操作の回数")
+    parser.add_argument("--warmup", type=int, default=20, help="計測前に捨てる操作の回数")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--database", help="SQLite ファイルのパス（未指定なら一時ファイル）")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.database) if args.database else os.path.join(tempfile.mkdtemp(prefix="bic-bench-"), "bench.db")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    # アプリの import より前に接続先・スタブ用の設定を決める
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("SLACK_WEBHOOK_URL", "https://hooks.slack.invalid/benchmark")
+    os.environ.setdefault("DB_POOL_SIZE", str(max(args.concurrency, 5)))
+
+    from fastapi.testclient import TestClient
+    from db_control import bootstrap, connect
+
+    bootstrap.bootstrap_schema()
+    seeded = time.perf_counter()
+    config = catalog_generator.config_from_args(args)
+    data = catalog_generator.generate(connect.engine, config)
+    seed_seconds = time.perf_counter() - seeded
+
+    import app
+    slack = install_stubs()
+    recorder = Recorder()
+    # サーバー側の例外も 500 のレスポンスとして受け取り、エラーとして数える
+    with TestClient(app.app, raise_server_exceptions=False) as client:
+        recorder.enabled = False
+        run_sessions(client, recorder, data, args.warmup, args.concurrency, args.seed + 1_000_000)
+        recorder.enabled = True
+        wall = run_sessions(client, recorder, data, args.sessions, args.concurrency, args.seed)
+
+        # 受け付けた店員呼び出しの通知がスタブに届くまで少し待つ
+        deadline = time.monotonic() + 10
+        while slack.sent < recorder.succeeded["POST /call_sales"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    requests = sum(len(values) for values in recorder.latencies.values())
+    result = {
+        "config": {**config.to_dict(), "sessions": args.sessions, "warmup": args.warmup, "concurrency": args.concurrency},
+        "data": data["counts"],
+        "seed_seconds": seed_seconds,
+        "wall_seconds": wall,
+        "sessions_per_second": args.sessions / wall,
+        "requests_per_second": requests / wall,
+        "errors": sum(recorder.errors.values()),
+        "endpoints": recorder.summary(args.concurrency),
+        "slack_notifications": slack.sent,
+    }
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# レスポンスの JSON 出力コストのマイクロベンチマーク
+# 従来の経路（pydantic モデル作成 → response_model での再検証 → JSONResponse）と
+# FastJSONResponse（組み立て済みの辞書をそのまま orjson で出力）をルートごとに比較する
+#
+#   python benchmarks/json_benchmark.py --iterations 5000 --products 3 --output json.json
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from db_control import schemas  # noqa: E402
+from db_control.responses import HAS_ORJSON, FastJSONResponse  # noqa: E402
+
+
+# /recommend/confirm の返却値（build_product_details と同じ形）
+def confirm_payload(products: int) -> dict:
+    return {
+        "receptionId": 1,
+        "recommendedProducts": [
+            {
+                "id": i,
+                "name": f"ドラム式洗濯乾燥機 {i}",
+                "brand": "ブランド",
+                "price": 198000.0 + i,
+                "dimensions": {"width": 63.9, "depth": 72.2, "height": 105.0},
+                "description": "大容量で乾燥まで自動。静音設計でマンションにも。",
+                "category": "洗濯機",
+                "image": f"https://account.blob.core.windows.net/images/{i}.png?sv=2024-01-01&sig=abcdef",
+                "scores": {str(float(m)): 3.0 + (i + m) % 5 * 0.5 for m in range(1, 10)},
+            }
+            for i in range(1, products + 1)
+        ],
+    }
+
+
+# /recommend/score の返却値
+def score_payload() -> dict:
+    return {
+        "receptionId": 1,
+        "priorities": [
+            {"metricsId": m, "name": f"評価項目{m}", "score": 4.5 + (m % 3) * 0.25}
+            for m in range(1, 10)
+        ],
+    }
+
+
+# /login の返却値（StoreBootstrap.to_payload と同じ形）
+def login_payload() -> dict:
+    return {
+        "store_id": 1,
+        "store_name": "有楽町店",
+        "prefecture": "東京都",
+        "character": {
+            "name": "ビックガール",
+            "image": "https://account.blob.core.windows.net/media/girl.png?sig=abc",
+            "video": "https://account.blob.core.windows.net/media/girl.mp4?sig=abc",
+            "voice_1": "https://account.blob.core.windows.net/media/v1.mp3?sig=abc",
+            "voice_2": "https://account.blob.core.windows.net/media/v2.mp3?sig=abc",
+            "message_1": "いらっしゃいませ！",
+            "message_2": "お探しの商品はありますか？",
+        },
+    }
+
+
+# 従来の経路: モデルを作り、FastAPI が response_model で検証し直してから出力
+async def legacy_validated(model, payload: dict, iterations: int):
+    field = create_response_field(name="response", type_=model)
+    body = None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        content = await serialize_response(field=field, response_content=model(**payload))
+        body = JSONResponse(content).body
+    return body, (time.perf_counter() - started) / iterations * 1e6
+
+
+# 従来の経路（検証なし）: JSONResponse を手で組み立てる /recommend/score
+async def legacy_plain(model, payload: dict, iterations: int):
+    body = None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        body = JSONResponse(content=payload).body
+    return body, (time.perf_counter() - started) / iterations * 1e6
+
+
+def fast(payload: dict, iterations: int):
+    body = None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        body = FastJSONResponse(payload).body
+    return body, (time.perf_counter() - started) / iterations * 1e6
+
+
+def run_route(name: str, model, payload: dict, legacy, iterations: int) -> dict:
+    legacy_body, legacy_us = asyncio.run(legacy(model, payload, iterations))
+    fast_body, fast_us = fast(payload, iterations)
+    return {
+        "route": name,
+        "bytes": len(fast_body),
+        "legacy_us": legacy_us,
+        "fast_us": fast_us,
+        "speedup": legacy_us / fast_us if fast_us else None,
+        "identical": legacy_body == fast_body,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="レスポンス JSON 出力の比較")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=3, help="/recommend/confirm の商品数")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    result = {
+        "orjson": HAS_ORJSON,
+        "iterations": args.iterations,
+        "routes": [
+            run_route("/recommend/confirm", schemas.ConfirmRecommendationResponse,
+                      confirm_payload(args.products), legacy_validated, args.iterations),
+            run_route("/recommend/score", None, score_payload(), legacy_plain, args.iterations),
+            run_route("/login", schemas.StoreLoginResponse, login_payload(), legacy_validated, args.iterations),
+        ],
+    }
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# 近傍探索インデックス（KD 木）と全件走査の比較ベンチマーク
+# 合成カタログで上位 N 件の検索時間を比べ、結果が全件走査と一致することも確認する
+#
+#   python benchmarks/nn_index_benchmark.py --sizes 1000 10000 50000 --queries 200 --output nn_index.json
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from db_control.logic.similarity import ProductMatrix  # noqa: E402
+from db_control.logic.nn_index import BlockKDIndex  # noqa: E402
+
+
+# 商品×評価項目の合成行列（product_metrics と同じく 0.5 刻みの評価値、一部未登録）
+def synthetic_matrix(rng, products: int, metrics: int, missing: float) -> ProductMatrix:
+    levels = rng.choice(np.arange(1.0, 5.5, 0.5), size=(products, metrics))
+    levels[rng.random((products, metrics)) < missing] = np.nan
+    return ProductMatrix(np.arange(1, products + 1), np.arange(1, metrics + 1), levels)
+
+
+# 回答から算出したスコアと同じく 4.5 ± 0.25 刻みのユーザースコア
+def synthetic_users(rng, queries: int, metrics: int) -> list:
+    steps = rng.integers(-3, 4, size=(queries, metrics))
+    return [
+        {j + 1: 4.5 + 0.25 * int(step) for j, step in enumerate(row)}
+        for row in steps
+    ]
+
+
+def time_queries(search, users: list, top_n: int):
+    results = []
+    started = time.perf_counter()
+    for scores in users:
+        results.append(search(scores, top_n))
+    return results, (time.perf_counter() - started) / len(users) * 1e6
+
+
+def run_size(rng, products: int, args) -> dict:
+    matrix = synthetic_matrix(rng, products, args.metrics, args.missing)
+    users = synthetic_users(rng, args.queries, args.metrics)
+
+    started = time.perf_counter()
+    index = BlockKDIndex(matrix, leaf_size=args.leaf_size)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    brute, brute_us = time_queries(matrix.top_n, users, args.top_n)
+    indexed, index_us = time_queries(index.top_n, users, args.top_n)
+    mismatches = sum(1 for a, b in zip(brute, indexed) if a != b)
+    return {
+        "products": products,
+        "blocks": len(index),
+        "coverage": index.coverage,
+        "build_ms": build_ms,
+        "brute_us_per_query": brute_us,
+        "index_us_per_query": index_us,
+        "speedup": brute_us / index_us if index_us else None,
+        "mismatches": mismatches,
+        "identical": mismatches == 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KD 木インデックスと全件走査の比較")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000])
+    parser.add_argument("--metrics", type=int, default=9)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--leaf-size", type=int, default=256)
+    parser.add_argument("--missing", type=float, default=0.0, help="未登録の評価値の割合")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    result = {
+        "metrics": args.metrics,
+        "queries": args.queries,
+        "top_n": args.top_n,
+        "leaf_size": args.leaf_size,
+        "missing": args.missing,
+        "sizes": [run_size(rng, products, args) for products in args.sizes],
+    }
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if not all(size["identical"] for size in result["sizes"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
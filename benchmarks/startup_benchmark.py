@@ -0,0 +1,91 @@
+# 起動時間のベンチマーク
+# 新しいプロセスで app の import と startup イベントにかかる時間、
+# ワーカー1つあたりの常駐メモリ（RSS）と読み込まれた重い依存を計測する
+#
+#   python benchmarks/startup_benchmark.py --runs 5 --output startup.json
+#
+# DATABASE_URL 未指定時はローカルの SQLite（メモリ）を使う
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 起動時に読み込まれていないことを確認したいモジュール
+HEAVY_MODULES = ["numpy", "pandas", "azure.storage.blob", "requests", "bcrypt", "sqlalchemy_utils"]
+
+PROBE = r"""
+import asyncio, json, sys, time
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return 0
+
+def loaded(names):
+    return [n for n in names if n in sys.modules]
+
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+asyncio.run(app.app.router.startup())
+ready = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "rss_mb": rss_kb() / 1024,
+    "heavy_modules": loaded(%r),
+}))
+""" % HEAVY_MODULES
+
+
+def run_once(env: dict) -> dict:
+    output = subprocess.check_output([sys.executable, "-c", PROBE], cwd=ROOT, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def summarize(values: list) -> dict:
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app の import / startup 時間を計測")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    samples = [run_once(env) for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "database_url": env["DATABASE_URL"].split("@")[-1],
+        "bootstrap_on_startup": env.get("DB_BOOTSTRAP_ON_STARTUP", "true"),
+        "import_ms": summarize([s["import_ms"] for s in samples]),
+        "startup_ms": summarize([s["startup_ms"] for s in samples]),
+        "rss_mb": summarize([s["rss_mb"] for s in samples]),
+        "heavy_modules_loaded": sorted({m for s in samples for m in s["heavy_modules"]}),
+    }
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+from contextlib import contextmanager
+from typing import List
+from sqlalchemy import func, inspect, select, delete, text
+from db_control import models, connect
+import argparse
+import os
+import sys
+
+# 起動時にスキーマ作成・確認を行うか
+# 既定では起動時に行う（複数ワーカーが同時に起動しても DB のロックで1つずつ実行する）
+# false にする場合は、デプロイ前に python -m db_control.bootstrap を実行すること
+DB_BOOTSTRAP_ON_STARTUP = os.getenv("DB_BOOTSTRAP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# ロックを待つ最大秒数
+DB_BOOTSTRAP_LOCK_TIMEOUT = int(os.getenv("DB_BOOTSTRAP_LOCK_TIMEOUT", "60"))
+DB_BOOTSTRAP_LOCK_NAME = "bic_backend_bootstrap"
+
+
+# スキーマ作成中は他のワーカーを待たせる（MySQL のアドバイザリロック。SQLite はロックなし）
+@contextmanager
+def bootstrap_lock(engine):
+    if engine.dialect.name != "mysql":
+        yield
+        return
+    with engine.connect() as conn:
+        acquired = conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": DB_BOOTSTRAP_LOCK_NAME, "timeout": DB_BOOTSTRAP_LOCK_TIMEOUT}
+        ).scalar()
+        if acquired != 1:
+            raise RuntimeError(f"スキーマ作成のロックを取得できませんでした（{DB_BOOTSTRAP_LOCK_TIMEOUT}秒）")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": DB_BOOTSTRAP_LOCK_NAME})
+
+
+# データベースとテーブルを作成（既存のものはそのまま）
+def bootstrap_schema(engine=None) -> dict:
+    from sqlalchemy_utils import database_exists, create_database
+
+    engine = engine or connect.engine
+    created_database = False
+    if not database_exists(engine.url):
+        create_database(engine.url)
+        created_database = True
+
+    with bootstrap_lock(engine):
+        existing = set(inspect(engine).get_table_names())
+        models.Base.metadata.create_all(bind=engine)
+        created_tables = sorted(set(models.Base.metadata.tables) - existing)
+        priority_unique_key = ensure_priority_unique_key(engine)
+        seeded_rules = seed_scoring_rules(engine)
+    return {
+        "created_database": created_database,
+        "created_tables": created_tables,
+        "priority_unique_key": priority_unique_key,
+        "seeded_scoring_rules": seeded_rules,
+    }
+
+
+# scoring_rule が空なら従来のハードコードされたルールを登録する
+# （設問・評価項目がまだ無いルールは登録しない）
+def seed_scoring_rules(engine) -> int:
+    from db_control.logic.scoring_rules import DEFAULT_SCORING_RULES
+
+    table = models.ScoringRule.__table__
+    with engine.begin() as conn:
+        if conn.execute(select(func.count()).select_from(table)).scalar():
+            return 0
+        question_ids = set(conn.execute(select(models.Question.id)).scalars())
+        metric_ids = set(conn.execute(select(models.Metric.id)).scalars())
+        rows = [
+            {"question_id": question_id, "value": value, "metrics_id": metrics_id, "delta": delta}
+            for question_id, value, metrics_id, delta in DEFAULT_SCORING_RULES
+            if question_id in question_ids and metrics_id in metric_ids
+        ]
+        if rows:
+            conn.execute(table.insert(), rows)
+    return len(rows)
+
+
+# priority の重複行（同じ (reception_id, metrics_id) の最新 = id 最大 以外）の id
+def find_priority_duplicates(conn) -> List[int]:
+    table = models.Priority.__table__
+    keep_ids = select(func.max(table.c.id)).group_by(table.c.reception_id, table.c.metrics_id)
+    return list(conn.execute(
+        select(table.c.id).where(table.c.id.not_in(keep_ids)).order_by(table.c.id)
+    ).scalars())
+
+
+# 重複行の削除（明示的に実行する手順。起動時の bootstrap では行わない）
+#   python -m db_control.bootstrap --remove-priority-duplicates
+def remove_priority_duplicates(engine) -> List[int]:
+    table = models.Priority.__table__
+    with engine.begin() as conn:
+        removed = find_priority_duplicates(conn)
+        for start in range(0, len(removed), 1000):
+            conn.execute(delete(table).where(table.c.id.in_(removed[start:start + 1000])))
+    return removed
+
+
+# 既存の priority テーブルに (reception_id, metrics_id) の一意制約を追加
+# 重複行が残っている場合は作成せずに知らせる（削除は remove_priority_duplicates で行う）
+def ensure_priority_unique_key(engine) -> dict:
+    table = models.Priority.__table__
+    constraint = next(c for c in table.constraints if c.name == "uq_priority_reception_metrics")
+    inspector = inspect(engine)
+    names = {c["name"] for c in inspector.get_unique_constraints(table.name)}
+    names |= {i["name"] for i in inspector.get_indexes(table.name) if i.get("unique")}
+    if constraint.name in names:
+        return {"status": "exists", "duplicates": []}
+
+    with engine.begin() as conn:
+        duplicates = find_priority_duplicates(conn)
+        if duplicates:
+            print(
+                f"priority has {len(duplicates)} duplicate rows (ids: {duplicates[:20]}"
+                f"{' ...' if len(duplicates) > 20 else ''}); {constraint.name} was not created. "
+                "Run: python -m db_control.bootstrap --remove-priority-duplicates"
+            )
+            return {"status": "skipped", "duplicates": duplicates}
+        conn.exec_driver_sql(
+            f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} (reception_id, metrics_id)"
+        )
+    return {"status": "created", "duplicates": []}
+
+
+# python -m db_control.bootstrap [--remove-priority-duplicates]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="データベース・テーブルの作成と確認")
+    parser.add_argument(
+        "--remove-priority-duplicates", action="store_true",
+        help="priority の重複行（最新以外）を削除してから一意制約を作成する"
+    )
+    args = parser.parse_args()
+
+    if args.remove_priority_duplicates:
+        removed = remove_priority_duplicates(connect.engine)
+        print(f"duplicate priority rows removed: {len(removed)}")
+        if removed:
+            print(f"removed ids: {removed}")
+    result = bootstrap_schema()
+    print(f"database created: {result['created_database']}")
+    print(f"tables created: {', '.join(result['created_tables']) or '(none)'}")
+    print(f"priority unique key: {result['priority_unique_key']['status']}")
+    print(f"scoring rules seeded: {result['seeded_scoring_rules']}")
+    sys.exit(0 if result["priority_unique_key"]["status"] != "skipped" else 1)
@@ -1,8 +1,15 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy_utils import database_exists, create_database
+from sqlalchemy.pool import QueuePool, StaticPool
+from starlette.concurrency import run_in_threadpool
 import os
+import ssl
+import threading
+import time
+import zlib
 from dotenv import load_dotenv
 from db_control import models
 
@@ -15,18 +22,87 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_SSL_CERT = os.getenv("DB_SSL_CERT", "db_control/certs/DigiCertGlobalRootCA.crt.pem")
 
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL を指定するとローカルの SQLite / MySQL などに差し替えられる
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"ssl_ca": DB_SSL_CERT} 
-)
+# 非同期ドライバ用の URL（未指定なら DATABASE_URL のドライバを差し替える）
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
 
-if not database_exists(engine.url):
-    create_database(engine.url)
+# コネクションプール設定
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Azure MySQL のアイドル切断より短くする
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))  # 起動時に張っておく接続数
+
+
+# 接続の取り出し待ち時間を計測する QueuePool
+class TimedQueuePool(QueuePool):
+    wait_lock = threading.Lock()
+    wait_count = 0
+    wait_seconds_total = 0.0
+    wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            cls = type(self)
+            with cls.wait_lock:
+                cls.wait_count += 1
+                cls.wait_seconds_total += waited
+                cls.wait_seconds_max = max(cls.wait_seconds_max, waited)
+
+
+# MySQL の CRC32() を SQLite でも使えるようにする（カタログの変更検知クエリで使用）
+def _crc32(value):
+    if value is None:
+        return None
+    return zlib.crc32(str(value).encode("utf-8"))
+
+
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    dbapi_connection.create_function("CRC32", 1, _crc32, deterministic=True)
+
+
+def build_engine(url: str = DATABASE_URL):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        # テスト用の SQLite はスレッド間で接続を共有できるようにする
+        connect_args = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+            event.listen(engine, "connect", _register_sqlite_functions)
+            return engine
+    elif backend == "mysql":
+        connect_args = {"ssl_ca": DB_SSL_CERT}
+    else:
+        connect_args = {}
+
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if backend == "sqlite":
+        event.listen(engine, "connect", _register_sqlite_functions)
+    return engine
+
+
+# create_engine は接続しない（最初に使われた時点で接続する）
+# スキーマ作成は db_control.bootstrap で明示的に行う
+engine = build_engine()
 
 Base = declarative_base()
-Base.metadata.create_all(bind=engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -34,4 +110,126 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# 非同期ルートから同期の DB 処理（キャッシュの再読み込みなど）をスレッドで実行する
+# イベントループを止めず、同期ルートと同じロックで排他できる
+async def run_in_session(fn, *args):
+    def run():
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(run)
+
+
+def build_async_url(url: str = DATABASE_URL):
+    if os.getenv("ASYNC_DATABASE_URL"):
+        return make_url(os.getenv("ASYNC_DATABASE_URL"))
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    return url.set(drivername=driver) if driver else url
+
+
+def build_async_engine(url: str = DATABASE_URL):
+    url = build_async_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            engine = create_async_engine(url, poolclass=StaticPool)
+        else:
+            engine = create_async_engine(url)
+        event.listen(engine.sync_engine, "connect", _register_sqlite_functions)
+        return engine
+
+    connect_args = {}
+    if backend == "mysql":
+        connect_args = {"ssl": ssl.create_default_context(cafile=DB_SSL_CERT)}
+    return create_async_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+# 非同期エンジンは最初に使われた時点で作成する（非同期ドライバを使わないワーカーでは読み込まない）
+async_engine = None
+AsyncSessionLocal = None
+_async_lock = threading.Lock()
+# 非同期エンジン作成時に同期側エンジンへ適用する処理（計測用イベントの登録など）
+async_engine_hooks = []
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        with _async_lock:
+            if AsyncSessionLocal is None:
+                async_engine = build_async_engine()
+                for hook in async_engine_hooks:
+                    hook(async_engine.sync_engine)
+                AsyncSessionLocal = async_sessionmaker(
+                    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+                )
+    return AsyncSessionLocal
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+# 接続を張っておき、最初のリクエストで TLS ハンドシェイクを待たないようにする
+def warm_up_pool(count: int = DB_POOL_WARMUP) -> int:
+    if not isinstance(engine.pool, QueuePool):
+        return 0
+    count = min(count, DB_POOL_SIZE)
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.connect())
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
+
+
+# 起動をブロックしないようにバックグラウンドでプールを温める
+def warm_up_pool_in_background(count: int = DB_POOL_WARMUP) -> threading.Thread:
+    def run():
+        try:
+            warm_up_pool(count)
+        except Exception as e:
+            print(f"DB pool warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name="db-pool-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# プールの稼働状況
+def pool_stats() -> dict:
+    pool = engine.pool
+    stats = {"pid": os.getpid(), "pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+        })
+    if isinstance(pool, TimedQueuePool):
+        with TimedQueuePool.wait_lock:
+            count = TimedQueuePool.wait_count or 1
+            stats.update({
+                "checkouts": TimedQueuePool.wait_count,
+                "wait_ms_avg": TimedQueuePool.wait_seconds_total / count * 1000,
+                "wait_ms_max": TimedQueuePool.wait_seconds_max * 1000,
+            })
+    return stats
@@ -1,44 +1,61 @@
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from db_control import models, schemas
+from typing import List
 import datetime
-import bcrypt
-import os
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from db_control.logic.store_cache import store_cache
+from db_control.logic.password_pool import password_verifier, PasswordPoolSaturated
 
 # 回答をDBに保存
-def save_answers(db: Session, answer_request: schemas.AnswerRequest):
+async def save_answers(db: AsyncSession, answer_request: schemas.AnswerRequest):
     try:
-        for answer in answer_request.answers:
-            # question の型を取得
-            question = db.query(models.Question).filter(models.Question.id == answer.questionId).first()
-            if not question:
-                return {"error": f"Invalid question ID: {answer.questionId}"}
-            # 回答データを適切なカラムに格納
-            answer_data = models.AnswerInfo(
-            reception_id=answer_request.receptionId,
-                question_id=answer.questionId,
-                answer=answer.answer
-            )
-            db.add(answer_data)
-        db.commit()
+        # 設問IDの存在確認は IN 句1回でまとめて行う
+        question_ids = {answer.questionId for answer in answer_request.answers}
+        valid_ids = set((
+            await db.scalars(select(models.Question.id).where(models.Question.id.in_(question_ids)))
+        ).all()) if question_ids else set()
+        invalid_ids = sorted(question_ids - valid_ids)
+        if invalid_ids:
+            return {"error": f"Invalid question ID: {', '.join(map(str, invalid_ids))}"}
+
+        # 回答データは複数行 INSERT 1回で格納（全件成功か全件失敗）
+        rows = [
+            {
+                "reception_id": answer_request.receptionId,
+                "question_id": answer.questionId,
+                "answer": answer.answer
+            }
+            for answer in answer_request.answers
+        ]
+        if rows:
+            await db.execute(insert(models.AnswerInfo), rows)
+        await db.commit()
         return {"message": "保存が完了しました"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"error": f"回答の保存に失敗しました: {str(e)}"}
 
 
 # 質問と回答候補を取得して送信する
-def get_questions_by_category(db: Session, category_id: int):
+async def get_questions_by_category(db: AsyncSession, category_id: int):
     # カテゴリの存在確認
-    category_exists = db.query(models.Category).filter(models.Category.id == category_id).first()
+    category_exists = await db.scalar(select(models.Category.id).where(models.Category.id == category_id))
     if not category_exists:
         return {"error": "家電カテゴリが存在しません"}
 
     # 指定カテゴリの質問を取得
-    questions = db.query(models.Question).filter(models.Question.category_id == category_id).all()
-    # 全選択肢を取得して、question_id ごとにまとめる
-    option_rows = db.query(models.QuestionOption).all()
+    questions = (
+        await db.scalars(select(models.Question).where(models.Question.category_id == category_id))
+    ).all()
+    # カテゴリ内の設問の選択肢だけを取得して、question_id ごとにまとめる
+    question_ids = [q.id for q in questions]
+    option_rows = (
+        await db.scalars(
+            select(models.QuestionOption).where(models.QuestionOption.question_id.in_(question_ids))
+        )
+    ).all() if question_ids else []
     option_map = {}
     for opt in option_rows:
         if opt.question_id not in option_map:
@@ -62,7 +79,7 @@ def get_questions_by_category(db: Session, category_id: int):
 
 
 # ユーザー属性情報登録
-def save_user_info(db: Session, user_info: schemas.UserInfo):
+async def save_user_info(db: AsyncSession, user_info: schemas.UserInfo):
     try:
         new_user = models.User(
             store_id=user_info.store_id,
@@ -72,8 +89,7 @@ def save_user_info(db: Session, user_info: schemas.UserInfo):
             time=datetime.datetime.utcnow()
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.flush()  # ID 採番のみ（コミットは1回）
 
         new_reception = models.Reception(
             user_id=new_user.id,
@@ -81,14 +97,144 @@ def save_user_info(db: Session, user_info: schemas.UserInfo):
             time=datetime.datetime.utcnow()
         )
         db.add(new_reception)
-        db.commit()
-        db.refresh(new_reception)
+        await db.flush()
+        await db.commit()
 
         return {"reception_id": new_reception.id}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"error": f"ユーザー情報の保存に失敗しました: {str(e)}"}
-    
+
+
+# 接客セッションの設問IDが存在しない（呼び出し側で 400 を返す）
+class InvalidQuestionError(ValueError):
+    def __init__(self, question_ids: List[int]):
+        self.question_ids = question_ids
+        super().__init__(f"Invalid question ID: {', '.join(map(str, question_ids))}")
+
+
+# 接客セッションの保存処理に失敗した（呼び出し側で 500 を返す）
+class SessionSaveError(Exception):
+    pass
+
+
+# 接客セッション（ユーザー属性・回答・優先度）を1トランザクションで保存
+# 設問IDの検証で弾かれたセッションは書き込まず、結果にエラーを返す
+# （strict=True なら InvalidQuestionError を送出する）。保存に失敗したら SessionSaveError を送出
+async def save_sessions(db: AsyncSession, sessions: List[schemas.KioskSession], strict: bool = False) -> List[dict]:
+    try:
+        question_ids = {answer.questionId for session in sessions for answer in session.answers}
+        valid_ids = set((
+            await db.scalars(select(models.Question.id).where(models.Question.id.in_(question_ids)))
+        ).all()) if question_ids else set()
+
+        results: List[dict] = []
+        accepted = []
+        for session in sessions:
+            invalid_ids = sorted({answer.questionId for answer in session.answers} - valid_ids)
+            if invalid_ids:
+                error = InvalidQuestionError(invalid_ids)
+                if strict:
+                    raise error
+                results.append({"error": str(error)})
+                continue
+            now = datetime.datetime.utcnow()
+            user = models.User(
+                store_id=session.store_id,
+                age=session.age,
+                gender=session.gender,
+                household=session.household,
+                time=now
+            )
+            db.add(user)
+            accepted.append((session, user, now))
+            results.append({})
+
+        # ID はフラッシュで採番（ユーザー・受付それぞれ1回ずつ）
+        await db.flush()
+        receptions = []
+        for session, user, now in accepted:
+            reception = models.Reception(user_id=user.id, category_id=session.category_id, time=now)
+            db.add(reception)
+            receptions.append(reception)
+        await db.flush()
+
+        answer_rows = []
+        priority_rows = []
+        for (session, _, _), reception in zip(accepted, receptions):
+            answer_rows.extend(
+                {"reception_id": reception.id, "question_id": answer.questionId, "answer": answer.answer}
+                for answer in session.answers
+            )
+            priority_rows.extend(
+                {"reception_id": reception.id, "metrics_id": item.metrics_id, "level": item.level}
+                for item in session.priorities
+            )
+        if answer_rows:
+            await db.execute(insert(models.AnswerInfo), answer_rows)
+        if priority_rows:
+            await upsert_priorities_async(db, priority_rows)
+        await db.commit()
+
+        accepted_results = iter(receptions)
+        return [
+            result if "error" in result else {"reception_id": next(accepted_results).id}
+            for result in results
+        ]
+    except InvalidQuestionError:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise SessionSaveError(f"セッションの保存に失敗しました: {str(e)}") from e
+
+# 優先度の一括 upsert（(reception_id, metrics_id) の一意インデックス前提）
+def _dedupe_priority_rows(rows: List[dict]) -> List[dict]:
+    # 同じキーが複数あれば後勝ち
+    return list({(row["reception_id"], row["metrics_id"]): row for row in rows}.values())
+
+def _priority_upsert_statement(dialect_name: str):
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(models.Priority)
+        return stmt.on_duplicate_key_update(level=stmt.inserted.level)
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = sqlite_insert(models.Priority)
+        return stmt.on_conflict_do_update(
+            index_elements=["reception_id", "metrics_id"],
+            set_={"level": stmt.excluded.level}
+        )
+    return None
+
+def _priority_delete_statement(rows: List[dict]):
+    return delete(models.Priority).where(
+        tuple_(models.Priority.reception_id, models.Priority.metrics_id).in_(
+            [(row["reception_id"], row["metrics_id"]) for row in rows]
+        )
+    )
+
+def upsert_priorities(db: Session, rows: List[dict]):
+    rows = _dedupe_priority_rows(rows)
+    if not rows:
+        return
+    stmt = _priority_upsert_statement(db.get_bind().dialect.name)
+    if stmt is None:
+        # 方言別の upsert がない DB では削除してから挿入
+        db.execute(_priority_delete_statement(rows))
+        stmt = insert(models.Priority)
+    db.execute(stmt, rows)
+
+async def upsert_priorities_async(db: AsyncSession, rows: List[dict]):
+    rows = _dedupe_priority_rows(rows)
+    if not rows:
+        return
+    stmt = _priority_upsert_statement(db.get_bind().dialect.name)
+    if stmt is None:
+        await db.execute(_priority_delete_statement(rows))
+        stmt = insert(models.Priority)
+    await db.execute(stmt, rows)
+
 # ---  むかげん開発用コード  ---
 # 回答をDBから取得
 def get_answers_by_reception_id(db: Session, reception_id: int) -> schemas.AnswerRequest:
@@ -110,11 +256,13 @@ def get_answers_by_reception_id(db: Session, reception_id: int) -> schemas.Answe
     )
 
 # ほげほげ
+# question_id → 回答値 → metrics_id → 加減点（scoring_rule テーブルから）
 def get_weight_map(db: Session):
-    result = db.query(QuestionWeight).all()
+    result = db.query(models.ScoringRule).all()
     weight_map = {}
     for row in result:
-        weight_map.setdefault(row.question_id, {}).setdefault(row.choice_label, {})[row.axis] = row.weight
+        axes = weight_map.setdefault(row.question_id, {}).setdefault(row.value, {})
+        axes[row.metrics_id] = axes.get(row.metrics_id, 0) + float(row.delta)
     return weight_map
 
 def get_product_features(db: Session):
@@ -151,69 +299,21 @@ def recommend_products(db: Session, answer_request):
 # ---  むかげん開発用コード ここまで ---
 
 
-# 店舗認証処理
-def verify_store_credentials(db: Session, name: str, password: str):
+# 店舗認証処理（bcrypt 照合は専用プールで実行し、待機中はスレッドを占有しない）
+async def verify_store_credentials_async(db: Session, name: str, password: str):
     try:
-        load_dotenv()
-        account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
-        account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
-        container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
-
-        store = db.query(models.Store).filter(models.Store.name == name).first()
-        if not store or not bcrypt.checkpw(password.encode("utf-8"), store.password.encode("utf-8")):
+        store = await run_in_threadpool(
+            lambda: db.query(models.Store).filter(models.Store.name == name).first()
+        )
+        if not store or not await password_verifier.verify_async(password, store.password):
             return None
 
-        bic_girl = db.query(models.BicGirl).filter(models.BicGirl.store_id == store.id).first()
-        if not bic_girl:
-            return {
-                "store_id": store.id,
-                "store_name": store.name,
-                "prefecture": store.prefecture,
-                "character": schemas.CharacterInfo(
-                    name="",
-                    image=None,
-                    video=None,
-                    voice_1=None,
-                    voice_2=None,
-                    message_1=None,
-                    message_2=None
-                )
-            }
-
-        blob_service_client = BlobServiceClient(account_url=f"https://{account_name}.blob.core.windows.net", credential=account_key)
-
-        def generate_sas_url(blob_name):
-            if not blob_name:
-                return None
-            try:
-                sas_token = generate_blob_sas(
-                    account_name=account_name,
-                    container_name=container_name,
-                    blob_name=blob_name,
-                    account_key=account_key,
-                    permission=BlobSasPermissions(read=True),
-                    expiry=datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
-                )
-                return f"https://{account_name}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
-            except Exception:
-                return None
-
-        character = {
-            "name": bic_girl.name,
-            "image": generate_sas_url(bic_girl.image),
-            "video": generate_sas_url(bic_girl.video),
-            "voice_1": generate_sas_url(bic_girl.voice_1),
-            "voice_2": generate_sas_url(bic_girl.voice_2),
-            "message_1": bic_girl.message_1,
-            "message_2": bic_girl.message_2,
-        }
-
-        return {
-            "store_id": store.id,
-            "store_name": store.name,
-            "prefecture": store.prefecture,
-            "character": character
-        }
+        bootstrap = await run_in_threadpool(store_cache.get, db, store.id)
+        if not bootstrap:
+            return None
+        return bootstrap.to_payload()
+    except PasswordPoolSaturated:
+        raise
     except Exception as e:
         return {"error": f"認証エラー: {str(e)}"}
 
@@ -237,31 +337,40 @@ def create_tablet(db: Session, tablet: schemas.TabletRegisterRequest):
 # 店員呼び出し
 def get_reception_info_for_call(db: Session, reception_id: int, uuid: str):
     try:
-        reception = db.query(models.Reception).filter(models.Reception.id == reception_id).first()
-        if not reception:
+        # 受付→ユーザー→店舗・カテゴリ・タブレットを外部結合1回で取得
+        row = (
+            db.query(
+                models.User.id.label("user_id"),
+                models.Store.name.label("store_name"),
+                models.Category.name.label("category_name"),
+                models.Tablet.uuid.label("tablet_uuid"),
+                models.Tablet.floor,
+                models.Tablet.area
+            )
+            .select_from(models.Reception)
+            .outerjoin(models.User, models.User.id == models.Reception.user_id)
+            .outerjoin(models.Store, models.Store.id == models.User.store_id)
+            .outerjoin(models.Category, models.Category.id == models.Reception.category_id)
+            .outerjoin(models.Tablet, models.Tablet.uuid == uuid)
+            .filter(models.Reception.id == reception_id)
+            .first()
+        )
+        if not row:
             raise ValueError("指定されたreception_idが存在しません")
-
-        user = db.query(models.User).filter(models.User.id == reception.user_id).first()
-        if not user:
+        if row.user_id is None:
             raise ValueError("Receptionに紐づくユーザーが存在しません")
-
-        store = db.query(models.Store).filter(models.Store.id == user.store_id).first()
-        if not store:
+        if row.store_name is None:
             raise ValueError("ユーザーに紐づく店舗が存在しません")
-
-        category = db.query(models.Category).filter(models.Category.id == reception.category_id).first()
-        if not category:
+        if row.category_name is None:
             raise ValueError("Receptionに紐づくカテゴリが存在しません")
-
-        tablet = db.query(models.Tablet).filter(models.Tablet.uuid == uuid).first()
-        if not tablet:
+        if row.tablet_uuid is None:
             raise ValueError("指定されたUUIDのタブレット情報が存在しません")
 
         return {
-            "store_name": store.name,
-            "floor": tablet.floor if tablet else "未登録",
-            "area": tablet.area if tablet else "未登録",
-            "category_name": category.name
+            "store_name": row.store_name,
+            "floor": row.floor,
+            "area": row.area,
+            "category_name": row.category_name
         }
     except Exception as e:
         raise e  # ここで詳細なエラー内容をそのまま上に投げる
@@ -269,53 +378,9 @@ def get_reception_info_for_call(db: Session, reception_id: int, uuid: str):
 # QRコード対応（店舗情報取得）
 def get_store_info(db: Session, store_id: int):
     try:
-        load_dotenv()
-        account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
-        account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
-        container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
-
-        store = db.query(models.Store).filter(models.Store.id == store_id).first()
-        if not store:
+        bootstrap = store_cache.get(db, store_id)
+        if not bootstrap:
             return None
-
-        bic_girl = db.query(models.BicGirl).filter(models.BicGirl.store_id == store.id).first()
-
-        blob_service_client = BlobServiceClient(
-            account_url=f"https://{account_name}.blob.core.windows.net",
-            credential=account_key
-        )
-
-        def generate_sas_url(blob_name):
-            if not blob_name:
-                return None
-            try:
-                sas_token = generate_blob_sas(
-                    account_name=account_name,
-                    container_name=container_name,
-                    blob_name=blob_name,
-                    account_key=account_key,
-                    permission=BlobSasPermissions(read=True),
-                    expiry=datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
-                )
-                return f"https://{account_name}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
-            except Exception:
-                return None
-
-        character_data = {
-            "name": bic_girl.name if bic_girl else "",
-            "image": generate_sas_url(bic_girl.image) if bic_girl else None,
-            "video": generate_sas_url(bic_girl.video) if bic_girl else None,
-            "voice_1": generate_sas_url(bic_girl.voice_1) if bic_girl else None,
-            "voice_2": generate_sas_url(bic_girl.voice_2) if bic_girl else None,
-            "message_1": bic_girl.message_1 if bic_girl else None,
-            "message_2": bic_girl.message_2 if bic_girl else None,
-        }
-
-        return {
-            "store_id": store.id,
-            "store_name": store.name,
-            "prefecture": store.prefecture,
-            "character": character_data
-        }
+        return bootstrap.to_payload()
     except Exception as e:
         return None
\ No newline at end of file
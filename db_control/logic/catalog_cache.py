@@ -0,0 +1,242 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from db_control.logic.similarity import ProductMatrix
+from db_control.logic.nn_index import RECOMMEND_INDEX_MODE, build_indexes
+from db_control.logic.versioned_cache import VersionedCache
+import math
+import threading
+import time
+import os
+
+# 変更確認（probe）の最短間隔（秒）。0 なら毎リクエスト確認する
+CATALOG_PROBE_INTERVAL = float(os.getenv("CATALOG_PROBE_INTERVAL", "30"))
+
+PRODUCT_METRICS_QUERY = "SELECT product_id, metrics_id, level FROM product_metrics"
+
+PRODUCT_QUERY = """
+    SELECT
+        p.id,
+        p.name,
+        p.brand,
+        p.price,
+        p.width,
+        p.depth,
+        p.height,
+        p.description,
+        p.image AS image,
+        p.category_id,
+        c.name AS category
+    FROM product p
+    LEFT JOIN category c ON p.category_id = c.id
+"""
+
+# 全件取得の代わりに集計値1行だけを返す軽量な変更検知クエリ
+# 商品名・説明・画像などの文字列の編集も検知できるよう、行ごとの CRC32 を ID で重み付けして合計する
+# （SQLite では connect で CRC32 関数を登録している）
+CATALOG_VERSION_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM product_metrics),
+        (SELECT COALESCE(SUM(level), 0) FROM product_metrics),
+        (SELECT COUNT(*) FROM product),
+        (SELECT COALESCE(MAX(id), 0) FROM product),
+        (SELECT COALESCE(SUM(price), 0) FROM product),
+        (SELECT COALESCE(SUM(width + depth + height), 0) FROM product),
+        (SELECT COALESCE(SUM((id * (
+            CRC32(COALESCE(name, ''))
+            + 2 * CRC32(COALESCE(brand, ''))
+            + 3 * CRC32(COALESCE(description, ''))
+            + 4 * CRC32(COALESCE(image, ''))
+            + 5 * CRC32(COALESCE(category_id, ''))
+            + 6 * CRC32(COALESCE(price, ''))
+            + 7 * CRC32(COALESCE(width, ''))
+            + 8 * CRC32(COALESCE(depth, ''))
+            + 9 * CRC32(COALESCE(height, ''))
+        )) % 1000000007), 0) FROM product),
+        (SELECT COALESCE(SUM((id * CRC32(COALESCE(name, ''))) % 1000000007), 0) FROM category)
+"""
+
+
+# 推薦時の絞り込み条件に使える商品の数値列
+NUMERIC_COLUMNS = ("price", "width", "depth", "height")
+
+
+# ある時点の商品カタログ（読み取り専用として扱う）
+class CatalogSnapshot:
+    def __init__(self, version: Tuple, metric_rows: Sequence[Tuple], product_rows: Sequence[dict]):
+        self.version = version
+        self.product_count = len(product_rows)
+        self.metric_count = len(metric_rows)
+        product_ids = [int(row[0]) for row in metric_rows]
+        metric_ids = [int(row[1]) for row in metric_rows]
+        levels = [float(row[2]) for row in metric_rows]
+        self.matrix = ProductMatrix.from_rows(product_ids, metric_ids, levels)
+        self.partitions = self._build_partitions(product_ids, metric_ids, levels, product_rows)
+        self.details = self._build_details(product_ids, metric_ids, levels, product_rows)
+        self.columns = self._build_columns(product_rows)
+        self.loaded_at = time.time()
+
+    # 各行列と同じ並びの数値列（価格・寸法）。未登録は NaN（条件指定時は対象外になる）
+    def _build_columns(self, product_rows) -> Dict[Optional[int], Dict[str, object]]:
+        import numpy as np
+        values = {
+            int(row["id"]): [
+                math.nan if row[column] is None else float(row[column]) for column in NUMERIC_COLUMNS
+            ]
+            for row in product_rows
+        }
+        missing = [math.nan] * len(NUMERIC_COLUMNS)
+        matrices = dict(self.partitions)
+        matrices[None] = self.matrix
+        columns = {}
+        for category_id, matrix in matrices.items():
+            table = np.array(
+                [values.get(int(pid), missing) for pid in matrix.product_ids], dtype=np.float64
+            ).reshape(len(matrix), len(NUMERIC_COLUMNS))
+            columns[category_id] = {column: table[:, j] for j, column in enumerate(NUMERIC_COLUMNS)}
+        return columns
+
+    # 価格・寸法の範囲条件を満たす商品のマスク（matrix_for(category_id) と同じ並び）
+    # bounds: {列名: (下限, 上限)}。条件がなければ None
+    def constraint_mask(self, category_id: Optional[int], bounds: Dict[str, Tuple[Optional[float], Optional[float]]]):
+        import numpy as np
+        bounds = {column: bound for column, bound in bounds.items() if bound != (None, None)}
+        if not bounds:
+            return None
+        key = None if category_id is None else int(category_id)
+        columns = self.columns.get(key)
+        if columns is None:
+            return np.zeros(0, dtype=bool)
+        mask = np.ones(len(columns[NUMERIC_COLUMNS[0]]), dtype=bool)
+        for column, (lower, upper) in bounds.items():
+            values = columns[column]
+            if lower is not None:
+                mask &= values >= lower
+            if upper is not None:
+                mask &= values <= upper
+        return mask
+
+    # 商品IDごとの詳細とレーダーチャート用スコア（レスポンス組み立て用）
+    @staticmethod
+    def _build_details(product_ids, metric_ids, levels, product_rows) -> Dict[int, dict]:
+        scores: Dict[int, Dict[str, float]] = {}
+        for product_id, metrics_id, level in zip(product_ids, metric_ids, levels):
+            # キーは従来の iterrows 版と同じ float 表記（"1.0"）に揃える
+            scores.setdefault(product_id, {})[str(float(metrics_id))] = level
+
+        details = {}
+        for position, row in enumerate(product_rows):
+            product_id = int(row["id"])
+            details[product_id] = {
+                "position": position,
+                "id": product_id,
+                "name": row["name"],
+                "brand": row["brand"],
+                "price": None if row["price"] is None else float(row["price"]),
+                "dimensions": {
+                    "width": row["width"],
+                    "depth": row["depth"],
+                    "height": row["height"]
+                },
+                "description": row["description"],
+                "image": row["image"],  # Blob 名（SAS URL は返却時に付与）
+                "category": row["category"],
+                "scores": scores.get(product_id, {}),
+            }
+        return details
+
+    # カテゴリごとの候補行列（Product.category_id で分割）
+    @staticmethod
+    def _build_partitions(product_ids, metric_ids, levels, product_rows) -> Dict[int, ProductMatrix]:
+        category_of = {int(row["id"]): row["category_id"] for row in product_rows}
+        groups: Dict[int, List[int]] = {}
+        for i, product_id in enumerate(product_ids):
+            category_id = category_of.get(product_id)
+            if category_id is not None:
+                groups.setdefault(int(category_id), []).append(i)
+        return {
+            category_id: ProductMatrix.from_rows(
+                [product_ids[i] for i in indices],
+                [metric_ids[i] for i in indices],
+                [levels[i] for i in indices]
+            )
+            for category_id, indices in groups.items()
+        }
+
+    def matrix_for(self, category_id: Optional[int] = None) -> ProductMatrix:
+        if category_id is None:
+            return self.matrix
+        matrix = self.partitions.get(int(category_id))
+        if matrix is None:
+            return ProductMatrix.from_rows([], [], [])
+        return matrix
+
+
+# ワーカー単位の商品カタログキャッシュ
+class CatalogCache(VersionedCache):
+    VERSION_QUERY = CATALOG_VERSION_QUERY
+
+    def __init__(self, probe_interval: float = CATALOG_PROBE_INTERVAL):
+        super().__init__(probe_interval)
+        self.index_mode = RECOMMEND_INDEX_MODE
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+        self.index_builds = 0
+        self.index_build_ms = 0.0
+        # 作成に失敗したときは全件走査のまま応答を続け、原因は stats() で確認できるようにする
+        self.index_errors = 0
+        self.index_last_error: Optional[str] = None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            **super().stats(),
+            "products": snapshot.product_count if snapshot else 0,
+            "product_metrics": snapshot.metric_count if snapshot else 0,
+            "categories": {
+                category_id: len(matrix) for category_id, matrix in snapshot.partitions.items()
+            } if snapshot else {},
+            "index_mode": self.index_mode,
+            "indexed_categories": sorted(
+                category_id for category_id, matrix in snapshot.partitions.items() if matrix.index is not None
+            ) if snapshot else [],
+            "index_builds": self.index_builds,
+            "index_build_ms": self.index_build_ms,
+            "index_errors": self.index_errors,
+            "index_last_error": self.index_last_error,
+        }
+
+    def _load(self, db: Session, version: Tuple, previous: Optional[CatalogSnapshot]) -> CatalogSnapshot:
+        metric_rows = db.execute(text(PRODUCT_METRICS_QUERY)).all()
+        product_rows = db.execute(text(PRODUCT_QUERY)).mappings().all()
+        return CatalogSnapshot(version, metric_rows, product_rows)
+
+    def _published(self, snapshot: CatalogSnapshot):
+        self._schedule_index_build(snapshot)
+
+    # 近傍探索インデックスはバックグラウンドで作成（完成までは全件走査で応答する）
+    def _schedule_index_build(self, snapshot: CatalogSnapshot):
+        if self.index_mode != "kdtree":
+            return
+        thread = threading.Thread(target=self._build_indexes, args=(snapshot,), name="catalog-index", daemon=True)
+        thread.start()
+
+    def _build_indexes(self, snapshot: CatalogSnapshot):
+        with self._index_lock:
+            started = time.perf_counter()
+            try:
+                matrices = dict(snapshot.partitions)
+                matrices[None] = snapshot.matrix
+                # 内容が変わっていないカテゴリは前回のインデックスを使い回す
+                self._indexes = build_indexes(matrices, self._indexes)
+            except Exception as e:
+                print("Catalog index build error:", e)
+                self.index_errors += 1
+                self.index_last_error = f"{type(e).__name__}: {e}"
+                return
+            self.index_builds += 1
+            self.index_build_ms = (time.perf_counter() - started) * 1000
+            self.index_last_error = None
+
+
+catalog_cache = CatalogCache()
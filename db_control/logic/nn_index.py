@@ -0,0 +1,176 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+import hashlib
+import os
+
+# 推薦の近傍探索方式（brute: 全件走査 / kdtree: カテゴリごとの KD 木インデックス）
+RECOMMEND_INDEX_MODE = os.getenv("RECOMMEND_INDEX_MODE", "brute").lower()
+# これより商品数の少ないカテゴリは全件走査のほうが速いのでインデックスを作らない
+RECOMMEND_INDEX_MIN_PRODUCTS = int(os.getenv("RECOMMEND_INDEX_MIN_PRODUCTS", "10000"))
+# KD 木の葉（ブロック）1つあたりの商品数
+RECOMMEND_INDEX_LEAF_SIZE = int(os.getenv("RECOMMEND_INDEX_LEAF_SIZE", "256"))
+# 未登録の評価値が多くこれを下回る行列はインデックスを使わず全件走査する
+RECOMMEND_INDEX_MIN_COVERAGE = 0.5
+
+# 浮動小数点の丸めで下限が実距離を上回らないための余裕
+_BOUND_SLACK = 1e-9
+
+
+# 行列の内容が同じかどうかを判定する指紋（変更のないカテゴリはインデックスを使い回す）
+def matrix_fingerprint(matrix) -> str:
+    import numpy as np
+    digest = hashlib.sha1()
+    digest.update(matrix.product_ids.tobytes())
+    digest.update(matrix.metric_ids.tobytes())
+    digest.update(np.nan_to_num(matrix.levels, nan=-1.0).tobytes())
+    return digest.hexdigest()
+
+
+# 葉をブロックとして持つ KD 木（scipy を使わず numpy だけで実装）
+# 全ブロックの包含箱までの距離の下限をまとめて計算し、近い順にブロックを走査する。
+# 現在の top_n 件目より下限が大きいブロックに達した時点で打ち切るので、結果は全件走査と同じ
+class BlockKDIndex:
+    def __init__(self, matrix, leaf_size: int = RECOMMEND_INDEX_LEAF_SIZE):
+        import numpy as np
+        self.matrix = matrix
+        self.leaf_size = max(int(leaf_size), 1)
+        self.fingerprint = matrix_fingerprint(matrix)
+
+        leaves = self._split(np.arange(len(matrix)))
+        self.order = np.concatenate(leaves) if leaves else np.empty(0, dtype=np.int64)
+        sizes = [len(leaf) for leaf in leaves]
+        self.starts = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64))).astype(np.int64)
+
+        # ブロックの並びに並べ替えた行列（行が連続するので走査が速い）
+        self.levels = np.ascontiguousarray(matrix.levels[self.order])
+        self.present = np.ascontiguousarray(matrix.present[self.order])
+
+        n_blocks, n_metrics = len(leaves), len(matrix.metric_ids)
+        self.lower = np.zeros((n_blocks, n_metrics))
+        self.upper = np.zeros((n_blocks, n_metrics))
+        # 未登録の評価項目を含む次元は距離 0 になり得るので下限計算から外す
+        self.incomplete = np.zeros((n_blocks, n_metrics), dtype=bool)
+        for b in range(n_blocks):
+            rows = slice(self.starts[b], self.starts[b + 1])
+            block_present = self.present[rows]
+            block_levels = np.where(block_present, self.levels[rows], np.nan)
+            self.incomplete[b] = ~block_present.all(axis=0)
+            complete = ~self.incomplete[b]
+            self.lower[b, complete] = np.min(block_levels[:, complete], axis=0)
+            self.upper[b, complete] = np.max(block_levels[:, complete], axis=0)
+        # 下限計算に使える（ブロック, 評価項目）の割合。低いと絞り込みが効かない
+        self.coverage = float(1.0 - self.incomplete.mean()) if self.incomplete.size else 0.0
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    # 値の幅が最大の評価項目で中央分割を繰り返す
+    def _split(self, indices) -> List:
+        import numpy as np
+        if len(indices) == 0:
+            return []
+        leaves = []
+        stack = [indices]
+        while stack:
+            current = stack.pop()
+            if len(current) <= self.leaf_size:
+                leaves.append(current)
+                continue
+            present = self.matrix.present[current]
+            levels = self.matrix.levels[current]
+            # 全商品が未登録の評価項目は分割に使わない（幅 -1）
+            lower = np.where(present, levels, np.inf).min(axis=0)
+            upper = np.where(present, levels, -np.inf).max(axis=0)
+            spread = np.where(present.any(axis=0), upper - lower, -1.0)
+            dim = int(np.argmax(spread))
+            if spread[dim] <= 0:
+                leaves.append(current)
+                continue
+            values = np.where(present[:, dim], levels[:, dim], -np.inf)
+            order = np.argsort(values, kind="stable")
+            half = len(current) // 2
+            # 元の並び順を保ったまま左右に分ける（同点時の順位付けは最後にまとめて行う）
+            stack.append(np.sort(current[order[half:]]))
+            stack.append(np.sort(current[order[:half]]))
+        return leaves
+
+    def lower_bounds(self, vec, mask):
+        import numpy as np
+        gap = np.maximum(np.maximum(self.lower - vec, vec - self.upper), 0.0)
+        gap = np.where(self.incomplete | ~mask, 0.0, gap)
+        return np.sqrt(np.einsum("ij,ij->i", gap, gap)) * (1 - _BOUND_SLACK)
+
+    def top_n(self, user_scores: Dict[int, float], top_n: int = 3, allowed=None) -> List[int]:
+        import numpy as np
+        from db_control.logic.similarity import select_allowed_top_n
+
+        if top_n <= 0 or len(self) == 0:
+            return []
+        vec, mask = self.matrix.user_vector(user_scores)
+        bounds = self.lower_bounds(vec, mask)
+        block_order = np.argsort(bounds, kind="stable")
+
+        # 近いブロックから 1, 2, 4, ... 個ずつまとめて走査する（Python のループ回数を抑える）
+        # 絞り込みが効かない（未登録の評価値が多い等）ときは全件走査に切り替える
+        budget = max(len(self.matrix) // 4, top_n)
+        found_rows, found_distances = [], []
+        found = scanned = 0
+        kth = np.inf
+        position, group = 0, 1
+        while position < len(block_order):
+            if found >= top_n and bounds[block_order[position]] > kth:
+                break
+            if scanned >= budget:
+                order = select_allowed_top_n(self.matrix.distances(user_scores), top_n, allowed)
+                return [int(pid) for pid in self.matrix.product_ids[order]]
+            blocks = block_order[position:position + group]
+            position += group
+            group *= 2
+            rows = np.concatenate([np.arange(self.starts[b], self.starts[b + 1]) for b in blocks])
+            # 全件走査（ProductMatrix.distances）と同じ式で距離を計算
+            diff = np.where(self.present[rows] & mask, self.levels[rows] - vec, 0.0)
+            distances = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+            if allowed is not None:
+                # 除外された商品は距離無限大（件数にも数えない）
+                block_allowed = allowed[self.order[rows]]
+                distances = np.where(block_allowed, distances, np.inf)
+                found += int(np.count_nonzero(block_allowed))
+            else:
+                found += len(rows)
+            found_rows.append(self.order[rows])
+            found_distances.append(distances)
+            scanned += len(rows)
+            if found >= top_n:
+                distances = np.concatenate(found_distances)
+                kth = np.partition(distances, top_n - 1)[top_n - 1]
+
+        # 候補を元の並び順に戻してから選ぶ（同点は元の並び順を優先）
+        rows = np.concatenate(found_rows)
+        distances = np.concatenate(found_distances)
+        by_position = np.argsort(rows, kind="stable")
+        rows, distances = rows[by_position], distances[by_position]
+        chosen = rows[select_allowed_top_n(distances, top_n, None if allowed is None else np.isfinite(distances))]
+        return [int(pid) for pid in self.matrix.product_ids[chosen]]
+
+
+# インデックスを作るかどうか（方式の設定と商品数で判定）
+def should_index(matrix, mode: str = RECOMMEND_INDEX_MODE, min_products: int = RECOMMEND_INDEX_MIN_PRODUCTS) -> bool:
+    return mode == "kdtree" and len(matrix) >= min_products
+
+
+# 前回のインデックスのうち内容が変わっていないものは使い回し、変わったものだけ作り直す
+def build_indexes(matrices: Dict[Optional[int], object], previous: Dict[str, BlockKDIndex]) -> Dict[str, BlockKDIndex]:
+    built = {}
+    for matrix in matrices.values():
+        if not should_index(matrix):
+            continue
+        fingerprint = matrix_fingerprint(matrix)
+        index = previous.get(fingerprint)
+        if index is None:
+            index = BlockKDIndex(matrix)
+        else:
+            index.matrix = matrix
+        built[fingerprint] = index
+        if index.coverage >= RECOMMEND_INDEX_MIN_COVERAGE:
+            matrix.index = index
+    return built
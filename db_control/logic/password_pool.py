@@ -0,0 +1,92 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import threading
+import time
+import os
+
+# bcrypt 照合専用スレッド数と、実行待ちとして受け付ける最大件数
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", "2"))
+PASSWORD_POOL_MAX_QUEUE = int(os.getenv("PASSWORD_POOL_MAX_QUEUE", "16"))
+
+
+# 照合待ちが上限に達している（呼び出し側で 503 を返す）
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+# リクエスト用スレッドプールとは別の、サイズ制限付き bcrypt 照合プール
+# bcrypt はハッシュ計算中に GIL を解放するのでスレッドで並列に動く
+class PasswordVerifier:
+    def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_queue: int = PASSWORD_POOL_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    def submit(self, password: str, hashed: str) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolSaturated("password verification pool is saturated")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(self._check, password, hashed, time.perf_counter())
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self.submit(password, hashed).result()
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(self.submit(password, hashed))
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed or 1
+            return {
+                "pid": os.getpid(),
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_ms_avg": self.wait_seconds_total / completed * 1000,
+                "wait_ms_max": self.wait_seconds_max * 1000,
+                "hash_ms_avg": self.hash_seconds_total / completed * 1000,
+                "hash_ms_max": self.hash_seconds_max * 1000,
+            }
+
+    def _check(self, password: str, hashed: str, submitted_at: float) -> bool:
+        import bcrypt  # ログイン時にだけ読み込む
+
+        started = time.perf_counter()
+        try:
+            return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.completed += 1
+                self.wait_seconds_total += started - submitted_at
+                self.wait_seconds_max = max(self.wait_seconds_max, started - submitted_at)
+                self.hash_seconds_total += finished - started
+                self.hash_seconds_max = max(self.hash_seconds_max, finished - started)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+
+password_verifier = PasswordVerifier()
@@ -0,0 +1,121 @@
+from typing import Dict, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from db_control import crud
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import os
+
+# 質問セットキャッシュの有効期間（秒）
+QUESTION_CACHE_TTL = float(os.getenv("QUESTION_CACHE_TTL", "300"))
+
+
+# シリアライズ済みの質問セット（レスポンスボディと ETag）
+class QuestionSet:
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+    def is_expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+# If-None-Match の entity-tag（W/ を除いた引用符付きの値）
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+# If-None-Match がこの ETag に一致するか（RFC 9110 13.1.2）
+# "*"、カンマ区切りの複数指定、弱い ETag（W/"..."）を扱い、比較は弱い比較で行う
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(tag == opaque for tag in _ENTITY_TAG.findall(header))
+
+
+# カテゴリ単位の質問セットキャッシュ
+# 同じカテゴリの同時ミスは1回の読み込みにまとめる（別カテゴリの読み込みは待たせない）
+class QuestionCache:
+    def __init__(self, ttl: float = QUESTION_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, QuestionSet] = {}
+        self._loading: Dict[int, asyncio.Future] = {}
+        # 破棄のたびに進める世代（読み込み中に破棄された古い内容を登録しないため）
+        # 破棄は管理用ルートからスレッド経由で呼ばれるので、登録と破棄はロックで排他する
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, db: AsyncSession, category_id: int):
+        entry = self._entries.get(category_id)
+        if entry is not None and not entry.is_expired():
+            self.hits += 1
+            return entry
+
+        future = self._loading.get(category_id)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = self._loading[category_id] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._load(db, category_id)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 待っているリクエストがなければ例外を回収済みにしておく
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._loading.get(category_id) is future:
+                self._loading.pop(category_id, None)
+
+    async def _load(self, db: AsyncSession, category_id: int):
+        self.misses += 1
+        generation = self._generation
+        result = await crud.get_questions_by_category(db, category_id)
+        if "error" in result:
+            return result  # エラーはキャッシュしない
+
+        # FastAPI の JSONResponse と同じ形式でシリアライズしておく
+        body = json.dumps(result, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        entry = QuestionSet(body, self.ttl)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[category_id] = entry
+        return entry
+
+    def invalidate(self, category_id: Optional[int] = None):
+        with self._lock:
+            self._generation += 1
+            if category_id is None:
+                self._entries.clear()
+                self._loading.clear()
+            else:
+                self._entries.pop(category_id, None)
+                self._loading.pop(category_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "categories": sorted(self._entries),
+        }
+
+
+question_cache = QuestionCache()
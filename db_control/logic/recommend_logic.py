@@ -1,78 +1,202 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, insert, select
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db_control.schemas import UserInput
+from starlette.concurrency import run_in_threadpool
+from db_control.schemas import ProductConstraints, UserInput
 from db_control import models
-import numpy as np
-import pandas as pd
+from db_control.logic.catalog_cache import catalog_cache, CatalogSnapshot
+from db_control.logic.sas_signer import generate_sas_urls
+from db_control.logic.scoring_rules import ScoringTable, default_table, scoring_rules
+from db_control.logic.stock_cache import StockSnapshot, stock_cache
+import asyncio
 import time
-from dotenv import load_dotenv
-import os
-import datetime
-from azure.storage.blob import generate_blob_sas, BlobSasPermissions
-
-def convert_answers_to_scores(user_input: UserInput, base_score=4.5, step=0.25) -> Dict[int, float]:
-    scores = {i: base_score for i in range(1, 10)}
-    for ans in user_input.answers:
-        qid, val = ans.questionId, ans.value
-        if qid == 1:
-            if val == 0: scores[1] += step
-            elif val == 1: scores[5] += step
-        elif qid == 2 and val == 1:
-            scores[4] += step
-        elif qid == 4 and val == 0:
-            scores[6] += step
-        elif qid == 5 and val == 0:
-            scores[3] += step
-        elif qid == 7:
-            if val == 0: scores[1] += step
-            elif val == 1: scores[9] += step
-        elif qid == 8:
-            if val == 0: scores[2] += step
-            elif val == 1: scores[5] += step
-        elif qid == 9 and val == 0:
-            scores[1] += step
-        elif qid == 10 and val == 0:
-            scores[6] += step
-            scores[9] -= step
-        elif qid == 11 and val == 0:
-            scores[7] += step
-            scores[8] += step
-    return scores
-
-def calculate_similarity(product_df, user_scores: Dict[int, float]) -> List[tuple]:
-    distances = []
-    for pid in product_df["product_id"].unique():
-        pdata = product_df[product_df["product_id"] == pid]
-        distance = 0
-        for _, row in pdata.iterrows():
-            mid = row["metrics_id"]
-            if mid in user_scores:
-                distance += (user_scores[mid] - row["level"]) ** 2
-        distances.append((pid, np.sqrt(distance)))
-    distances.sort(key=lambda x: x[1])
-    return distances
-
-def get_top_products(user_scores: Dict[int, float], db: Session, top_n=3) -> List[int]:
-    df = pd.read_sql("SELECT product_id, metrics_id, level FROM product_metrics", db.bind)
-    similarities = calculate_similarity(df, user_scores)
-    return [int(pid) for pid, _ in similarities[:top_n]]
+
+# 回答をルール表で評価項目スコアに変換（table 未指定なら既定ルール）
+def convert_answers_to_scores(user_input: UserInput, table: Optional[ScoringTable] = None) -> Dict[int, float]:
+    table = table or default_table()
+    return table.score([(ans.questionId, ans.value) for ans in user_input.answers])
+
+# 複数の回答セットをまとめて変換（tables は user_inputs と同じ並び）
+def convert_answers_to_scores_many(user_inputs: List[UserInput], tables: List[ScoringTable]) -> List[Dict[int, float]]:
+    groups: Dict[int, List[int]] = {}
+    by_id: Dict[int, ScoringTable] = {}
+    for i, table in enumerate(tables):
+        groups.setdefault(id(table), []).append(i)
+        by_id[id(table)] = table
+
+    results: List[Dict[int, float]] = [{} for _ in user_inputs]
+    for key, indices in groups.items():
+        scored = by_id[key].score_many([
+            [(ans.questionId, ans.value) for ans in user_inputs[i].answers]
+            for i in indices
+        ])
+        for i, scores in zip(indices, scored):
+            results[i] = scores
+    return results
+
+async def get_scoring_table_async(category_id: Optional[int], db: AsyncSession) -> ScoringTable:
+    snapshot = await scoring_rules.get_async()
+    return snapshot.table_for(category_id)
+
+# 価格・寸法条件を {列名: (下限, 上限)} に変換
+def constraint_bounds(constraints: Optional[ProductConstraints]) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    if constraints is None:
+        return {}
+    return {
+        "price": (constraints.minPrice, constraints.maxPrice),
+        "width": (constraints.minWidth, constraints.maxWidth),
+        "depth": (constraints.minDepth, constraints.maxDepth),
+        "height": (constraints.minHeight, constraints.maxHeight),
+    }
+
+# 候補にしてよい商品のマスク（在庫と価格・寸法条件の積。どちらもなければ None）
+def candidate_mask(
+    catalog: CatalogSnapshot,
+    stock: Optional[StockSnapshot],
+    category_id: Optional[int],
+    store_id: Optional[int],
+    constraints: Optional[ProductConstraints]
+):
+    matrix = catalog.matrix_for(category_id)
+    masks = [
+        stock.mask_for(matrix, store_id) if stock is not None and store_id is not None else None,
+        catalog.constraint_mask(category_id, constraint_bounds(constraints)),
+    ]
+    masks = [mask for mask in masks if mask is not None]
+    if not masks:
+        return None
+    return masks[0] if len(masks) == 1 else masks[0] & masks[1]
+
+# store_id を渡すとその店舗で在庫のある商品だけ、constraints を渡すと条件を満たす商品だけから選ぶ
+async def get_top_products_async(
+    user_scores: Dict[int, float],
+    db: AsyncSession,
+    top_n=3,
+    category_id: Optional[int] = None,
+    store_id: Optional[int] = None,
+    constraints: Optional[ProductConstraints] = None
+) -> List[int]:
+    catalog = await catalog_cache.get_async()
+    stock = await stock_cache.get_async() if store_id is not None else None
+    # 距離計算はスレッドで行い、イベントループを止めない
+    return await run_in_threadpool(rank_top_products, catalog, stock, user_scores, top_n, category_id, store_id, constraints)
+
+def rank_top_products(
+    catalog: CatalogSnapshot,
+    stock: Optional[StockSnapshot],
+    user_scores: Dict[int, float],
+    top_n: int,
+    category_id: Optional[int],
+    store_id: Optional[int],
+    constraints: Optional[ProductConstraints]
+) -> List[int]:
+    allowed = candidate_mask(catalog, stock, category_id, store_id, constraints)
+    return catalog.matrix_for(category_id).top_n(user_scores, top_n, allowed)
+
+# 複数ユーザーの上位商品をカテゴリ単位の行列演算でまとめて算出
+def get_top_products_batch(
+    user_scores_list: List[Dict[int, float]],
+    category_ids: List[Optional[int]],
+    db: Session,
+    top_n=3,
+    store_ids: Optional[List[Optional[int]]] = None,
+    constraints_list: Optional[List[Optional[ProductConstraints]]] = None
+) -> List[List[int]]:
+    catalog = catalog_cache.get(db)
+    stock = stock_cache.get(db) if store_ids and any(s is not None for s in store_ids) else None
+    store_ids = store_ids or [None] * len(user_scores_list)
+    constraints_list = constraints_list or [None] * len(user_scores_list)
+    groups: Dict[Optional[int], List[int]] = {}
+    for i, category_id in enumerate(category_ids):
+        groups.setdefault(category_id, []).append(i)
+
+    results: List[List[int]] = [[] for _ in user_scores_list]
+    for category_id, indices in groups.items():
+        matrix = catalog.matrix_for(category_id)
+        allowed = [
+            candidate_mask(catalog, stock, category_id, store_ids[i], constraints_list[i])
+            for i in indices
+        ]
+        ranked = matrix.top_n_many([user_scores_list[i] for i in indices], top_n, allowed)
+        for i, product_ids in zip(indices, ranked):
+            results[i] = product_ids
+    return results
+
+# 受付に紐づくカテゴリIDを取得（受付が存在しない場合は None）
+async def get_reception_category_async(reception_id: int, db: AsyncSession) -> Optional[int]:
+    return await db.scalar(
+        select(models.Reception.category_id).where(models.Reception.id == reception_id)
+    )
+
+# 受付のカテゴリIDと店舗ID（受付 → ユーザーの店舗）を1クエリで取得
+def reception_context_query():
+    return select(models.Reception.id, models.Reception.category_id, models.User.store_id).outerjoin(
+        models.User, models.User.id == models.Reception.user_id
+    )
+
+async def get_reception_context_async(reception_id: int, db: AsyncSession) -> Tuple[Optional[int], Optional[int]]:
+    row = (await db.execute(reception_context_query().where(models.Reception.id == reception_id))).first()
+    return (row.category_id, row.store_id) if row else (None, None)
+
+def get_reception_contexts(reception_ids: List[int], db: Session) -> Dict[int, Tuple[Optional[int], Optional[int]]]:
+    rows = db.execute(reception_context_query().where(models.Reception.id.in_(reception_ids))).all()
+    return {row.id: (row.category_id, row.store_id) for row in rows}
+
+# 複数受付のカテゴリIDを1クエリで取得
+async def get_reception_categories_async(reception_ids: List[int], db: AsyncSession) -> Dict[int, int]:
+    rows = await db.execute(
+        select(models.Reception.id, models.Reception.category_id).where(models.Reception.id.in_(reception_ids))
+    )
+    return {reception_id: category_id for reception_id, category_id in rows}
 
 # recommend商品を保存
-def save_suggestions(reception_id: int, product_ids: List[int], db: Session, max_retries: int = 3):
+async def save_suggestions_async(reception_id: int, product_ids: List[int], db: AsyncSession, max_retries: int = 3):
     retries = 0
     while retries < max_retries:
         try:
             # 既存レコード削除
-            db.query(models.Suggestion).filter(models.Suggestion.reception_id == reception_id).delete()
+            await db.execute(delete(models.Suggestion).where(models.Suggestion.reception_id == reception_id))
 
-            # Suggestion オブジェクト作成
-            suggestions = [
-                models.Suggestion(reception_id=reception_id, product_id=pid, ranking=rank)
+            rows = [
+                {"reception_id": reception_id, "product_id": pid, "ranking": rank}
                 for rank, pid in enumerate(product_ids, start=1)
             ]
+            if rows:
+                await db.execute(insert(models.Suggestion), rows)
+            await db.commit()
+            return  # 成功したら終了
 
-            db.bulk_save_objects(suggestions)
+        except OperationalError as e:
+            if "Deadlock found" in str(e):
+                await db.rollback()
+                retries += 1
+                await asyncio.sleep(0.5)  # リトライ前に少し待機
+            else:
+                await db.rollback()
+                raise  # その他のエラーはそのまま上へ
+
+    # すべてのリトライで失敗した場合
+    raise Exception(f"Deadlock could not be resolved after {max_retries} retries.")
+
+# 複数受付の recommend 商品を1トランザクションで保存
+def save_suggestions_bulk(suggestions_by_reception: Dict[int, List[int]], db: Session, max_retries: int = 3):
+    retries = 0
+    while retries < max_retries:
+        try:
+            # 既存レコード削除
+            db.query(models.Suggestion).filter(
+                models.Suggestion.reception_id.in_(list(suggestions_by_reception))
+            ).delete(synchronize_session=False)
+
+            rows = [
+                {"reception_id": reception_id, "product_id": pid, "ranking": rank}
+                for reception_id, product_ids in suggestions_by_reception.items()
+                for rank, pid in enumerate(product_ids, start=1)
+            ]
+            if rows:
+                db.execute(insert(models.Suggestion), rows)
             db.commit()
             return  # 成功したら終了
 
@@ -90,83 +214,34 @@ def save_suggestions(reception_id: int, product_ids: List[int], db: Session, max
 
 # recommend商品の詳細とスコアの取得
 def get_product_details(product_ids: List[int], reception_id: int, db: Session):
-    ids_str = "(" + ",".join(map(str, product_ids)) + ")"
+    return build_product_details(catalog_cache.get(db), product_ids)
 
-    # Blob SAS URL生成用環境変数読み込み
-    load_dotenv()
-    account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
-    account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
-    container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
+async def get_product_details_async(product_ids: List[int], reception_id: int, db: AsyncSession):
+    # 商品詳細の組み立てと画像 URL の署名はスレッドで行う
+    return await run_in_threadpool(build_product_details, await catalog_cache.get_async(), product_ids)
 
-    def generate_sas_url(blob_name: str):
-        if not blob_name:
-            return None
-        try:
-            sas_token = generate_blob_sas(
-                account_name=account_name,
-                container_name=container_name,
-                blob_name=blob_name,
-                account_key=account_key,
-                permission=BlobSasPermissions(read=True),
-                expiry=datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
-            )
-            return f"https://{account_name}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
-        except Exception:
-            return None
-
-    # 商品情報の取得
-    query = f"""
-        SELECT
-            p.id,
-            p.name,
-            p.brand,
-            p.price,
-            p.width,
-            p.depth,
-            p.height,
-            p.description,
-            p.image AS image,
-            c.name AS category
-        FROM product p
-        LEFT JOIN category c ON p.category_id = c.id
-        WHERE p.id IN {ids_str}
-    """
-    df = pd.read_sql(query, db.bind)
-
-    # 商品ごとの metrics スコアを取得（metrics_id を使うように修正）
-    score_query = f"""
-        SELECT
-            pm.product_id,
-            pm.metrics_id,
-            pm.level
-        FROM product_metrics pm
-        WHERE pm.product_id IN {ids_str}
-    """
-    score_df = pd.read_sql(score_query, db.bind)
-
-    # 商品IDごとのスコア辞書に変換（← metrics_id を key に）
-    score_dict = (
-        score_df.groupby("product_id")
-        .apply(lambda x: {str(row["metrics_id"]): row["level"] for _, row in x.iterrows()})
-        .to_dict()
+def build_product_details(catalog: CatalogSnapshot, product_ids: List[int]):
+    # 商品詳細とスコアはカタログ読み込み時に組み立て済み（ここでは辞書を引くだけ）
+    # 並び順は従来どおり product テーブルの並び順
+    products = sorted(
+        (catalog.details[pid] for pid in set(product_ids) if pid in catalog.details),
+        key=lambda product: product["position"]
     )
 
-    # 商品詳細とスコア統合
+    # 商品画像の SAS URL はまとめて署名（キャッシュ済みならそのまま）
+    image_urls = generate_sas_urls(product["image"] for product in products)
+
     return [
         {
-            "id": int(row["id"]),
-            "name": row["name"],
-            "brand": row["brand"],
-            "price": row["price"],
-            "dimensions": {
-                "width": row["width"],
-                "depth": row["depth"],
-                "height": row["height"]
-            },
-            "description": row["description"],
-            "image": generate_sas_url(row["image"]),
-            "category": row["category"],
-            "scores": score_dict.get(row["id"], {})  # ← RadarChart 用にここで渡す！
+            "id": product["id"],
+            "name": product["name"],
+            "brand": product["brand"],
+            "price": product["price"],
+            "dimensions": dict(product["dimensions"]),
+            "description": product["description"],
+            "category": product["category"],
+            "image": image_urls.get(product["image"]),
+            "scores": dict(product["scores"])  # ← RadarChart 用にここで渡す！
         }
-        for _, row in df.iterrows()
-    ]
\ No newline at end of file
+        for product in products
+    ]
@@ -0,0 +1,226 @@
+from typing import Callable, List, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from db_control import models
+from db_control.connect import SessionLocal
+from db_control.metrics import outbound
+import datetime
+import threading
+import os
+
+# 送信設定（.env に記載）
+SLACK_TIMEOUT_SECONDS = float(os.getenv("SLACK_TIMEOUT_SECONDS", "5"))
+SLACK_MAX_ATTEMPTS = int(os.getenv("SLACK_MAX_ATTEMPTS", "5"))
+SLACK_BACKOFF_SECONDS = float(os.getenv("SLACK_BACKOFF_SECONDS", "2"))
+SLACK_BACKOFF_MAX_SECONDS = float(os.getenv("SLACK_BACKOFF_MAX_SECONDS", "60"))
+# 同じ受付の送信済み通知から、この秒数以内の呼び出しは送らずにまとめる（0 なら無効）
+# 送信待ちが同時に複数ある場合は、この設定に関係なく最新の1件だけを送る
+SLACK_COALESCE_SECONDS = float(os.getenv("SLACK_COALESCE_SECONDS", "0"))
+# 送信中のまま止まった通知を再取得するまでの時間（秒）
+SALES_CALL_LEASE_SECONDS = float(os.getenv("SALES_CALL_LEASE_SECONDS", "60"))
+SALES_CALL_POLL_SECONDS = float(os.getenv("SALES_CALL_POLL_SECONDS", "5"))
+
+
+def build_http_session(pool_size: int = 4):
+    # requests は最初の送信時に読み込む
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # 接続を使い回すためのセッション（Keep-Alive）
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+# outbox（sales_call_notification）に溜まった通知を Slack に送るバックグラウンド処理
+class SalesCallDispatcher:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        webhook_url: Optional[str],
+        http_session=None,
+        timeout: float = SLACK_TIMEOUT_SECONDS,
+        max_attempts: int = SLACK_MAX_ATTEMPTS,
+        backoff: float = SLACK_BACKOFF_SECONDS,
+        backoff_max: float = SLACK_BACKOFF_MAX_SECONDS,
+        coalesce_seconds: float = SLACK_COALESCE_SECONDS,
+        poll_seconds: float = SALES_CALL_POLL_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.webhook_url = webhook_url
+        self._http = http_session
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.coalesce_seconds = coalesce_seconds
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+
+    # HTTP セッションは送信するものが出てきた時点で作成する
+    @property
+    def http(self):
+        if self._http is None:
+            self._http = build_http_session()
+        return self._http
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sales-call-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    # 新しい通知が積まれたら待機中のスレッドを起こす
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.dispatch_once()
+            except Exception as e:
+                print("Sales call dispatcher error:", e)
+            self._wake.wait(self.poll_seconds)
+
+    # 送信期限が来た通知を1回分処理する（テストからも直接呼べる）
+    def dispatch_once(self) -> int:
+        db = self.session_factory()
+        try:
+            processed = 0
+            for notification in self._claim_due(db):
+                self._deliver(db, notification)
+                processed += 1
+            return processed
+        finally:
+            db.close()
+
+    def _claim_due(self, db: Session) -> List[models.SalesCallNotification]:
+        now = datetime.datetime.utcnow()
+        Notification = models.SalesCallNotification
+        due = (
+            db.query(Notification)
+            .filter(Notification.status.in_(["pending", "sending"]))
+            .filter(Notification.next_attempt_at <= now)
+            .order_by(Notification.id)
+            .all()
+        )
+        # 読み込んだ時点の状態（コミットで各行が再読み込みされる前に控えておく）
+        seen = {n.id: (n.status, n.attempts, n.next_attempt_at) for n in due}
+
+        # 同じ受付の未送信分は最新の1件だけ送る
+        latest = {}
+        for notification in due:
+            if notification.reception_id is not None:
+                latest[notification.reception_id] = notification
+        claimed = []
+        for notification in due:
+            superseded = notification.reception_id is not None and latest[notification.reception_id] is not notification
+            if superseded or self._recently_sent(db, notification, now):
+                if self._update_if_unchanged(db, notification, seen[notification.id], status="coalesced"):
+                    self.coalesced += 1
+                continue
+            lease = models.utcnow_seconds() + datetime.timedelta(seconds=SALES_CALL_LEASE_SECONDS)
+            if self._update_if_unchanged(db, notification, seen[notification.id], status="sending", next_attempt_at=lease):
+                claimed.append(notification)
+        return claimed
+
+    # 他のワーカーと取り合わないよう、読み込んだ時点から変わっていない場合だけ更新する
+    # 取得のたびに next_attempt_at（リース期限）が進むので、期限切れの送信中を
+    # 複数のワーカーが同時に取得しても成功するのは1つだけ
+    def _update_if_unchanged(self, db: Session, notification: models.SalesCallNotification, seen: tuple, **values) -> bool:
+        Notification = models.SalesCallNotification
+        status, attempts, next_attempt_at = seen
+        result = db.execute(
+            update(Notification)
+            .where(Notification.id == notification.id)
+            .where(Notification.status == status)
+            .where(Notification.attempts == attempts)
+            .where(Notification.next_attempt_at == next_attempt_at)
+            .values(**values)
+        )
+        db.commit()
+        if result.rowcount != 1:
+            return False
+        db.refresh(notification)
+        return True
+
+    def _recently_sent(self, db: Session, notification: models.SalesCallNotification, now: datetime.datetime) -> bool:
+        if notification.reception_id is None or self.coalesce_seconds <= 0:
+            return False
+        Notification = models.SalesCallNotification
+        since = now - datetime.timedelta(seconds=self.coalesce_seconds)
+        return db.query(Notification.id).filter(
+            Notification.reception_id == notification.reception_id,
+            Notification.status == "sent",
+            Notification.sent_at >= since
+        ).first() is not None
+
+    def _deliver(self, db: Session, notification: models.SalesCallNotification):
+        try:
+            if not self.webhook_url:
+                raise RuntimeError("SLACK_WEBHOOK_URL is not set")
+            with outbound("slack"):
+                response = self.http.post(self.webhook_url, data=notification.payload, timeout=self.timeout)
+            if response.status_code != 200:
+                raise RuntimeError(f"Slack responded {response.status_code}: {response.text[:200]}")
+        except Exception as e:
+            self._retry_or_fail(db, notification, str(e))
+            return
+
+        notification.sent_at = datetime.datetime.utcnow()
+        self._mark(db, notification, "sent")
+        self.sent += 1
+
+    def _retry_or_fail(self, db: Session, notification: models.SalesCallNotification, error: str):
+        notification.attempts += 1
+        notification.last_error = error[:255]
+        if notification.attempts >= self.max_attempts:
+            self._mark(db, notification, "failed")
+            self.failed += 1
+            return
+        # 指数バックオフで再送
+        delay = min(self.backoff * (2 ** (notification.attempts - 1)), self.backoff_max)
+        notification.next_attempt_at = models.utcnow_seconds() + datetime.timedelta(seconds=delay)
+        self._mark(db, notification, "pending")
+        self.retried += 1
+
+    def _mark(self, db: Session, notification: models.SalesCallNotification, status: str):
+        notification.status = status
+        db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "running": bool(self._thread and self._thread.is_alive()),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+        }
+
+
+_dispatcher: Optional[SalesCallDispatcher] = None
+
+
+def get_dispatcher() -> SalesCallDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = SalesCallDispatcher(SessionLocal, os.getenv("SLACK_WEBHOOK_URL"))
+    return _dispatcher
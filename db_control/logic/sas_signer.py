@@ -0,0 +1,119 @@
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+from db_control.metrics import outbound
+import datetime
+import threading
+import time
+import os
+
+# SAS URL の有効期間（分）と、期限切れ前に再署名する余裕（秒）
+SAS_URL_LIFETIME_MINUTES = float(os.getenv("SAS_URL_LIFETIME_MINUTES", "10"))
+SAS_REFRESH_AHEAD_SECONDS = float(os.getenv("SAS_REFRESH_AHEAD_SECONDS", "120"))
+
+
+# Blob の読み取り用 SAS URL を署名・キャッシュする
+class SasSigner:
+    def __init__(
+        self,
+        account_name: Optional[str],
+        account_key: Optional[str],
+        container_name: Optional[str],
+        lifetime_minutes: float = SAS_URL_LIFETIME_MINUTES,
+        refresh_ahead_seconds: float = SAS_REFRESH_AHEAD_SECONDS
+    ):
+        self.account_name = account_name
+        self.account_key = account_key
+        self.container_name = container_name
+        self.lifetime = lifetime_minutes * 60
+        # 有効期間より長い余裕は意味がないので半分までに抑える
+        self.refresh_ahead = min(refresh_ahead_seconds, self.lifetime / 2)
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.signs = 0
+
+    @classmethod
+    def from_env(cls) -> "SasSigner":
+        load_dotenv()
+        return cls(
+            os.getenv("AZURE_STORAGE_ACCOUNT_NAME"),
+            os.getenv("AZURE_STORAGE_ACCOUNT_KEY"),
+            os.getenv("AZURE_STORAGE_CONTAINER_NAME"),
+        )
+
+    def sign(self, blob_name: Optional[str]) -> Optional[str]:
+        if not blob_name:
+            return None
+        return self.sign_many([blob_name])[blob_name]
+
+    # 複数の Blob をまとめて署名（キャッシュ確認は1回のロックで行う）
+    def sign_many(self, blob_names: Iterable[Optional[str]]) -> Dict[str, Optional[str]]:
+        now = time.time()
+        result: Dict[str, Optional[str]] = {}
+        with self._lock:
+            for blob_name in blob_names:
+                if not blob_name or blob_name in result:
+                    continue
+                cached = self._cache.get(blob_name)
+                if cached is not None and now < cached[1] - self.refresh_ahead:
+                    self.hits += 1
+                    result[blob_name] = cached[0]
+                    continue
+                url = self._generate(blob_name, now)
+                if url is not None:
+                    self._cache[blob_name] = (url, now + self.lifetime)
+                result[blob_name] = url
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "signs": self.signs,
+            "cached": len(self._cache),
+        }
+
+    def _generate(self, blob_name: str, now: float) -> Optional[str]:
+        # azure SDK は署名が必要になった時点で読み込む（import が重いため）
+        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
+        self.signs += 1
+        try:
+            with outbound("sas"):
+                sas_token = generate_blob_sas(
+                    account_name=self.account_name,
+                    container_name=self.container_name,
+                    blob_name=blob_name,
+                    account_key=self.account_key,
+                    permission=BlobSasPermissions(read=True),
+                    expiry=datetime.datetime.utcfromtimestamp(now + self.lifetime)
+                )
+            return f"https://{self.account_name}.blob.core.windows.net/{self.container_name}/{blob_name}?{sas_token}"
+        except Exception:
+            return None
+
+
+_signer: Optional[SasSigner] = None
+_signer_lock = threading.Lock()
+
+
+# ワーカー共通の署名器（初回アクセス時に環境変数を1回だけ読み込む）
+def get_signer() -> SasSigner:
+    global _signer
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                _signer = SasSigner.from_env()
+    return _signer
+
+
+def generate_sas_url(blob_name: Optional[str]) -> Optional[str]:
+    return get_signer().sign(blob_name)
+
+
+def generate_sas_urls(blob_names: Iterable[Optional[str]]) -> Dict[str, Optional[str]]:
+    return get_signer().sign_many(blob_names)
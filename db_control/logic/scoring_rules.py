@@ -0,0 +1,204 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from db_control.logic.versioned_cache import VersionedCache
+import threading
+import time
+import os
+
+# 全評価項目の初期スコアと、ルール変更の確認間隔（秒）
+SCORING_BASE_SCORE = float(os.getenv("SCORING_BASE_SCORE", "4.5"))
+SCORING_PROBE_INTERVAL = float(os.getenv("SCORING_PROBE_INTERVAL", "30"))
+
+# scoring_rule が未登録のカテゴリで使う既定ルール（従来の convert_answers_to_scores と同じ）
+# (question_id, value, metrics_id, delta)
+DEFAULT_STEP = 0.25
+DEFAULT_METRIC_IDS = list(range(1, 10))
+DEFAULT_SCORING_RULES = [
+    (1, 0, 1, DEFAULT_STEP),
+    (1, 1, 5, DEFAULT_STEP),
+    (2, 1, 4, DEFAULT_STEP),
+    (4, 0, 6, DEFAULT_STEP),
+    (5, 0, 3, DEFAULT_STEP),
+    (7, 0, 1, DEFAULT_STEP),
+    (7, 1, 9, DEFAULT_STEP),
+    (8, 0, 2, DEFAULT_STEP),
+    (8, 1, 5, DEFAULT_STEP),
+    (9, 0, 1, DEFAULT_STEP),
+    (10, 0, 6, DEFAULT_STEP),
+    (10, 0, 9, -DEFAULT_STEP),
+    (11, 0, 7, DEFAULT_STEP),
+    (11, 0, 8, DEFAULT_STEP),
+]
+
+RULE_QUERY = """
+    SELECT q.category_id, r.question_id, r.value, r.metrics_id, r.delta
+    FROM scoring_rule r
+    JOIN question q ON r.question_id = q.id
+    ORDER BY r.id
+"""
+
+METRIC_QUERY = "SELECT id, category_id FROM metrics ORDER BY id"
+
+# ルール・評価項目の変更を集計値1行で検知する
+SCORING_VERSION_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM scoring_rule),
+        (SELECT COALESCE(MAX(id), 0) FROM scoring_rule),
+        (SELECT COALESCE(SUM(delta), 0) FROM scoring_rule),
+        (SELECT COALESCE(SUM(question_id * 31 + value * 7 + metrics_id), 0) FROM scoring_rule),
+        (SELECT COUNT(*) FROM metrics),
+        (SELECT COALESCE(SUM(id * 31 + COALESCE(category_id, 0)), 0) FROM metrics)
+"""
+
+
+# (question_id, value) を1つの整数キーにまとめる
+def encode_keys(question_ids, values):
+    import numpy as np
+    question_ids = np.asarray(question_ids, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    return (question_ids << 32) | (values & 0xFFFFFFFF)
+
+
+# カテゴリ単位にコンパイル済みのスコアリング表
+# 回答キー × 評価項目の疎行列を CSR 形式（indptr / cols / deltas）で持つ
+class ScoringTable:
+    def __init__(self, metric_ids: Sequence[int], rules: Iterable[Tuple[int, int, int, float]], base_score: float = SCORING_BASE_SCORE):
+        import numpy as np
+        self.base_score = base_score
+        self.metric_ids = np.asarray(sorted({int(m) for m in metric_ids}), dtype=np.int64)
+        self.metric_index = {int(mid): j for j, mid in enumerate(self.metric_ids)}
+
+        entries: Dict[int, List[Tuple[int, float]]] = {}
+        self.rule_count = 0
+        for question_id, value, metrics_id, delta in rules:
+            j = self.metric_index.get(int(metrics_id))
+            if j is None:
+                continue
+            key = int(encode_keys([question_id], [value])[0])
+            entries.setdefault(key, []).append((j, float(delta)))
+            self.rule_count += 1
+
+        self.keys = np.asarray(sorted(entries), dtype=np.int64)
+        counts = [len(entries[key]) for key in self.keys.tolist()]
+        self.indptr = np.concatenate(([0], np.cumsum(counts, dtype=np.int64))).astype(np.int64)
+        flat = [entry for key in self.keys.tolist() for entry in entries[key]]
+        self.cols = np.asarray([j for j, _ in flat], dtype=np.int64)
+        self.deltas = np.asarray([delta for _, delta in flat], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.metric_ids)
+
+    # 複数の回答セットをまとめて採点（回答セット × 評価項目の行列を返す）
+    def score_matrix(self, answer_sets: Sequence[Sequence[Tuple[int, int]]]):
+        import numpy as np
+        n_sets, n_metrics = len(answer_sets), len(self.metric_ids)
+        scores = np.full((n_sets, n_metrics), self.base_score)
+        sizes = [len(answers) for answers in answer_sets]
+        if not sum(sizes) or not len(self.keys):
+            return scores
+
+        set_index = np.repeat(np.arange(n_sets), sizes)
+        question_ids, values = zip(*(pair for answers in answer_sets for pair in answers))
+        codes = encode_keys(question_ids, values)
+
+        # 回答キー → ルール行（ルールのない回答は捨てる）
+        rows = np.searchsorted(self.keys, codes)
+        rows = np.minimum(rows, len(self.keys) - 1)
+        matched = self.keys[rows] == codes
+        rows, set_index = rows[matched], set_index[matched]
+
+        # 各ルール行の (評価項目, 加減点) を展開して回答セットごとに合計
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if not total:
+            return scores
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        entries = np.repeat(starts, lengths) + offsets
+        flat = np.repeat(set_index, lengths) * n_metrics + self.cols[entries]
+        scores += np.bincount(flat, weights=self.deltas[entries], minlength=n_sets * n_metrics).reshape(n_sets, n_metrics)
+        return scores
+
+    def score_many(self, answer_sets: Sequence[Sequence[Tuple[int, int]]]) -> List[Dict[int, float]]:
+        metric_ids = self.metric_ids.tolist()
+        return [dict(zip(metric_ids, row)) for row in self.score_matrix(answer_sets).tolist()]
+
+    def score(self, answers: Sequence[Tuple[int, int]]) -> Dict[int, float]:
+        return self.score_many([answers])[0]
+
+
+_default_table: Optional[ScoringTable] = None
+_default_table_lock = threading.Lock()
+
+
+# 既定ルールの表（初回利用時に1回だけコンパイル）
+def default_table() -> ScoringTable:
+    global _default_table
+    table = _default_table
+    if table is None:
+        with _default_table_lock:
+            if _default_table is None:
+                _default_table = ScoringTable(DEFAULT_METRIC_IDS, DEFAULT_SCORING_RULES)
+            table = _default_table
+    return table
+
+
+# ある時点の scoring_rule をカテゴリごとにコンパイルしたもの
+class ScoringSnapshot:
+    def __init__(self, version: Tuple, rule_rows: Sequence[Tuple], metric_rows: Sequence[Tuple]):
+        self.version = version
+        self.rule_count = len(rule_rows)
+        rules: Dict[int, List[Tuple[int, int, int, float]]] = {}
+        metrics: Dict[int, List[int]] = {}
+        for category_id, question_id, value, metrics_id, delta in rule_rows:
+            if category_id is not None:
+                rules.setdefault(int(category_id), []).append((question_id, value, metrics_id, float(delta)))
+        for metrics_id, category_id in metric_rows:
+            if category_id is not None:
+                metrics.setdefault(int(category_id), []).append(int(metrics_id))
+
+        # ルールのあるカテゴリだけ表を作る（カテゴリの全評価項目を初期スコアで含める）
+        self.tables = {
+            category_id: ScoringTable(
+                metrics.get(category_id, []) + [rule[2] for rule in category_rules],
+                category_rules
+            )
+            for category_id, category_rules in rules.items()
+        }
+        self.loaded_at = time.time()
+
+    def table_for(self, category_id: Optional[int]) -> ScoringTable:
+        if category_id is not None:
+            table = self.tables.get(int(category_id))
+            if table is not None:
+                return table
+        return default_table()
+
+
+# ワーカー単位のスコアリングルールキャッシュ（ルール変更は probe で検知して再コンパイル）
+class ScoringRuleCache(VersionedCache):
+    VERSION_QUERY = SCORING_VERSION_QUERY
+
+    def __init__(self, probe_interval: float = SCORING_PROBE_INTERVAL):
+        super().__init__(probe_interval)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            **super().stats(),
+            "rules": snapshot.rule_count if snapshot else 0,
+            "categories": {
+                category_id: {"metrics": len(table), "rules": table.rule_count}
+                for category_id, table in snapshot.tables.items()
+            } if snapshot else {},
+        }
+
+    def _load(self, db: Session, version: Tuple, previous: Optional[ScoringSnapshot]) -> ScoringSnapshot:
+        rule_rows = db.execute(text(RULE_QUERY)).all()
+        metric_rows = db.execute(text(METRIC_QUERY)).all()
+        return ScoringSnapshot(version, rule_rows, metric_rows)
+
+
+scoring_rules = ScoringRuleCache()
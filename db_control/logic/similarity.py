@@ -0,0 +1,134 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# numpy はワーカー起動時に読み込まないよう、使う関数の中で import する
+
+# distances_many で一度に作る中間配列の要素数の上限（約 2MB。大きくしてもキャッシュに乗らず遅くなる）
+DISTANCE_CHUNK_CELLS = 250_000
+
+
+# 商品×評価項目の密行列（product_metrics をピボットしたもの）
+class ProductMatrix:
+    def __init__(self, product_ids: np.ndarray, metric_ids: np.ndarray, levels: np.ndarray):
+        import numpy as np
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.metric_ids = np.asarray(metric_ids, dtype=np.int64)
+        # 未登録の評価項目は NaN、present で有無を保持
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.present = ~np.isnan(self.levels)
+        self.metric_index = {int(mid): j for j, mid in enumerate(self.metric_ids)}
+        # 近傍探索インデックス（nn_index.build_indexes がバックグラウンドで設定）
+        self.index = None
+
+    @classmethod
+    def from_rows(cls, product_ids: Sequence[int], metric_ids: Sequence[int], levels: Sequence[float]) -> "ProductMatrix":
+        import numpy as np
+        # 出現順を保ったままコード化（従来の unique() 順 = 同点時の順位を維持）
+        p_codes, p_uniques = factorize(product_ids)
+        m_codes, m_uniques = factorize(metric_ids)
+        matrix = np.full((len(p_uniques), len(m_uniques)), np.nan)
+        matrix[p_codes, m_codes] = np.asarray(levels, dtype=np.float64)
+        return cls(p_uniques, m_uniques, matrix)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def user_vector(self, user_scores: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        import numpy as np
+        vec = np.zeros(len(self.metric_ids))
+        mask = np.zeros(len(self.metric_ids), dtype=bool)
+        for mid, score in user_scores.items():
+            j = self.metric_index.get(int(mid))
+            if j is not None:
+                vec[j] = score
+                mask[j] = True
+        return vec, mask
+
+    def distances(self, user_scores: Dict[int, float]) -> np.ndarray:
+        import numpy as np
+        # ユーザー・商品の双方にある評価項目だけで距離を計算（従来と同じ扱い）
+        vec, mask = self.user_vector(user_scores)
+        diff = np.where(self.present & mask, self.levels - vec, 0.0)
+        return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+    # allowed: 候補にしてよい商品の真偽マスク（在庫・条件での絞り込み用、None なら全商品）
+    def top_n(self, user_scores: Dict[int, float], top_n: int = 3, allowed: Optional[np.ndarray] = None) -> List[int]:
+        index = self.index
+        if index is not None:
+            return index.top_n(user_scores, top_n, allowed)
+        order = select_allowed_top_n(self.distances(user_scores), top_n, allowed)
+        return [int(pid) for pid in self.product_ids[order]]
+
+    def distances_many(self, user_scores_list: List[Dict[int, float]]) -> np.ndarray:
+        import numpy as np
+        # ユーザー×商品の距離行列をまとめて計算
+        # 1件ずつの distances と同じ (l - u)^2 の形で計算する（展開形だと丸め誤差で同点の順位が変わる）
+        if not user_scores_list:
+            return np.empty((0, len(self)))
+        vectors, masks = zip(*(self.user_vector(scores) for scores in user_scores_list))
+        u = np.array(vectors)
+        m = np.array(masks, dtype=bool)
+        result = np.empty((len(u), len(self)))
+        # ユーザー数×商品数×評価項目数の中間配列が大きくなりすぎないよう分割する
+        cells = max(len(self) * len(self.metric_ids), 1)
+        chunk = max(DISTANCE_CHUNK_CELLS // cells, 1)
+        for start in range(0, len(u), chunk):
+            stop = start + chunk
+            diff = np.where(
+                self.present[None, :, :] & m[start:stop, None, :],
+                self.levels[None, :, :] - u[start:stop, None, :],
+                0.0
+            )
+            result[start:stop] = np.sqrt(np.einsum("uij,uij->ui", diff, diff))
+        return result
+
+    def top_n_many(
+        self,
+        user_scores_list: List[Dict[int, float]],
+        top_n: int = 3,
+        allowed: Optional[Sequence[Optional[np.ndarray]]] = None
+    ) -> List[List[int]]:
+        distances = self.distances_many(user_scores_list)
+        allowed = allowed or [None] * len(distances)
+        return [
+            [int(pid) for pid in self.product_ids[select_allowed_top_n(row, top_n, mask)]]
+            for row, mask in zip(distances, allowed)
+        ]
+
+
+# 出現順で値をコード化（pandas.factorize 相当）
+def factorize(values: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    import numpy as np
+    values = np.asarray(values, dtype=np.int64)
+    uniques, first_index, inverse = np.unique(values, return_index=True, return_inverse=True)
+    order = np.argsort(first_index)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse], uniques[order]
+
+
+# 距離の小さい順に上位 top_n のインデックスを返す（同点は元の並び順を優先）
+def select_top_n(distances: np.ndarray, top_n: int) -> np.ndarray:
+    import numpy as np
+    n = len(distances)
+    if top_n <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_n >= n:
+        candidates = np.arange(n)
+    else:
+        part = np.argpartition(distances, top_n - 1)
+        kth = distances[part[top_n - 1]]
+        # 境界と同点の商品も候補に残してから安定ソートする
+        candidates = np.flatnonzero(distances <= kth)
+    order = candidates[np.argsort(distances[candidates], kind="stable")]
+    return order[:top_n]
+
+
+# マスクで除外した商品を距離無限大として扱い、残りから上位 top_n を選ぶ
+def select_allowed_top_n(distances: np.ndarray, top_n: int, allowed: Optional[np.ndarray] = None) -> np.ndarray:
+    import numpy as np
+    if allowed is None:
+        return select_top_n(distances, top_n)
+    distances = np.where(allowed, distances, np.inf)
+    order = select_top_n(distances, top_n)
+    return order[np.isfinite(distances[order])]
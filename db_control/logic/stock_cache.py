@@ -0,0 +1,156 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_session
+from db_control import models
+from db_control.logic.versioned_cache import VersionedCache
+import threading
+import weakref
+import time
+import os
+
+# 在庫のある商品だけを推薦するか（リクエストの inStockOnly 未指定時の既定値）
+RECOMMEND_IN_STOCK_ONLY = os.getenv("RECOMMEND_IN_STOCK_ONLY", "false").lower() in ("1", "true", "yes")
+# 他ワーカーでの在庫更新を確認する間隔（秒）
+STOCK_PROBE_INTERVAL = float(os.getenv("STOCK_PROBE_INTERVAL", "30"))
+
+# 店舗ごとの変更検知用の集計値
+STOCK_VERSION_QUERY = """
+    SELECT store_id, COUNT(*), COALESCE(SUM(number), 0), COALESCE(MAX(id), 0)
+    FROM stock
+    GROUP BY store_id
+"""
+
+STOCK_QUERY = """
+    SELECT store_id, product_id, SUM(number)
+    FROM stock
+    GROUP BY store_id, product_id
+"""
+
+STORE_STOCK_QUERY = """
+    SELECT product_id, SUM(number)
+    FROM stock
+    WHERE store_id = :store_id
+    GROUP BY product_id
+"""
+
+
+def resolve_in_stock_only(in_stock_only: Optional[bool]) -> bool:
+    return RECOMMEND_IN_STOCK_ONLY if in_stock_only is None else in_stock_only
+
+
+# 店舗単位の在庫あり商品（色違いの在庫は合算する）
+def in_stock_ids(rows: Iterable[Tuple[int, float]]):
+    import numpy as np
+    return np.asarray(sorted(int(product_id) for product_id, number in rows if number and number > 0), dtype=np.int64)
+
+
+# ある時点の店舗ごとの在庫あり商品ID
+# カタログ行列と同じ並びの真偽マスクを作って使い回す（カタログ再読み込みで古い行列が消えれば一緒に消える）
+class StockSnapshot:
+    def __init__(self, version: Tuple, stores: Dict[int, object]):
+        self.version = version
+        self.stores = stores
+        self._masks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.loaded_at = time.time()
+
+    # 在庫マスク（在庫を管理していない店舗は None = 絞り込まない）
+    def mask_for(self, matrix, store_id: Optional[int]):
+        import numpy as np
+        if store_id is None:
+            return None
+        product_ids = self.stores.get(int(store_id))
+        if product_ids is None:
+            return None
+        with self._lock:
+            masks = self._masks.setdefault(matrix, {})
+            mask = masks.get(store_id)
+            if mask is None:
+                mask = np.isin(matrix.product_ids, product_ids)
+                masks[store_id] = mask
+            return mask
+
+
+# ワーカー単位の在庫キャッシュ
+# 変更は店舗単位で取り込む（ORM での更新はコミット時、他ワーカーの更新は probe で検知）
+class StockCache(VersionedCache):
+    VERSION_QUERY = STOCK_VERSION_QUERY
+
+    def __init__(self, probe_interval: float = STOCK_PROBE_INTERVAL):
+        super().__init__(probe_interval)
+        self._dirty: Set[int] = set()
+        self.store_reloads = 0
+
+    def mark_dirty(self, store_ids: Iterable[int]):
+        self._dirty.update(int(store_id) for store_id in store_ids if store_id is not None)
+
+    def invalidate(self):
+        super().invalidate()
+        self._dirty.clear()
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        stores = snapshot.stores if snapshot else {}
+        return {
+            **super().stats(),
+            "store_reloads": self.store_reloads,
+            "in_stock_only_default": RECOMMEND_IN_STOCK_ONLY,
+            "stores": {store_id: len(product_ids) for store_id, product_ids in stores.items()},
+        }
+
+    # コミット済みの変更がある間は確認間隔を待たずに読み直す
+    def _is_stale(self) -> bool:
+        return bool(self._dirty) or super()._is_stale()
+
+    def _is_current(self, snapshot: StockSnapshot, version: Tuple) -> bool:
+        return version == snapshot.version and not self._dirty
+
+    # 店舗ごとの集計値を (store_id, 集計値) の並びにまとめる
+    def _read_version(self, db: Session) -> Tuple:
+        rows = db.execute(text(STOCK_VERSION_QUERY)).all()
+        return tuple(sorted((int(row[0]), tuple(row[1:])) for row in rows))
+
+    def _load(self, db: Session, version: Tuple, previous: Optional[StockSnapshot]) -> StockSnapshot:
+        dirty, self._dirty = self._dirty, set()
+        if previous is None:
+            grouped: Dict[int, list] = {}
+            for store_id, product_id, number in db.execute(text(STOCK_QUERY)).all():
+                grouped.setdefault(int(store_id), []).append((product_id, number))
+            return StockSnapshot(version, {store_id: in_stock_ids(rows) for store_id, rows in grouped.items()})
+
+        # 集計値の変わった店舗とコミット済みの店舗だけ読み直す
+        before, after = dict(previous.version), dict(version)
+        changed = {store_id for store_id in set(before) | set(after) if before.get(store_id) != after.get(store_id)}
+        stores = dict(previous.stores)
+        for store_id in changed | dirty:
+            self.store_reloads += 1
+            rows = db.execute(text(STORE_STOCK_QUERY), {"store_id": store_id}).all()
+            if rows:
+                stores[store_id] = in_stock_ids(rows)
+            else:
+                stores.pop(store_id, None)
+        return StockSnapshot(version, stores)
+
+
+stock_cache = StockCache()
+
+
+# ORM 経由の在庫更新は、コミットされた時点で該当店舗だけを読み直す対象にする
+def _track_stock(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("stock_store_ids", set()).add(target.store_id)
+
+def _apply_stock_changes(session):
+    store_ids = session.info.pop("stock_store_ids", None)
+    if store_ids:
+        stock_cache.mark_dirty(store_ids)
+
+def _discard_stock_changes(session):
+    session.info.pop("stock_store_ids", None)
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(models.Stock, _event, _track_stock)
+event.listen(Session, "after_commit", _apply_stock_changes)
+event.listen(Session, "after_rollback", _discard_stock_changes)
@@ -0,0 +1,158 @@
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from db_control import models
+from db_control.logic.sas_signer import generate_sas_urls
+import threading
+import time
+import os
+
+# 店舗ブートストラップ情報の有効期間（秒）。DBを直接更新した場合の反映上限
+STORE_CACHE_TTL = float(os.getenv("STORE_CACHE_TTL", "300"))
+
+MEDIA_FIELDS = ("image", "video", "voice_1", "voice_2")
+
+
+# 店舗行・キャラクター情報のスナップショット
+class StoreBootstrap:
+    def __init__(self, store: models.Store, bic_girl: Optional[models.BicGirl], ttl: float):
+        self.store = {
+            "store_id": store.id,
+            "store_name": store.name,
+            "prefecture": store.prefecture,
+        }
+        self.character = {
+            "name": bic_girl.name if bic_girl else "",
+            "image": bic_girl.image if bic_girl else None,
+            "video": bic_girl.video if bic_girl else None,
+            "voice_1": bic_girl.voice_1 if bic_girl else None,
+            "voice_2": bic_girl.voice_2 if bic_girl else None,
+            "message_1": bic_girl.message_1 if bic_girl else None,
+            "message_2": bic_girl.message_2 if bic_girl else None,
+        }
+        self.expires_at = time.monotonic() + ttl
+
+    def is_expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    # レスポンス用の辞書（メディアは署名済み URL に置き換える）
+    def to_payload(self) -> dict:
+        urls = generate_sas_urls(self.character[field] for field in MEDIA_FIELDS)
+        character = dict(self.character)
+        for field in MEDIA_FIELDS:
+            character[field] = urls.get(character[field])
+        return {**self.store, "character": character}
+
+
+# 同じ店舗の読み込みを待っているリクエスト（全員が抜けたら破棄する）
+class _InFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = 0
+
+
+# 店舗単位のブートストラップキャッシュ（同時ミスは1回のDB読み込みにまとめる）
+class StoreCache:
+    def __init__(self, ttl: float = STORE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, StoreBootstrap] = {}
+        self._loading: Dict[int, _InFlight] = {}
+        self._lock = threading.Lock()
+        # 破棄のたびに進める世代（読み込み中に破棄された古い内容を登録しないため）
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, db: Session, store_id: int) -> Optional[StoreBootstrap]:
+        entry = self._entries.get(store_id)
+        if entry is not None and not entry.is_expired():
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            flight = self._loading.get(store_id)
+            if flight is None:
+                flight = self._loading[store_id] = _InFlight()
+            flight.waiters += 1
+
+        try:
+            with flight.lock:
+                return self._load(db, store_id)
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                if flight.waiters == 0:
+                    self._loading.pop(store_id, None)
+
+    def _load(self, db: Session, store_id: int) -> Optional[StoreBootstrap]:
+        # 待っている間に他のリクエストが読み込み済みならそれを使う
+        entry = self._entries.get(store_id)
+        if entry is not None and not entry.is_expired():
+            self.coalesced += 1
+            return entry
+
+        self.misses += 1
+        generation = self._generation
+        store = db.query(models.Store).filter(models.Store.id == store_id).first()
+        if not store:
+            return None
+        bic_girl = db.query(models.BicGirl).filter(models.BicGirl.store_id == store.id).first()
+        entry = StoreBootstrap(store, bic_girl, self.ttl)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[store_id] = entry
+        return entry
+
+    def invalidate(self, store_id: Optional[int] = None):
+        with self._lock:
+            self._generation += 1
+            if store_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(store_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stores": sorted(self._entries),
+        }
+
+
+store_cache = StoreCache()
+
+
+# ORM 経由で店舗・キャラクターが更新されたら、コミットされた時点で該当店舗のキャッシュを破棄
+# （フラッシュ時に破棄すると、コミット前・ロールバックされる内容を他のリクエストが読み込み得る）
+def _track_store(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("store_ids", set()).add(target.id)
+
+def _track_bic_girl(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        # 店舗の付け替えもあり得るため全店舗分を破棄（更新頻度は低い）
+        session.info.setdefault("store_ids", set()).add(None)
+
+def _apply_store_changes(session):
+    store_ids = session.info.pop("store_ids", None)
+    if not store_ids:
+        return
+    if None in store_ids:
+        store_cache.invalidate()
+        return
+    for store_id in store_ids:
+        store_cache.invalidate(store_id)
+
+def _discard_store_changes(session):
+    session.info.pop("store_ids", None)
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(models.Store, _event, _track_store)
+    event.listen(models.BicGirl, _event, _track_bic_girl)
+event.listen(Session, "after_commit", _apply_store_changes)
+event.listen(Session, "after_rollback", _discard_store_changes)
@@ -0,0 +1,118 @@
+from typing import Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from db_control.connect import run_in_session
+import threading
+import time
+import os
+
+
+# 集計クエリ1行（probe）で変更を確認しながら、読み込んだスナップショットをワーカー単位で使い回すキャッシュ
+# サブクラスは VERSION_QUERY と _load(db, version, previous) を実装する
+# スナップショットは version と loaded_at を持つ読み取り専用のオブジェクト
+class VersionedCache:
+    VERSION_QUERY = ""
+
+    def __init__(self, probe_interval: float):
+        self.probe_interval = probe_interval
+        self._snapshot: Optional[object] = None
+        self._last_probe = 0.0
+        # 確認・再読み込みの排他（同期・非同期のどちらから来ても読み込みは1回にまとめる）
+        self._lock = threading.Lock()
+        # 読み込み結果の登録と破棄の排他。破棄のたびに世代を進め、
+        # 破棄より前に始まった読み込みの古い内容を登録しないようにする
+        self._state_lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.probes = 0
+
+    def get(self, db: Session) -> object:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._is_stale():
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            return self._refresh(db)
+
+    # 非同期ルート用。確認・再読み込み（DB 読み込みと組み立て）はスレッドで行い、
+    # イベントループを止めない
+    async def get_async(self) -> object:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._is_stale():
+            self.hits += 1
+            return snapshot
+
+        return await run_in_session(self.get)
+
+    def invalidate(self):
+        with self._state_lock:
+            self._generation += 1
+            self._snapshot = None
+            self._last_probe = 0.0
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "probes": self.probes,
+            "loaded": snapshot is not None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+        }
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._last_probe >= self.probe_interval
+
+    # 変更がなければ今のスナップショットを使い続ける
+    def _is_current(self, snapshot, version: Tuple) -> bool:
+        return version == snapshot.version
+
+    def _refresh(self, db: Session) -> object:
+        generation = self._generation
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.misses += 1
+            return self._publish(self._load(db, self._probe(db), None), generation)
+
+        # ロック待ちの間に他のリクエストが確認済みならそのまま使う
+        if not self._is_stale():
+            self.hits += 1
+            return snapshot
+
+        version = self._probe(db)
+        if self._is_current(snapshot, version):
+            self.hits += 1
+            return snapshot
+
+        self.reloads += 1
+        return self._publish(self._load(db, version, snapshot), generation)
+
+    def _probe(self, db: Session) -> Tuple:
+        self.probes += 1
+        version = self._read_version(db)
+        self._last_probe = time.monotonic()
+        return version
+
+    def _read_version(self, db: Session) -> Tuple:
+        return tuple(db.execute(text(self.VERSION_QUERY)).first())
+
+    def _load(self, db: Session, version: Tuple, previous: Optional[object]) -> object:
+        raise NotImplementedError
+
+    def _publish(self, snapshot, generation: int) -> object:
+        with self._state_lock:
+            # 読み込み中に破棄された場合は登録しない（このリクエストだけで使う）
+            if generation != self._generation:
+                return snapshot
+            self._snapshot = snapshot
+        self._published(snapshot)
+        return snapshot
+
+    # 登録直後の追加処理（カタログの近傍探索インデックス作成など）
+    def _published(self, snapshot):
+        pass
@@ -0,0 +1,272 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+import threading
+import time
+import os
+
+# リクエスト計測（/metrics で Prometheus 形式に出力）。値はワーカー（プロセス）単位
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# これより遅いリクエストは実行した SQL と一緒にログへ出す（ミリ秒、0 なら出さない）
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "0"))
+# 遅いリクエストのログに出す SQL の最大件数
+METRICS_SLOW_LOG_STATEMENTS = int(os.getenv("METRICS_SLOW_LOG_STATEMENTS", "20"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+# 1リクエスト分の計測値（SQL の件数・時間、外部呼び出しの時間）
+class RequestStats:
+    def __init__(self, keep_statements: bool):
+        self.keep_statements = keep_statements
+        self.statement_count = 0
+        self.db_seconds = 0.0
+        self.statements: List[Tuple[str, float]] = []
+        self.outbound: Dict[str, float] = {}
+
+    def add_statement(self, statement: str, seconds: float):
+        self.statement_count += 1
+        self.db_seconds += seconds
+        if self.keep_statements and len(self.statements) < METRICS_SLOW_LOG_STATEMENTS:
+            self.statements.append((statement, seconds))
+
+    def add_outbound(self, target: str, seconds: float):
+        self.outbound[target] = self.outbound.get(target, 0.0) + seconds
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+# ルート単位・外部呼び出し単位の集計
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.statements: Dict[Tuple[str, str], Histogram] = {}
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.db_seconds: Dict[Tuple[str, str], float] = {}
+        self.route_outbound: Dict[Tuple[str, str, str], float] = {}
+        self.outbound_calls: Dict[str, int] = {}
+        self.outbound_seconds: Dict[str, float] = {}
+        self.slow_requests: Dict[Tuple[str, str], int] = {}
+        self.db_statements_total = 0
+        self.db_seconds_total = 0.0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.statements.setdefault(key, Histogram(STATEMENT_BUCKETS)).observe(stats.statement_count)
+            status_key = (method, route, str(status))
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+            for target, target_seconds in stats.outbound.items():
+                outbound_key = (method, route, target)
+                self.route_outbound[outbound_key] = self.route_outbound.get(outbound_key, 0.0) + target_seconds
+
+    def observe_slow_request(self, method: str, route: str):
+        key = (method, route)
+        with self._lock:
+            self.slow_requests[key] = self.slow_requests.get(key, 0) + 1
+
+    def observe_statement(self, seconds: float):
+        with self._lock:
+            self.db_statements_total += 1
+            self.db_seconds_total += seconds
+
+    def observe_outbound(self, target: str, seconds: float):
+        with self._lock:
+            self.outbound_calls[target] = self.outbound_calls.get(target, 0) + 1
+            self.outbound_seconds[target] = self.outbound_seconds.get(target, 0.0) + seconds
+
+    def reset(self):
+        self.__init__()
+
+    # Prometheus のテキスト形式（version 0.0.4）
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            _histogram(lines, "http_request_duration_seconds", "Request latency by route.", self.latency)
+            _counter(lines, "http_requests_total", "Requests by route and status.",
+                     {_labels(method=m, route=r, status=s): v for (m, r, s), v in self.requests.items()})
+            _histogram(lines, "http_request_db_statements", "SQL statements executed per request.", self.statements)
+            _counter(lines, "http_slow_requests_total", "Requests slower than METRICS_SLOW_REQUEST_MS by route.",
+                     {_labels(method=m, route=r): v for (m, r), v in self.slow_requests.items()})
+            _counter(lines, "http_request_db_seconds_total", "Time spent in SQL statements by route.",
+                     {_labels(method=m, route=r): v for (m, r), v in self.db_seconds.items()})
+            _counter(lines, "http_request_outbound_seconds_total", "Time spent in outbound calls by route.",
+                     {_labels(method=m, route=r, target=t): v for (m, r, t), v in self.route_outbound.items()})
+            _counter(lines, "outbound_calls_total", "Outbound calls including background work.",
+                     {_labels(target=t): v for t, v in self.outbound_calls.items()})
+            _counter(lines, "outbound_seconds_total", "Time spent in outbound calls including background work.",
+                     {_labels(target=t): v for t, v in self.outbound_seconds.items()})
+            _counter(lines, "db_statements_total", "SQL statements executed including background work.",
+                     {"": self.db_statements_total})
+            _counter(lines, "db_seconds_total", "Time spent in SQL statements including background work.",
+                     {"": self.db_seconds_total})
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _format(name: str, labels: str, value) -> str:
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+def _counter(lines: List[str], name: str, help_text: str, values: Dict[str, float]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in sorted(values.items()):
+        lines.append(_format(name, labels, value))
+
+
+def _histogram(lines: List[str], name: str, help_text: str, histograms: Dict[Tuple[str, str], Histogram]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), histogram in sorted(histograms.items()):
+        labels = _labels(method=method, route=route)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(_format(f"{name}_bucket", f'{labels},le="{bound}"', cumulative))
+        lines.append(_format(f"{name}_bucket", f'{labels},le="+Inf"', histogram.count))
+        lines.append(_format(f"{name}_sum", labels, histogram.total))
+        lines.append(_format(f"{name}_count", labels, histogram.count))
+
+
+registry = MetricsRegistry()
+
+
+# 外部呼び出し（Slack・SAS 署名）の時間を記録（リクエスト中ならそのルートにも計上）
+def record_outbound(target: str, seconds: float):
+    registry.observe_outbound(target, seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.add_outbound(target, seconds)
+
+
+@contextmanager
+def outbound(target: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_outbound(target, time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    registry.observe_statement(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.add_statement(statement, seconds)
+
+
+def _handle_error(exception_context):
+    # 失敗した SQL は after_cursor_execute が呼ばれないので開始時刻だけ捨てる
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metrics_started"):
+        conn.info["metrics_started"].pop()
+
+
+# SQL の件数・時間を数えるイベントを登録（同じエンジンへの二重登録はしない）
+def instrument_engine(engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ルートのパス（/question/{category_id} など）をラベルにする（未定義のパスは unmatched）
+def _route_label(scope) -> str:
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return "unmatched"
+    for route in getattr(app, "routes", []):
+        if getattr(route, "endpoint", None) is endpoint:
+            return route.path
+    return "unmatched"
+
+
+# 遅いリクエストのログ（SQL ごとの行を含めて1回の print で出し、他のリクエストの出力と混ざらないようにする）
+def _format_slow_request(method: str, route: str, status: int, seconds: float, stats: RequestStats) -> str:
+    outbound_text = ", ".join(f"{target}={value * 1000:.1f}ms" for target, value in stats.outbound.items())
+    lines = [
+        f"Slow request: {method} {route} {status} {seconds * 1000:.1f}ms "
+        f"sql={stats.statement_count} ({stats.db_seconds * 1000:.1f}ms)"
+        + (f" outbound: {outbound_text}" if outbound_text else "")
+    ]
+    for statement, statement_seconds in stats.statements:
+        lines.append(f"  [{statement_seconds * 1000:.1f}ms] {' '.join(statement.split())[:300]}")
+    return "\n".join(lines)
+
+
+def _log_slow_request(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    registry.observe_slow_request(method, route)
+    print(_format_slow_request(method, route, status, seconds, stats), flush=True)
+
+
+# リクエストごとの所要時間・SQL・外部呼び出しを記録する ASGI ミドルウェア
+class MetricsMiddleware:
+    def __init__(self, app, slow_request_ms: float = METRICS_SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(keep_statements=self.slow_request_ms > 0)
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - started
+            _current.reset(token)
+            method, route = scope["method"], _route_label(scope)
+            registry.observe_request(method, route, status, seconds, stats)
+            if self.slow_request_ms > 0 and seconds * 1000 >= self.slow_request_ms:
+                _log_slow_request(method, route, status, seconds, stats)
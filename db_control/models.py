@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Float, DateTime, Enum, Numeric
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Boolean, Float, DateTime, Enum, Numeric, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -109,10 +109,23 @@ class Metric(Base):
 # metrics テーブル（ユーザーごとの評価結果）
 class Priority(Base):
     __tablename__ = "priority"
+    __table_args__ = (
+        UniqueConstraint("reception_id", "metrics_id", name="uq_priority_reception_metrics"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     reception_id = Column(Integer, ForeignKey("reception.id"))
     metrics_id = Column(Integer, ForeignKey("metrics.id"))
     level = Column(Numeric(10, 2))
+
+# scoring_rule テーブル（回答 → 評価項目スコアの加減点ルール）
+# (question_id, value) の回答があれば metrics_id のスコアに delta を加える
+class ScoringRule(Base):
+    __tablename__ = "scoring_rule"
+    id = Column(Integer, primary_key=True, index=True)
+    question_id = Column(Integer, ForeignKey("question.id"), nullable=False, index=True)
+    value = Column(Integer, nullable=False)
+    metrics_id = Column(Integer, ForeignKey("metrics.id"), nullable=False)
+    delta = Column(Numeric(10, 2), nullable=False)
 # ---  むかげん開発用コード ここまで ---
 
 # tablet テーブル（タブレットの設置場所情報）
@@ -137,6 +150,27 @@ class SalesCall(Base):
     reception_id = Column(Integer, ForeignKey("reception.id"), nullable=True)
     time = Column(DateTime, default=datetime.datetime.utcnow)
 
+# 秒単位に切り捨てた現在時刻（UTC）
+# MySQL の DATETIME はマイクロ秒を次の秒へ丸めるため、そのまま保存すると
+# 直後の「next_attempt_at <= 現在時刻」に一致せず、送信が次のポーリングまで遅れる
+def utcnow_seconds() -> datetime.datetime:
+    return datetime.datetime.utcnow().replace(microsecond=0)
+
+# sales_call_notification テーブル（店員呼び出し通知の送信待ちキュー / outbox）
+# status: pending → sending → sent / failed / coalesced（同じ受付の連続呼び出しをまとめた）
+class SalesCallNotification(Base):
+    __tablename__ = "sales_call_notification"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sales_call_id = Column(Integer, ForeignKey("sales_call.id"), nullable=True)
+    reception_id = Column(Integer, ForeignKey("reception.id"), nullable=True, index=True)
+    payload = Column(Text, nullable=False)  # Slack に送る JSON
+    status = Column(String(20), nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=utcnow_seconds, index=True)
+    last_error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
 # 在庫管理（stock テーブル）
 class Stock(Base):
     __tablename__ = "stock"
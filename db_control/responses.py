@@ -0,0 +1,39 @@
+from typing import Any
+from decimal import Decimal
+from fastapi.responses import JSONResponse
+import importlib.util
+import json
+import os
+
+# 推薦・採点のレスポンスを高速な JSON 出力で返すか
+# 有効時はサーバー側で組み立てた辞書を response_model で再検証せずにそのまま書き出す
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+# orjson が入っていれば使う（無ければ標準の json で同じ形式に出力する）
+HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+# JSONResponse と同じ出力（UTF-8・区切り文字なし）を orjson で生成する
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if not HAS_ORJSON:
+            # JSONResponse.render と同じ設定（Decimal だけ float に変換）
+            return json.dumps(
+                content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"), default=_default
+            ).encode("utf-8")
+        import orjson
+
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+# 組み立て済みの辞書を返す（無効時は従来どおり FastAPI の response_model 検証を通す）
+def fast_response(content: dict, status_code: int = 200):
+    if not FAST_JSON_RESPONSES:
+        return content
+    return FastJSONResponse(content, status_code=status_code)
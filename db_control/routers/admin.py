@@ -0,0 +1,100 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+from db_control.logic.catalog_cache import catalog_cache
+from db_control.logic.question_cache import question_cache
+from db_control.logic.scoring_rules import scoring_rules
+from db_control.logic.sas_signer import get_signer
+from db_control.logic.store_cache import store_cache
+from db_control.logic.stock_cache import stock_cache
+from db_control.logic.password_pool import password_verifier
+from db_control import connect
+from db_control.logic.sales_call_dispatcher import get_dispatcher
+import hmac
+import os
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # .env に記載（未設定なら管理用エンドポイントは使えない）
+
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理者トークンが設定されていません")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="管理者トークンが正しくありません")
+
+
+# 商品カタログキャッシュの統計（ワーカー単位）
+@router.get("/catalog/stats", dependencies=[Depends(verify_admin_token)])
+def get_catalog_stats():
+    return catalog_cache.stats()
+
+# 商品カタログキャッシュの破棄（次回アクセス時に再読み込み）
+@router.post("/catalog/invalidate", dependencies=[Depends(verify_admin_token)])
+def invalidate_catalog():
+    catalog_cache.invalidate()
+    return {"message": "invalidated", "stats": catalog_cache.stats()}
+
+# 質問セットキャッシュの統計（ワーカー単位）
+@router.get("/questions/stats", dependencies=[Depends(verify_admin_token)])
+def get_question_stats():
+    return question_cache.stats()
+
+# 質問セットキャッシュの破棄（category_id 未指定なら全カテゴリ）
+@router.post("/questions/invalidate", dependencies=[Depends(verify_admin_token)])
+def invalidate_questions(category_id: Optional[int] = None):
+    question_cache.invalidate(category_id)
+    return {"message": "invalidated", "stats": question_cache.stats()}
+
+# スコアリングルール（コンパイル済み）の統計（ワーカー単位）
+@router.get("/scoring/stats", dependencies=[Depends(verify_admin_token)])
+def get_scoring_stats():
+    return scoring_rules.stats()
+
+# スコアリングルールの破棄（次回の採点時に再コンパイル）
+@router.post("/scoring/invalidate", dependencies=[Depends(verify_admin_token)])
+def invalidate_scoring():
+    scoring_rules.invalidate()
+    return {"message": "invalidated", "stats": scoring_rules.stats()}
+
+# SAS URL 署名キャッシュの統計（ワーカー単位）
+@router.get("/sas/stats", dependencies=[Depends(verify_admin_token)])
+def get_sas_stats():
+    return get_signer().stats()
+
+# 店舗ブートストラップキャッシュの統計（ワーカー単位）
+@router.get("/stores/stats", dependencies=[Depends(verify_admin_token)])
+def get_store_stats():
+    return store_cache.stats()
+
+# 店舗ブートストラップキャッシュの破棄（store_id 未指定なら全店舗）
+@router.post("/stores/invalidate", dependencies=[Depends(verify_admin_token)])
+def invalidate_stores(store_id: Optional[int] = None):
+    store_cache.invalidate(store_id)
+    return {"message": "invalidated", "stats": store_cache.stats()}
+
+# 在庫キャッシュの統計（店舗ごとの在庫あり商品数）
+@router.get("/stock/stats", dependencies=[Depends(verify_admin_token)])
+def get_stock_stats():
+    return stock_cache.stats()
+
+# 在庫キャッシュの破棄（次回の推薦時に全店舗分を再読み込み）
+@router.post("/stock/invalidate", dependencies=[Depends(verify_admin_token)])
+def invalidate_stock():
+    stock_cache.invalidate()
+    return {"message": "invalidated", "stats": stock_cache.stats()}
+
+# bcrypt 照合プールの統計（待ち時間とハッシュ計算時間）
+@router.get("/login/stats", dependencies=[Depends(verify_admin_token)])
+def get_login_stats():
+    return password_verifier.stats()
+
+# DB コネクションプールの稼働状況（貸出中・オーバーフロー・待ち時間）
+@router.get("/db/pool", dependencies=[Depends(verify_admin_token)])
+def get_db_pool_stats():
+    return connect.pool_stats()
+
+# 店員呼び出し通知 dispatcher の統計（ワーカー単位）
+@router.get("/call_sales/stats", dependencies=[Depends(verify_admin_token)])
+def get_call_sales_stats():
+    return get_dispatcher().stats()
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db_control.connect import get_db
+from db_control.connect import get_db, get_async_db
 from db_control import schemas, crud
 
 router = APIRouter(prefix="/answers",tags=["answers"])
 
 @router.post("", response_model=schemas.AnswerResponse)
-def submit_answers(answer_request: schemas.AnswerRequest, db: Session = Depends(get_db)):
-    result = crud.save_answers(db, answer_request)
+async def submit_answers(answer_request: schemas.AnswerRequest, db: AsyncSession = Depends(get_async_db)):
+    result = await crud.save_answers(db, answer_request)
 
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from db_control.connect import get_db
-from db_control import crud, schemas
+from db_control import crud, schemas, models
+from db_control.logic.sales_call_dispatcher import get_dispatcher
 from sqlalchemy.orm import Session
 import os
 import json
-import requests
 import traceback
 
 router = APIRouter(prefix="/call_sales",tags=["call_sales"])
@@ -24,7 +24,6 @@ def call_sales(request: schemas.CallSalesRequest, db: Session = Depends(get_db))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
 
-        headers = {"Content-Type": "application/json"}
         payload = {
             "username": data["store_name"],
             "attachments": [
@@ -53,17 +52,21 @@ def call_sales(request: schemas.CallSalesRequest, db: Session = Depends(get_db))
             ]
         }
 
-        response = requests.post(SLACK_WEBHOOK_URL, data=json.dumps(payload), headers=headers)
-        print("Slack response:", response.status_code, response.text)
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"Slack通知に失敗しました: {response.text}")
-
-        # Slack通知に成功したらテーブルに記録
-        from db_control import models
+        # 呼び出し記録と送信待ち通知（outbox）を同じトランザクションで保存
+        # Slack への送信はバックグラウンドの dispatcher が行う
         sales_call_record = models.SalesCall(reception_id=request.reception_id)
         db.add(sales_call_record)
+        db.flush()
+        db.add(models.SalesCallNotification(
+            sales_call_id=sales_call_record.id,
+            reception_id=request.reception_id,
+            payload=json.dumps(payload),
+            status="pending"
+        ))
         db.commit()
+        get_dispatcher().notify()
 
+        # フロントエンドが表示・判定に使っているため、同期送信だった頃と同じ文言を返す
         return {"message": "テスト通知を送信しました"}
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
@@ -72,4 +75,4 @@ def call_sales(request: schemas.CallSalesRequest, db: Session = Depends(get_db))
     except Exception as e:
         print("==== エラー発生 ====")
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
\ No newline at end of file
@@ -2,17 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from db_control.connect import get_db
 from db_control import schemas, crud
+from db_control.logic.password_pool import PasswordPoolSaturated
+from db_control.responses import fast_response
 
 router = APIRouter(prefix="/login", tags=["login"])
 
 @router.post("", response_model=schemas.StoreLoginResponse)
-def store_login(request: schemas.StoreLoginRequest, db: Session = Depends(get_db)):
-    store_info = crud.verify_store_credentials(db, request.name, request.password)
+async def store_login(request: schemas.StoreLoginRequest, db: Session = Depends(get_db)):
+    try:
+        store_info = await crud.verify_store_credentials_async(db, request.name, request.password)
+    except PasswordPoolSaturated:
+        # 照合待ちが上限に達したら即座に 503 を返す
+        raise HTTPException(
+            status_code=503,
+            detail="ログインが混み合っています。しばらくしてから再度お試しください。",
+            headers={"Retry-After": "1"}
+        )
     if not store_info:
         raise HTTPException(status_code=401, detail="店舗名またはパスワードが正しくありません。")
 
-    character_data = store_info.pop("character", {})
-    return schemas.StoreLoginResponse(
-        **store_info,
-        character=schemas.CharacterInfo(**character_data)
-    )
+    if "error" in store_info:
+        raise HTTPException(status_code=500, detail=store_info["error"])
+
+    # 店舗キャッシュが組み立てた辞書をそのまま返す（StoreLoginResponse と同じ形）
+    return fast_response(store_info)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from db_control.metrics import registry
+
+router = APIRouter(tags=["metrics"])
+
+
+# Prometheus のスクレイプ用（ワーカー単位の値）
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
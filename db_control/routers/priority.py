@@ -1,26 +1,45 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from db_control import schemas, models
+from db_control import schemas, models, crud
 from db_control.connect import get_db
-from typing import List
+from typing import Dict, List
 
 
 router = APIRouter(prefix="/priority", tags=["priority"])
 
 @router.post("")
 def save_priorities(data: schemas.PriorityIn, db: Session = Depends(get_db)):
-    for item in data.priorities:
-        priority = models.Priority(
-            reception_id=item.reception_id,
-            metrics_id=item.metrics_id,
-            level=item.level
-        )
-        db.add(priority)
-
+    # 同じ受付・評価項目の再送信は上書き（重複行を作らない）
+    crud.upsert_priorities(db, [
+        {"reception_id": item.reception_id, "metrics_id": item.metrics_id, "level": item.level}
+        for item in data.priorities
+    ])
     db.commit()
     return {"message": "saved"}
 
+# 複数受付の優先度を1クエリで取得（スタッフ画面用）
+@router.get("", response_model=Dict[int, List[schemas.PriorityScore]])
+def get_priority_scores_bulk(reception_ids: List[int] = Query(...), db: Session = Depends(get_db)):
+    results = (
+        db.query(
+            models.Priority.reception_id,
+            models.Priority.metrics_id,
+            models.Metric.name,
+            models.Priority.level
+        )
+        .join(models.Metric, models.Priority.metrics_id == models.Metric.id)
+        .filter(models.Priority.reception_id.in_(reception_ids))
+        .all()
+    )
+
+    scores = {reception_id: [] for reception_id in reception_ids}
+    for reception_id, metrics_id, name, level in results:
+        scores[reception_id].append(
+            schemas.PriorityScore(metricsId=metrics_id, name=name, score=level)
+        )
+    return scores
+
 @router.get("/{reception_id}", response_model=List[schemas.PriorityScore])
 def get_priority_scores(reception_id: int, db: Session = Depends(get_db)):
     results = (
@@ -1,16 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from db_control.connect import get_db
-from db_control import models, crud
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from db_control.connect import get_async_db
+from db_control.logic.question_cache import if_none_match, question_cache
 from typing import List
 
 router = APIRouter(prefix="/question", tags=["question"])
 
 @router.get("/{category_id}")
-def get_questions(category_id: int, db: Session = Depends(get_db)):
-    result = crud.get_questions_by_category(db, category_id)
+async def get_questions(category_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    entry = await question_cache.get(db, category_id)
 
-    if "error" in result:
-        raise HTTPException(status_code=400, detail=result["error"])
+    if isinstance(entry, dict) and "error" in entry:
+        raise HTTPException(status_code=400, detail=entry["error"])
 
-    return result
\ No newline at end of file
+    # タブレットが最新の質問セットを保持していれば 304 を返す
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if if_none_match(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=entry.body, media_type="application/json", headers=headers)
\ No newline at end of file
@@ -1,30 +1,73 @@
 from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from db_control import schemas, models
-from db_control.connect import get_db
+from db_control.connect import get_db, get_async_db
+from db_control.responses import fast_response
+import time
+from db_control.logic.stock_cache import resolve_in_stock_only
 from db_control.logic.recommend_logic import (
     convert_answers_to_scores,
-    get_top_products,
-    save_suggestions,
-    get_product_details
+    convert_answers_to_scores_many,
+    get_scoring_table_async,
+    get_reception_categories_async,
+    get_top_products_async,
+    get_top_products_batch,
+    get_reception_category_async,
+    get_reception_context_async,
+    get_reception_contexts,
+    save_suggestions_async,
+    save_suggestions_bulk,
+    get_product_details,
+    get_product_details_async
 )
 
 router = APIRouter(prefix="/recommend", tags=["recommend"])
 
-# スコア計算
+# スコア計算（受付のカテゴリのルール表で採点）
+# priorities はそのカテゴリの評価項目すべて（scoring_rule のないカテゴリは従来どおり評価項目1〜9）
 @router.post("/score")
-def recommend_score(user_input: schemas.UserInput, db: Session = Depends(get_db)):
-    user_scores = convert_answers_to_scores(user_input)
-    sorted_scores = sorted(user_scores.items(), key=lambda x: x[1], reverse=True)
+async def recommend_score(user_input: schemas.UserInput, db: AsyncSession = Depends(get_async_db)):
+    category_id = await get_reception_category_async(user_input.receptionId, db)
+    table = await get_scoring_table_async(category_id, db)
+    user_scores = convert_answers_to_scores(user_input, table)
+    metric_id_to_name = await get_metric_names(user_scores, db)
+    return fast_response(build_score_response(user_input.receptionId, user_scores, metric_id_to_name))
+
+
+# スコア計算（複数受付の一括処理）
+@router.post("/score/batch")
+async def recommend_score_batch(batch_input: schemas.UserInputBatch, db: AsyncSession = Depends(get_async_db)):
+    reception_ids = [item.receptionId for item in batch_input.items]
+    category_map = await get_reception_categories_async(reception_ids, db)
+    tables = [await get_scoring_table_async(category_map.get(reception_id), db) for reception_id in reception_ids]
+    scores_list = convert_answers_to_scores_many(batch_input.items, tables)
+
+    all_scores = {}
+    for user_scores in scores_list:
+        all_scores.update(user_scores)
+    metric_id_to_name = await get_metric_names(all_scores, db)
+    return fast_response({
+        "results": [
+            build_score_response(reception_id, user_scores, metric_id_to_name)
+            for reception_id, user_scores in zip(reception_ids, scores_list)
+        ]
+    })
 
-    # metrics.name を取りに行く
-    metric_ids = [mid for mid, _ in sorted_scores]
-    metrics = db.query(models.Metric).filter(models.Metric.id.in_(metric_ids)).all()
-    metric_id_to_name = {metric.id: metric.name for metric in metrics}
 
-    return JSONResponse(content={
-        "receptionId": user_input.receptionId,
+# metrics.name を取りに行く
+async def get_metric_names(user_scores: dict, db: AsyncSession) -> dict:
+    metrics = await db.execute(
+        select(models.Metric.id, models.Metric.name).where(models.Metric.id.in_(list(user_scores)))
+    )
+    return {metric_id: name for metric_id, name in metrics}
+
+
+def build_score_response(reception_id: int, user_scores: dict, metric_id_to_name: dict) -> dict:
+    sorted_scores = sorted(user_scores.items(), key=lambda x: x[1], reverse=True)
+    return {
+        "receptionId": reception_id,
         "priorities": [
             {
                 "metricsId": mid,
@@ -33,21 +76,84 @@ def recommend_score(user_input: schemas.UserInput, db: Session = Depends(get_db)
             }
             for mid, score in sorted_scores
         ]
-    })
+    }
 
 
 # 推薦確定
 @router.post("/confirm", response_model=schemas.ConfirmRecommendationResponse)
-def confirm_recommendation(
+async def confirm_recommendation(
     confirm_input: schemas.ConfirmRecommendation,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # スコア算出と保存
-    top_product_ids = get_top_products(confirm_input.scores, db)
-    save_suggestions(confirm_input.receptionId, top_product_ids, db)
+    # スコア算出と保存（受付のカテゴリ内の商品だけを対象にする）
+    category_id, store_id = await get_reception_context_async(confirm_input.receptionId, db)
+    # 在庫のある商品だけを対象にする場合は受付の店舗の在庫で絞り込む
+    if not resolve_in_stock_only(confirm_input.inStockOnly):
+        store_id = None
+    top_product_ids = await get_top_products_async(
+        confirm_input.scores, db, category_id=category_id, store_id=store_id,
+        constraints=confirm_input.constraints
+    )
+    await save_suggestions_async(confirm_input.receptionId, top_product_ids, db)
     # 商品詳細取得
-    product_details = get_product_details(top_product_ids, confirm_input.receptionId, db)
-    return schemas.ConfirmRecommendationResponse(
-        receptionId=confirm_input.receptionId,
-        recommendedProducts=product_details
-    )
\ No newline at end of file
+    product_details = await get_product_details_async(top_product_ids, confirm_input.receptionId, db)
+    return fast_response({
+        "receptionId": confirm_input.receptionId,
+        "recommendedProducts": product_details
+    })
+
+
+# 推薦確定（複数受付の一括処理）
+@router.post("/confirm/batch", response_model=schemas.ConfirmRecommendationBatchResponse)
+def confirm_recommendation_batch(
+    batch_input: schemas.ConfirmRecommendationBatch,
+    db: Session = Depends(get_db)
+):
+    started = time.perf_counter()
+    reception_ids = [item.receptionId for item in batch_input.items]
+    context_map = get_reception_contexts(reception_ids, db)
+    contexts = [context_map.get(reception_id, (None, None)) for reception_id in reception_ids]
+
+    # 全ユーザー×全商品の距離をまとめて計算
+    scored = time.perf_counter()
+    ranked = get_top_products_batch(
+        [item.scores for item in batch_input.items],
+        [category_id for category_id, _ in contexts],
+        db,
+        store_ids=[
+            store_id if resolve_in_stock_only(item.inStockOnly) else None
+            for item, (_, store_id) in zip(batch_input.items, contexts)
+        ],
+        constraints_list=[item.constraints for item in batch_input.items]
+    )
+    suggestions = dict(zip(reception_ids, ranked))
+
+    # Suggestion を1トランザクションで保存
+    saved = time.perf_counter()
+    save_suggestions_bulk(suggestions, db)
+
+    # 商品詳細はまとめて1回で取得
+    detailed = time.perf_counter()
+    all_product_ids = sorted({pid for product_ids in ranked for pid in product_ids})
+    details = {
+        product["id"]: product
+        for product in get_product_details(all_product_ids, None, db)
+    } if all_product_ids else {}
+    finished = time.perf_counter()
+
+    return fast_response({
+        "results": [
+            {
+                "receptionId": reception_id,
+                "recommendedProducts": [details[pid] for pid in product_ids if pid in details]
+            }
+            for reception_id, product_ids in zip(reception_ids, ranked)
+        ],
+        "timing": {
+            "lookup_ms": (scored - started) * 1000,
+            "scoring_ms": (saved - scored) * 1000,
+            "save_ms": (detailed - saved) * 1000,
+            "details_ms": (finished - detailed) * 1000,
+            "total_ms": (finished - started) * 1000,
+        }
+    })
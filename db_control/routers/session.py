@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from db_control import schemas, crud
+from db_control.connect import get_async_db
+
+router = APIRouter(prefix="/session", tags=["session"])
+
+# 接客セッションを1回の呼び出し・1トランザクションで保存
+@router.post("", response_model=schemas.UserInfoResponse)
+async def commit_session(session: schemas.KioskSession, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return (await crud.save_sessions(db, [session], strict=True))[0]
+    except crud.InvalidQuestionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except crud.SessionSaveError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# オフライン中に溜めたセッションの一括同期（セッションごとに結果を返す）
+@router.post("/bulk", response_model=schemas.SessionBatchResponse)
+async def commit_sessions(batch: schemas.KioskSessionBatch, db: AsyncSession = Depends(get_async_db)):
+    try:
+        results = await crud.save_sessions(db, batch.sessions)
+    except crud.SessionSaveError as e:
+        # 1トランザクションなので全セッションが保存されていない
+        results = [{"error": str(e)} for _ in batch.sessions]
+    return {"results": results}
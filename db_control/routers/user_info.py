@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from db_control import schemas, crud
-from db_control.connect import get_db
+from db_control.connect import get_async_db
 
 router = APIRouter(prefix="/user_info", tags=["user_info"])
 
 @router.post("", response_model=schemas.UserInfoResponse)  # ← ここで指定
-def create_user(user_info: schemas.UserInfo, db: Session = Depends(get_db)):
-    result = crud.save_user_info(db, user_info)
+async def create_user(user_info: schemas.UserInfo, db: AsyncSession = Depends(get_async_db)):
+    result = await crud.save_user_info(db, user_info)
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
\ No newline at end of file
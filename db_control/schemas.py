@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import List, Union, Dict
 from decimal import Decimal
 import datetime
@@ -87,9 +87,25 @@ class UserInput(BaseModel):
     receptionId: int
     answers: List[UserAnswer]
 
+class UserInputBatch(BaseModel):
+    items: List[UserInput]
+
+# 推薦対象の商品の価格・寸法の条件（指定した項目だけで絞り込む）
+class ProductConstraints(BaseModel):
+    minPrice: Optional[float] = None
+    maxPrice: Optional[float] = None
+    minWidth: Optional[float] = None
+    maxWidth: Optional[float] = None
+    minDepth: Optional[float] = None
+    maxDepth: Optional[float] = None
+    minHeight: Optional[float] = None
+    maxHeight: Optional[float] = None
+
 class ConfirmRecommendation(BaseModel):
     receptionId: int
     scores: Dict[int, float]  # metrics_id: score
+    inStockOnly: Optional[bool] = None  # 店舗に在庫のある商品だけを推薦（未指定なら RECOMMEND_IN_STOCK_ONLY）
+    constraints: Optional[ProductConstraints] = None
 
 class PriorityItem(BaseModel):
     reception_id: int
@@ -103,6 +119,30 @@ class PriorityScore(BaseModel):
     metricsId: int
     name: str
     score: Decimal
+
+# 接客セッション一括保存（ユーザー属性・回答・優先度）
+class SessionPriority(BaseModel):
+    metrics_id: int
+    level: Decimal
+
+class KioskSession(BaseModel):
+    store_id: int
+    category_id: int
+    age: int
+    gender: str
+    household: int
+    answers: List[Answer] = []
+    priorities: List[SessionPriority] = []
+
+class KioskSessionBatch(BaseModel):
+    sessions: List[KioskSession]
+
+class SessionResult(BaseModel):
+    reception_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SessionBatchResponse(BaseModel):
+    results: List[SessionResult]
 # むかげん開発用範囲 ---- ここまで -----
 
 
@@ -128,4 +168,24 @@ class RecommendedProduct(BaseModel):
 
 class ConfirmRecommendationResponse(BaseModel):
     receptionId: int
-    recommendedProducts: List[RecommendedProduct]
\ No newline at end of file
+    recommendedProducts: List[RecommendedProduct]
+
+# 複数受付の推薦確定（一括）
+class ConfirmRecommendationBatch(BaseModel):
+    items: List[ConfirmRecommendation]
+
+    # 同じ受付が複数あると保存・返却が1件にまとまってしまうので受け付けない
+    @validator("items")
+    def unique_reception_ids(cls, items):
+        seen, duplicates = set(), set()
+        for item in items:
+            if item.receptionId in seen:
+                duplicates.add(item.receptionId)
+            seen.add(item.receptionId)
+        if duplicates:
+            raise ValueError(f"receptionId が重複しています: {sorted(duplicates)}")
+        return items
+
+class ConfirmRecommendationBatchResponse(BaseModel):
+    results: List[ConfirmRecommendationResponse]
+    timing: Dict[str, float]  # 処理段階ごとの所要時間（ミリ秒）
\ No newline at end of file
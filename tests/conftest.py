@@ -0,0 +1,117 @@
+# テスト共通の設定
+# アプリを import する前に、接続先を一時ディレクトリの SQLite（非同期は aiosqlite）に差し替える
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_DB_DIR = tempfile.mkdtemp(prefix="bic-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["SLACK_WEBHOOK_URL"] = "https://hooks.slack.invalid/test"
+os.environ["SALES_CALL_DISPATCHER_ENABLED"] = "false"
+os.environ["DB_BOOTSTRAP_ON_STARTUP"] = "false"
+os.environ["DB_POOL_WARMUP"] = "0"
+
+# 商品×評価項目（カテゴリ1: 評価項目1〜3、カテゴリ2: 評価項目4〜5）
+PRODUCT_LEVELS = {
+    1: {1: 5.0, 2: 3.0, 3: 1.0},
+    2: {1: 4.5, 2: 4.5, 3: 4.5},
+    3: {1: 1.0, 2: 2.0, 3: 5.0},
+    4: {1: 3.0, 2: 3.0, 3: 3.0},
+    5: {1: 5.0, 2: 5.0, 3: 5.0},
+    6: {1: 2.0, 2: 4.0},
+    7: {4: 3.0, 5: 4.0},
+    8: {4: 5.0, 5: 1.0},
+}
+PRODUCT_CATEGORY = {1: 1, 2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 2, 8: 2}
+
+
+def seed(engine):
+    from db_control import models
+
+    rows = {
+        models.Category: [{"id": 1, "name": "洗濯機"}, {"id": 2, "name": "冷蔵庫"}],
+        models.Metric: [
+            {"id": 1, "category_id": 1, "name": "乾燥"},
+            {"id": 2, "category_id": 1, "name": "静音"},
+            {"id": 3, "category_id": 1, "name": "容量"},
+            {"id": 4, "category_id": 2, "name": "省エネ"},
+            {"id": 5, "category_id": 2, "name": "容量"},
+        ],
+        models.Question: [
+            {"id": 1, "category_id": 1, "question_text": "乾燥機能は必要ですか？"},
+            {"id": 2, "category_id": 1, "question_text": "夜に洗濯しますか？"},
+            {"id": 3, "category_id": 2, "question_text": "家族は何人ですか？"},
+        ],
+        models.QuestionOption: [
+            {"question_id": qid, "label": label, "value": value}
+            for qid in (1, 2, 3)
+            for label, value in (("はい", 1), ("いいえ", 0))
+        ],
+        models.ScoringRule: [
+            {"question_id": 1, "value": 1, "metrics_id": 1, "delta": 0.5},
+            {"question_id": 1, "value": 0, "metrics_id": 1, "delta": -1.0},
+            {"question_id": 2, "value": 1, "metrics_id": 2, "delta": 0.25},
+        ],
+        models.Product: [
+            {
+                "id": pid,
+                "name": f"商品{pid}",
+                "brand": "ブランド",
+                "price": 100000 + pid * 1000,
+                "width": 60.0,
+                "depth": 60.0,
+                "height": 100.0,
+                "description": f"説明{pid}",
+                "image": None,
+                "category_id": category_id,
+            }
+            for pid, category_id in PRODUCT_CATEGORY.items()
+        ],
+        models.ProductMetrics: [
+            {"product_id": pid, "metrics_id": mid, "level": level}
+            for pid, levels in PRODUCT_LEVELS.items()
+            for mid, level in levels.items()
+        ],
+        models.Store: [{"id": 1, "name": "有楽町店", "password": "x", "prefecture": "東京都", "is_available": True}],
+        models.Tablet: [{"uuid": "tablet-1", "store_id": 1, "area": "洗濯機売り場", "floor": "3F"}],
+        models.User: [
+            {"id": 1, "store_id": 1, "age": 30, "gender": "female", "household": 2},
+            # 店舗が存在しないユーザー
+            {"id": 2, "store_id": 99, "age": 40, "gender": "male", "household": 1},
+        ],
+        models.Reception: [
+            {"id": 1, "user_id": 1, "category_id": 1},
+            # ユーザーが存在しない受付
+            {"id": 2, "user_id": 99, "category_id": 1},
+            {"id": 3, "user_id": 2, "category_id": 1},
+            # カテゴリが存在しない受付
+            {"id": 4, "user_id": 1, "category_id": 99},
+        ],
+    }
+    with engine.begin() as conn:
+        for model, values in rows.items():
+            conn.execute(model.__table__.insert(), values)
+
+
+@pytest.fixture(scope="session")
+def database():
+    from db_control import bootstrap, connect
+
+    bootstrap.bootstrap_schema()
+    seed(connect.engine)
+    return connect.engine
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    from fastapi.testclient import TestClient
+    import app
+
+    with TestClient(app.app) as test_client:
+        yield test_client
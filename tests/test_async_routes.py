@@ -0,0 +1,166 @@
+# 非同期ルート（aiosqlite 経由）のテスト
+import asyncio
+
+from sqlalchemy import select
+
+from db_control import connect, models
+from db_control.logic.catalog_cache import catalog_cache
+
+
+def create_reception(client, category_id: int = 1) -> int:
+    response = client.post("/user_info", json={
+        "store_id": 1,
+        "category_id": category_id,
+        "age": 35,
+        "gender": "female",
+        "household": 3,
+    })
+    assert response.status_code == 200
+    return response.json()["reception_id"]
+
+
+def test_async_engine_uses_aiosqlite(client):
+    create_reception(client)
+    assert connect.async_engine is not None
+    assert connect.async_engine.dialect.driver == "aiosqlite"
+
+
+def test_user_info_creates_user_and_reception(client, database):
+    reception_id = create_reception(client, category_id=2)
+    with connect.SessionLocal() as db:
+        reception = db.get(models.Reception, reception_id)
+        assert reception.category_id == 2
+        user = db.get(models.User, reception.user_id)
+        assert (user.store_id, user.age, user.gender, user.household) == (1, 35, "female", 3)
+
+
+def test_question_returns_category_questions_with_etag(client):
+    response = client.get("/question/1")
+    assert response.status_code == 200
+    assert response.json() == {
+        "1": {"question_text": "乾燥機能は必要ですか？", "options": [{"label": "はい", "value": 1}, {"label": "いいえ", "value": 0}]},
+        "2": {"question_text": "夜に洗濯しますか？", "options": [{"label": "はい", "value": 1}, {"label": "いいえ", "value": 0}]},
+    }
+
+    cached = client.get("/question/1", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+
+def test_question_unknown_category(client):
+    response = client.get("/question/99")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "家電カテゴリが存在しません"
+
+
+def test_answers_are_saved(client):
+    reception_id = create_reception(client)
+    response = client.post("/answers", json={
+        "receptionId": reception_id,
+        "answers": [{"questionId": 1, "answer": 1}, {"questionId": 2, "answer": 0}],
+    })
+    assert response.status_code == 200
+    with connect.SessionLocal() as db:
+        saved = db.execute(
+            select(models.AnswerInfo.question_id, models.AnswerInfo.answer)
+            .where(models.AnswerInfo.reception_id == reception_id)
+            .order_by(models.AnswerInfo.question_id)
+        ).all()
+    assert [tuple(row) for row in saved] == [(1, 1), (2, 0)]
+
+
+def test_answers_reject_unknown_question(client):
+    reception_id = create_reception(client)
+    response = client.post("/answers", json={
+        "receptionId": reception_id,
+        "answers": [{"questionId": 1, "answer": 1}, {"questionId": 42, "answer": 0}],
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid question ID: 42"
+
+
+def test_recommend_score_uses_category_rules(client):
+    reception_id = create_reception(client)
+    response = client.post("/recommend/score", json={
+        "receptionId": reception_id,
+        "answers": [{"questionId": 1, "value": 1}, {"questionId": 2, "value": 1}],
+    })
+    assert response.status_code == 200
+    assert response.json() == {
+        "receptionId": reception_id,
+        "priorities": [
+            {"metricsId": 1, "name": "乾燥", "score": 5.0},
+            {"metricsId": 2, "name": "静音", "score": 4.75},
+            {"metricsId": 3, "name": "容量", "score": 4.5},
+        ],
+    }
+
+
+# ルールのないカテゴリは従来の固定ルール（評価項目1〜9）で採点する
+def test_recommend_score_falls_back_to_default_rules(client):
+    reception_id = create_reception(client, category_id=2)
+    response = client.post("/recommend/score", json={
+        "receptionId": reception_id,
+        "answers": [{"questionId": 1, "value": 0}, {"questionId": 3, "value": 1}],
+    })
+    assert response.status_code == 200
+    priorities = response.json()["priorities"]
+    assert [p["metricsId"] for p in priorities] == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+    assert [p["score"] for p in priorities] == [4.75] + [4.5] * 8
+    assert [p["name"] for p in priorities[3:6]] == ["省エネ", "容量", "Metric-6"]
+
+
+def test_recommend_confirm_ranks_and_saves(client):
+    reception_id = create_reception(client)
+    response = client.post("/recommend/confirm", json={
+        "receptionId": reception_id,
+        "scores": {"1": 5.0, "2": 4.75, "3": 4.5},
+    })
+    assert response.status_code == 200
+    body = response.json()
+    # 商品2と5は同距離（元の並び順で2が先）、次が商品4。返却は product テーブルの並び順
+    assert [product["id"] for product in body["recommendedProducts"]] == [2, 4, 5]
+    assert body["recommendedProducts"][0]["category"] == "洗濯機"
+    assert body["recommendedProducts"][0]["scores"] == {"1.0": 4.5, "2.0": 4.5, "3.0": 4.5}
+
+    with connect.SessionLocal() as db:
+        saved = db.execute(
+            select(models.Suggestion.product_id, models.Suggestion.ranking)
+            .where(models.Suggestion.reception_id == reception_id)
+            .order_by(models.Suggestion.ranking)
+        ).all()
+    assert [tuple(row) for row in saved] == [(2, 1), (5, 2), (4, 3)]
+
+
+# 同時に来た再読み込みは同期・非同期で共通のロックにより1回にまとまる
+def test_catalog_reload_runs_once_for_concurrent_requests(database):
+    catalog_cache.invalidate()
+    misses = catalog_cache.misses
+
+    async def load_concurrently():
+        return await asyncio.gather(*(catalog_cache.get_async() for _ in range(8)))
+
+    snapshots = asyncio.run(load_concurrently())
+    assert catalog_cache.misses == misses + 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+
+
+# 読み込み中に破棄された場合、古い読み込み結果はキャッシュに残らない
+def test_catalog_invalidate_during_load_is_not_overwritten(database, monkeypatch):
+    from db_control.logic import catalog_cache as module
+
+    catalog_cache.invalidate()
+    original = module.CatalogSnapshot
+
+    def invalidate_while_loading(*args):
+        catalog_cache.invalidate()
+        return original(*args)
+
+    monkeypatch.setattr(module, "CatalogSnapshot", invalidate_while_loading)
+    with connect.SessionLocal() as db:
+        stale = catalog_cache.get(db)
+    assert stale is not None
+    assert catalog_cache.stats()["loaded"] is False
+
+    monkeypatch.setattr(module, "CatalogSnapshot", original)
+    with connect.SessionLocal() as db:
+        assert catalog_cache.get(db) is not stale
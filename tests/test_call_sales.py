@@ -0,0 +1,76 @@
+# /call_sales（店員呼び出し）のテスト
+import json
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, select
+
+from db_control import connect, models
+
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip().split(None, 1)[0].upper())
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def call(client, reception_id: int, uuid: str = "tablet-1"):
+    return client.post("/call_sales", json={
+        "reception_id": reception_id,
+        "uuid": uuid,
+        "frontend_url": f"http://localhost:3000/staff/{reception_id}",
+    })
+
+
+# 受付・ユーザー・店舗・カテゴリ・タブレットの取得は1クエリ（書き込みは呼び出し記録と通知の2行）
+def test_call_sales_query_count(client):
+    with count_statements(connect.engine) as statements:
+        response = call(client, 1)
+    assert response.status_code == 200
+    assert response.json() == {"message": "テスト通知を送信しました"}
+    assert statements.count("SELECT") <= 2
+    assert statements.count("INSERT") == 2
+    assert len(statements) <= 4
+
+
+def test_call_sales_queues_notification(client):
+    response = call(client, 1)
+    assert response.status_code == 200
+    with connect.SessionLocal() as db:
+        notification = db.scalars(
+            select(models.SalesCallNotification)
+            .where(models.SalesCallNotification.reception_id == 1)
+            .order_by(models.SalesCallNotification.id.desc())
+        ).first()
+    assert notification.status == "pending"
+    # 秒単位で保存する（MySQL で次の秒に丸められて送信が遅れないように）
+    assert notification.next_attempt_at.microsecond == 0
+    payload = json.loads(notification.payload)
+    assert payload["username"] == "有楽町店"
+    assert [field["value"] for field in payload["attachments"][0]["fields"]] == [
+        "3F、洗濯機売り場", "洗濯機", "<http://localhost:3000/staff/1>"
+    ]
+
+
+@pytest.mark.parametrize("reception_id, uuid, detail", [
+    (999, "tablet-1", "指定されたreception_idが存在しません"),
+    (2, "tablet-1", "Receptionに紐づくユーザーが存在しません"),
+    (3, "tablet-1", "ユーザーに紐づく店舗が存在しません"),
+    (4, "tablet-1", "Receptionに紐づくカテゴリが存在しません"),
+    (1, "unknown-tablet", "指定されたUUIDのタブレット情報が存在しません"),
+])
+def test_call_sales_not_found(client, reception_id, uuid, detail):
+    with count_statements(connect.engine) as statements:
+        response = call(client, reception_id, uuid)
+    assert response.status_code == 404
+    assert response.json() == {"detail": detail}
+    # 見つからない場合は何も書き込まない
+    assert statements == ["SELECT"]
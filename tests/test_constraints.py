@@ -0,0 +1,138 @@
+# 価格・寸法条件（schemas.ProductConstraints と CatalogSnapshot.constraint_mask）のテスト
+import math
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from db_control import connect, models, schemas
+from db_control.logic.catalog_cache import CatalogSnapshot
+from db_control.logic.recommend_logic import constraint_bounds
+
+# (id, category_id, price, width, depth, height)。None は未登録の列
+PRODUCTS = [
+    (1, 1, 50000, 60.0, 60.0, 100.0),
+    (2, 1, 80000, 64.0, None, 105.0),
+    (3, 1, None, 58.0, 62.0, 98.0),
+    (4, 1, 120000, None, 66.0, None),
+    (5, 2, 90000, 70.0, 70.0, 180.0),
+    # 評価値のない商品は行列にも条件の列にも現れない
+    (6, 1, 10000, 10.0, 10.0, 10.0),
+]
+
+
+def snapshot() -> CatalogSnapshot:
+    metric_rows = [(pid, mid, 3.0) for pid, *_ in PRODUCTS if pid != 6 for mid in (1, 2)]
+    product_rows = [
+        {
+            "id": pid, "name": f"商品{pid}", "brand": "ブランド", "price": price,
+            "width": width, "depth": depth, "height": height, "description": "",
+            "image": None, "category_id": category_id, "category": f"カテゴリ{category_id}",
+        }
+        for pid, category_id, price, width, depth, height in PRODUCTS
+    ]
+    return CatalogSnapshot((0,), metric_rows, product_rows)
+
+
+def allowed(catalog: CatalogSnapshot, category_id, **constraints) -> list:
+    mask = catalog.constraint_mask(category_id, constraint_bounds(schemas.ProductConstraints(**constraints)))
+    assert mask is not None
+    assert len(mask) == len(catalog.matrix_for(category_id))
+    return [int(pid) for pid in catalog.matrix_for(category_id).product_ids[mask]]
+
+
+def test_no_constraints_means_no_mask():
+    catalog = snapshot()
+    assert catalog.constraint_mask(1, constraint_bounds(None)) is None
+    assert catalog.constraint_mask(1, constraint_bounds(schemas.ProductConstraints())) is None
+
+
+# 下限・上限はどちらも境界値を含む
+def test_bounds_are_inclusive():
+    catalog = snapshot()
+    assert allowed(catalog, 1, minPrice=50000, maxPrice=80000) == [1, 2]
+    assert allowed(catalog, 1, minPrice=50001) == [2, 4]
+    assert allowed(catalog, 1, maxWidth=60) == [1, 3]
+    assert allowed(catalog, 1, minHeight=98, maxHeight=100) == [1, 3]
+    assert allowed(catalog, 1, minWidth=61, minHeight=101) == [2]
+    assert allowed(catalog, 1, minPrice=200000) == []
+
+
+# 条件を指定した列が未登録（NULL → NaN）の商品は対象外、指定していない列の NULL は影響しない
+def test_null_columns_are_excluded_only_when_constrained():
+    catalog = snapshot()
+    assert math.isnan(catalog.columns[1]["price"][2])
+    assert allowed(catalog, 1, minPrice=0) == [1, 2, 4]
+    assert allowed(catalog, 1, maxDepth=1000) == [1, 3, 4]
+    assert allowed(catalog, 1, maxWidth=1000, maxHeight=1000) == [1, 2, 3]
+    assert allowed(catalog, 1, minHeight=0, minWidth=0, minDepth=0, minPrice=0) == [1]
+
+
+# カテゴリ指定なしは全商品の行列、カテゴリごとの行列とは別の並び
+def test_mask_follows_matrix_order():
+    catalog = snapshot()
+    assert allowed(catalog, None, minPrice=85000) == [4, 5]
+    assert allowed(catalog, 2, minPrice=85000) == [5]
+
+
+# 商品のないカテゴリは空のマスク（推薦結果も空）
+def test_empty_category():
+    catalog = snapshot()
+    mask = catalog.constraint_mask(99, constraint_bounds(schemas.ProductConstraints(maxPrice=100000)))
+    assert mask is not None and len(mask) == 0
+    assert len(catalog.matrix_for(99)) == 0
+    assert catalog.matrix_for(99).top_n({1: 3.0}, 3, mask) == []
+
+
+def test_constraints_schema():
+    constraints = schemas.ProductConstraints(minPrice="1000", maxHeight=95.5)
+    assert constraint_bounds(constraints) == {
+        "price": (1000.0, None),
+        "width": (None, None),
+        "depth": (None, None),
+        "height": (None, 95.5),
+    }
+    with pytest.raises(ValidationError, match="minWidth"):
+        schemas.ProductConstraints(minWidth="wide")
+
+
+# /recommend/confirm での絞り込み（テストデータの価格は 100000 + 商品ID × 1000、高さは全商品 100）
+@pytest.mark.parametrize("constraints, expected", [
+    ({"maxPrice": 104000}, [2, 4, 1]),
+    ({"minPrice": 105000, "minHeight": 100}, [5, 6]),
+    ({"minHeight": 100.5}, []),
+])
+def test_confirm_applies_constraints(client, constraints, expected):
+    reception_id = client.post("/user_info", json={
+        "store_id": 1, "category_id": 1, "age": 50, "gender": "male", "household": 4,
+    }).json()["reception_id"]
+    response = client.post("/recommend/confirm", json={
+        "receptionId": reception_id,
+        "scores": {"1": 5.0, "2": 4.75, "3": 4.5},
+        "constraints": constraints,
+    })
+    assert response.status_code == 200
+    with connect.SessionLocal() as db:
+        ranked = db.execute(
+            select(models.Suggestion.product_id)
+            .where(models.Suggestion.reception_id == reception_id)
+            .order_by(models.Suggestion.ranking)
+        ).scalars().all()
+    assert list(ranked) == expected
+    assert sorted(p["id"] for p in response.json()["recommendedProducts"]) == sorted(expected)
+
+
+def test_confirm_rejects_invalid_constraints(client):
+    response = client.post("/recommend/confirm", json={
+        "receptionId": 1, "scores": {"1": 5.0}, "constraints": {"maxPrice": "cheap"},
+    })
+    assert response.status_code == 422
+
+
+# 受付のカテゴリに商品がなければ条件付きでも空の推薦になる（受付4のカテゴリ99）
+def test_confirm_with_constraints_for_empty_category(client):
+    response = client.post("/recommend/confirm", json={
+        "receptionId": 4, "scores": {"1": 5.0}, "constraints": {"maxPrice": 200000},
+    })
+    assert response.status_code == 200
+    assert response.json()["recommendedProducts"] == []
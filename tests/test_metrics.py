@@ -0,0 +1,163 @@
+# リクエスト計測（MetricsMiddleware・ルートのラベル・/metrics の Prometheus 形式）のテスト
+import re
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from db_control import connect, metrics
+from db_control.metrics import MetricsRegistry, RequestStats
+
+
+def sample(body: str, name: str, **labels) -> float:
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(f"{name}{{{label_text}}}" if labels else name) + r" (\S+)$"
+    match = re.search(pattern, body, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def scrape(client) -> str:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return response.text
+
+
+# パス引数はテンプレートのまま、未定義のパスは unmatched でまとめる（ラベルの種類を増やさない）
+def test_routes_are_labelled_by_template(client):
+    before = scrape(client)
+    for category_id in (1, 2, 99):
+        client.get(f"/question/{category_id}")
+    client.get("/no-such-path/123")
+    after = scrape(client)
+
+    def delta(**labels):
+        return sample(after, "http_requests_total", **labels) - sample(before, "http_requests_total", **labels)
+
+    assert delta(method="GET", route="/question/{category_id}", status="200") == 2
+    assert delta(method="GET", route="/question/{category_id}", status="400") == 1
+    assert delta(method="GET", route="unmatched", status="404") == 1
+    assert "/question/1\"" not in after
+    assert "/no-such-path" not in after
+    assert sample(after, "http_request_duration_seconds_count", method="GET", route="/question/{category_id}") \
+        - sample(before, "http_request_duration_seconds_count", method="GET", route="/question/{category_id}") == 3
+
+
+# リクエスト中の SQL はルートに、バックグラウンドを含む全体は db_statements_total に計上する
+def test_sql_statements_are_counted_per_route(client):
+    reception = client.post("/user_info", json={
+        "store_id": 1, "category_id": 1, "age": 30, "gender": "male", "household": 1,
+    })
+    assert reception.status_code == 200
+    body = scrape(client)
+    route = dict(method="POST", route="/user_info")
+    assert sample(body, "http_request_db_statements_count", **route) >= 1
+    assert sample(body, "http_request_db_statements_sum", **route) >= 1
+    assert sample(body, "db_statements_total") >= sample(body, "http_request_db_statements_sum", **route)
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    stats = RequestStats(keep_statements=False)
+    stats.add_statement("SELECT 1", 0.002)
+    stats.add_statement("SELECT 2", 0.001)
+    stats.add_outbound("slack", 0.5)
+    registry.observe_request("GET", "/a", 200, 0.02, stats)
+    registry.observe_request("GET", "/a", 500, 3.0, RequestStats(keep_statements=False))
+    registry.observe_request("POST", 'say "hi"\n', 200, 0.001, RequestStats(keep_statements=False))
+    registry.observe_outbound("slack", 0.5)
+    registry.observe_slow_request("GET", "/a")
+    body = registry.render()
+
+    assert body.endswith("\n")
+    lines = body.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert "# TYPE http_requests_total counter" in lines
+    # バケットは累積、+Inf は件数と一致
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",le="0.01"} 0' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",le="0.025"} 1' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",le="2.5"} 1' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",le="5.0"} 2' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",le="+Inf"} 2' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/a"} 2' in lines
+    assert 'http_request_db_statements_bucket{method="GET",route="/a",le="2"} 2' in lines
+    assert 'http_requests_total{method="GET",route="/a",status="500"} 1' in lines
+    assert 'http_request_outbound_seconds_total{method="GET",route="/a",target="slack"} 0.5' in lines
+    assert 'http_slow_requests_total{method="GET",route="/a"} 1' in lines
+    assert 'outbound_calls_total{target="slack"} 1' in lines
+    # ラベル値の \ " 改行はエスケープする
+    assert 'http_requests_total{method="POST",route="say \\"hi\\"\\n",status="200"} 1' in lines
+
+    # サンプル行はすべて「名前{ラベル} 値」か「名前 値」
+    sample_line = re.compile(r'^[a-z_]+(\{[^{}]*\})? -?[0-9.e+-]+$')
+    assert all(sample_line.match(line) for line in lines if not line.startswith("#"))
+
+
+def metrics_app(slow_request_ms: float) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with connect.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        return {"id": item_id}
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(metrics.MetricsMiddleware, slow_request_ms=slow_request_ms)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+# 例外で応答が始まらなかったリクエストは 500 として数える
+def test_middleware_records_unhandled_errors_as_500(database):
+    route = dict(method="GET", route="/boom", status="500")
+    before = sample(metrics.registry.render(), "http_requests_total", **route)
+    response = metrics_app(0).get("/boom")
+    assert response.status_code == 500
+    assert sample(metrics.registry.render(), "http_requests_total", **route) == before + 1
+
+
+# 遅いリクエストは SQL と一緒に1回の出力でログに出し、/metrics でも数える
+def test_slow_request_is_logged_once_with_statements(database, capsys):
+    metrics.instrument_engine(connect.engine)
+    route = dict(method="GET", route="/items/{item_id}")
+    before = sample(metrics.registry.render(), "http_slow_requests_total", **route)
+
+    client = metrics_app(slow_request_ms=0.000001)
+    assert client.get("/items/7").status_code == 200
+    output = capsys.readouterr().out
+    assert output.count("Slow request:") == 1
+    log = output[output.index("Slow request:"):].splitlines()
+    assert re.match(r"Slow request: GET /items/\{item_id\} 200 [0-9.]+ms sql=2 \([0-9.]+ms\)$", log[0])
+    assert re.match(r"  \[[0-9.]+ms\] SELECT 1$", log[1])
+    assert re.match(r"  \[[0-9.]+ms\] SELECT 2$", log[2])
+    assert sample(metrics.registry.render(), "http_slow_requests_total", **route) == before + 1
+
+    # 閾値を下回るリクエストは出さない
+    assert metrics_app(slow_request_ms=60_000).get("/items/7").status_code == 200
+    assert "Slow request:" not in capsys.readouterr().out
+
+
+def test_slow_log_keeps_only_the_first_statements(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_SLOW_LOG_STATEMENTS", 2)
+    stats = RequestStats(keep_statements=True)
+    for i in range(5):
+        stats.add_statement(f"SELECT\n    {i}", 0.001)
+    stats.add_outbound("sas", 0.25)
+    log = metrics._format_slow_request("POST", "/x", 201, 1.5, stats).splitlines()
+    assert log == [
+        "Slow request: POST /x 201 1500.0ms sql=5 (5.0ms) outbound: sas=250.0ms",
+        "  [1.0ms] SELECT 0",
+        "  [1.0ms] SELECT 1",
+    ]
+
+
+def test_disabled_metrics_pass_through(database, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    route = dict(method="GET", route="/items/{item_id}", status="200")
+    before = sample(metrics.registry.render(), "http_requests_total", **route)
+    assert metrics_app(0).get("/items/1").json() == {"id": 1}
+    assert sample(metrics.registry.render(), "http_requests_total", **route) == before
@@ -0,0 +1,66 @@
+# 近傍探索インデックス（BlockKDIndex）のテスト
+import numpy as np
+import pytest
+
+from db_control import connect
+from db_control.logic import catalog_cache as catalog_module
+from db_control.logic.catalog_cache import CatalogCache
+from db_control.logic.nn_index import BlockKDIndex
+from db_control.logic.similarity import ProductMatrix
+
+
+def random_matrix(rng, products: int, metrics: int, missing: float) -> ProductMatrix:
+    # 同点が出やすいよう 0.5 刻みの評価値、missing の割合で未登録（NaN）を混ぜる
+    levels = rng.choice(np.arange(1.0, 5.5, 0.5), size=(products, metrics))
+    levels[rng.random((products, metrics)) < missing] = np.nan
+    return ProductMatrix(np.arange(1, products + 1) * 3, np.arange(1, metrics + 1), levels)
+
+
+def random_user(rng, metrics: int) -> dict:
+    return {m: float(rng.choice([1.0, 2.25, 3.0, 4.5, 5.0])) for m in range(1, metrics + 1) if rng.random() < 0.8}
+
+
+# インデックスの結果は全件走査（ProductMatrix.top_n）と完全に一致する（順位・同点・除外マスク）
+@pytest.mark.parametrize("seed", range(12))
+@pytest.mark.parametrize("missing", [0.0, 0.05, 0.6])
+def test_index_matches_brute_force(seed, missing):
+    rng = np.random.default_rng(seed)
+    matrix = random_matrix(rng, int(rng.integers(50, 3000)), int(rng.integers(2, 10)), missing)
+    index = BlockKDIndex(matrix, leaf_size=int(rng.choice([4, 16, 64])))
+    assert matrix.index is None
+    for _ in range(10):
+        user_scores = random_user(rng, len(matrix.metric_ids))
+        allowed = rng.random(len(matrix)) < rng.choice([0.02, 0.5, 1.0])
+        for top_n in (1, 3, 20):
+            assert index.top_n(user_scores, top_n) == matrix.top_n(user_scores, top_n)
+            assert index.top_n(user_scores, top_n, allowed) == matrix.top_n(user_scores, top_n, allowed)
+
+
+def test_index_with_nothing_allowed_returns_nothing():
+    rng = np.random.default_rng(0)
+    matrix = random_matrix(rng, 500, 5, 0.0)
+    index = BlockKDIndex(matrix, leaf_size=8)
+    allowed = np.zeros(len(matrix), dtype=bool)
+    assert index.top_n({1: 3.0}, 3, allowed) == matrix.top_n({1: 3.0}, 3, allowed) == []
+
+
+# インデックス作成の失敗は全件走査のまま続行し、stats() に残す
+def test_index_build_error_is_reported(database, monkeypatch):
+    cache = CatalogCache()
+    with connect.SessionLocal() as db:
+        snapshot = cache.get(db)
+
+    def broken(matrices, previous):
+        raise MemoryError("too large")
+
+    monkeypatch.setattr(catalog_module, "build_indexes", broken)
+    cache._build_indexes(snapshot)
+    stats = cache.stats()
+    assert (stats["index_errors"], stats["index_last_error"]) == (1, "MemoryError: too large")
+    assert stats["index_builds"] == 0
+    assert stats["indexed_categories"] == []
+
+    monkeypatch.undo()
+    cache._build_indexes(snapshot)
+    stats = cache.stats()
+    assert (stats["index_errors"], stats["index_last_error"], stats["index_builds"]) == (1, None, 1)
@@ -0,0 +1,94 @@
+# /priority（優先度の upsert と一括取得）と一意制約の追加手順のテスト
+import pytest
+from sqlalchemy import create_engine, select
+
+from db_control import bootstrap, connect, crud, models
+
+
+def priorities(reception_id: int) -> dict:
+    with connect.SessionLocal() as db:
+        rows = db.execute(
+            select(models.Priority.metrics_id, models.Priority.level)
+            .where(models.Priority.reception_id == reception_id)
+            .order_by(models.Priority.metrics_id)
+        ).all()
+    return [tuple(row) for row in rows]
+
+
+def post(client, reception_id: int, levels: dict):
+    response = client.post("/priority", json={"priorities": [
+        {"reception_id": reception_id, "metrics_id": metrics_id, "level": level}
+        for metrics_id, level in levels.items()
+    ]})
+    assert response.status_code == 200
+
+
+@pytest.fixture
+def reception(client):
+    response = client.post("/user_info", json={
+        "store_id": 1, "category_id": 1, "age": 40, "gender": "male", "household": 2,
+    })
+    return response.json()["reception_id"]
+
+
+# 再送信しても行は増えず、最新の値で上書きされる（SQLite の ON CONFLICT）
+def test_resubmission_overwrites(client, reception):
+    post(client, reception, {1: 5.0, 2: 4.0})
+    post(client, reception, {1: 3.0, 3: 4.5})
+    assert priorities(reception) == [(1, 3.0), (2, 4.0), (3, 4.5)]
+
+
+def test_duplicate_keys_in_one_request_last_wins(client, reception):
+    response = client.post("/priority", json={"priorities": [
+        {"reception_id": reception, "metrics_id": 1, "level": 2.0},
+        {"reception_id": reception, "metrics_id": 1, "level": 4.0},
+    ]})
+    assert response.status_code == 200
+    assert priorities(reception) == [(1, 4.0)]
+
+
+# 方言別の upsert がない DB では削除してから挿入する
+def test_generic_fallback_replaces_rows(database, reception, monkeypatch):
+    monkeypatch.setattr(crud, "_priority_upsert_statement", lambda dialect_name: None)
+    for level in (2.0, 3.5):
+        with connect.SessionLocal() as db:
+            crud.upsert_priorities(db, [
+                {"reception_id": reception, "metrics_id": 1, "level": level},
+                {"reception_id": reception, "metrics_id": 2, "level": level},
+            ])
+            db.commit()
+    assert priorities(reception) == [(1, 3.5), (2, 3.5)]
+
+
+def test_bulk_read_returns_every_reception(client, reception):
+    post(client, reception, {1: 5.0, 2: 4.0})
+    response = client.get("/priority", params={"reception_ids": [reception, 9999]})
+    assert response.status_code == 200
+    body = response.json()
+    assert sorted(p["metricsId"] for p in body[str(reception)]) == [1, 2]
+    assert body["9999"] == []
+
+
+# 既存の priority に重複があれば一意制約は作らず、削除は明示的な手順で行う
+def test_unique_key_is_not_created_over_duplicates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE priority (id INTEGER PRIMARY KEY, reception_id INTEGER, metrics_id INTEGER, level FLOAT)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO priority (id, reception_id, metrics_id, level) VALUES "
+            "(1, 1, 1, 3.0), (2, 1, 1, 4.0), (3, 1, 2, 5.0), (4, 2, 1, 1.0), (5, 1, 1, 4.5)"
+        )
+
+    result = bootstrap.ensure_priority_unique_key(engine)
+    assert result == {"status": "skipped", "duplicates": [1, 2]}
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM priority").scalar() == 5
+
+    assert bootstrap.remove_priority_duplicates(engine) == [1, 2]
+    assert bootstrap.ensure_priority_unique_key(engine) == {"status": "created", "duplicates": []}
+    assert bootstrap.ensure_priority_unique_key(engine)["status"] == "exists"
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT id, level FROM priority ORDER BY id").all()
+    assert [tuple(row) for row in rows] == [(3, 5.0), (4, 1.0), (5, 4.5)]
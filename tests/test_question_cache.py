@@ -0,0 +1,84 @@
+# 質問セットキャッシュ（カテゴリ単位の読み込みと ETag）のテスト
+import asyncio
+
+import pytest
+
+from db_control.logic import question_cache as module
+from db_control.logic.question_cache import QuestionCache, if_none_match
+
+ETAG = '"abc123"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('"abc123"', True),
+    ('W/"abc123"', True),
+    ('"other", "abc123"', True),
+    ('W/"other" ,W/"abc123"', True),
+    ("*", True),
+    (' * ', True),
+    ('"other"', False),
+    ('"abc12"', False),
+    ('abc123', False),
+])
+def test_if_none_match(header, expected):
+    assert if_none_match(header, ETAG) is expected
+
+
+def test_question_route_honours_etag_lists(client):
+    etag = client.get("/question/1").headers["etag"]
+    for header in (f'"stale", {etag}', f"W/{etag}", "*"):
+        assert client.get("/question/1", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/question/1", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def fake_loader(monkeypatch, load):
+    calls = []
+
+    async def get_questions_by_category(db, category_id):
+        calls.append(category_id)
+        return await load(category_id)
+
+    monkeypatch.setattr(module.crud, "get_questions_by_category", get_questions_by_category)
+    return calls
+
+
+# 同じカテゴリの同時ミスは1回の読み込みにまとまり、別カテゴリは待たされない
+def test_misses_are_coalesced_per_category(monkeypatch):
+    cache = QuestionCache()
+
+    async def run():
+        second_started = asyncio.Event()
+
+        async def load(category_id):
+            if category_id == 1:
+                # カテゴリ2の読み込みが始まるまで待つ（全体で1つのロックなら進まない）
+                await asyncio.wait_for(second_started.wait(), timeout=2)
+            else:
+                second_started.set()
+            return {"1": {"question_text": f"q{category_id}", "options": []}}
+
+        calls = fake_loader(monkeypatch, load)
+        results = await asyncio.gather(
+            cache.get(None, 1), cache.get(None, 1), cache.get(None, 2), cache.get(None, 1)
+        )
+        return calls, results
+
+    calls, results = asyncio.run(run())
+    assert sorted(calls) == [1, 2]
+    assert results[0] is results[1] is results[3]
+    assert cache.coalesced == 2
+
+
+# 読み込み中に破棄された場合、古い内容はキャッシュに残らない
+def test_invalidate_during_load_is_respected(monkeypatch):
+    cache = QuestionCache()
+
+    async def load(category_id):
+        cache.invalidate(category_id)
+        return {"1": {"question_text": "old", "options": []}}
+
+    fake_loader(monkeypatch, load)
+    entry = asyncio.run(cache.get(None, 1))
+    assert b"old" in entry.body
+    assert cache.stats()["categories"] == []
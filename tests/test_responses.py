@@ -0,0 +1,114 @@
+# FastJSONResponse（orjson）と従来の JSONResponse の出力が一致すること（FAST_JSON_RESPONSES の切り替え）
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from db_control import responses, schemas
+from db_control.responses import FastJSONResponse
+
+PRODUCT = {
+    "id": 2,
+    "name": "ドラム式洗濯機 ヒートポンプ乾燥",
+    "brand": "ブランド",
+    "price": 102000.0,
+    "dimensions": {"width": 60.0, "depth": 62.5, "height": None},
+    "description": "説明\n\"引用\" \\ タブ\t絵文字😀",
+    "category": "洗濯機",
+    "image": None,
+    # レーダーチャート用のキーは従来どおり "1.0" 形式
+    "scores": {"1.0": 4.5, "2.0": 3.0, "10.0": 1.25},
+}
+
+SHAPES = {
+    "score": (None, {
+        "receptionId": 1,
+        "priorities": [
+            {"metricsId": 1, "name": "乾燥", "score": 5.0},
+            {"metricsId": 6, "name": "Metric-6", "score": 4.33},
+        ],
+    }),
+    "confirm": (schemas.ConfirmRecommendationResponse, {"receptionId": 1, "recommendedProducts": [PRODUCT]}),
+    "confirm_batch": (schemas.ConfirmRecommendationBatchResponse, {
+        "results": [
+            {"receptionId": 1, "recommendedProducts": [PRODUCT]},
+            {"receptionId": 2, "recommendedProducts": []},
+        ],
+        "timing": {"lookup_ms": 0.125, "total_ms": 12.0},
+    }),
+    "login": (schemas.StoreLoginResponse, {
+        "store_id": 1,
+        "store_name": "有楽町店",
+        "prefecture": "東京都",
+        "character": {
+            "name": "ビッ子", "image": "https://example.blob/img.png?sig=a%2Bb&se=1",
+            "video": None, "voice_1": None, "voice_2": None, "message_1": "いらっしゃいませ！", "message_2": None,
+        },
+    }),
+}
+
+
+# response_model を通した従来の出力（FAST_JSON_RESPONSES=false のとき FastAPI が返すもの）
+def default_body(model, content) -> bytes:
+    if model is not None:
+        content = model.parse_obj(content)
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+def test_orjson_output_matches_json_response(shape):
+    model, content = SHAPES[shape]
+    assert responses.HAS_ORJSON
+    assert FastJSONResponse(content).body == default_body(model, content)
+
+
+# orjson が無い環境の出力も同じ（Decimal は float として書き出す）
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+def test_fallback_output_matches_json_response(shape, monkeypatch):
+    model, content = SHAPES[shape]
+    monkeypatch.setattr(responses, "HAS_ORJSON", False)
+    assert FastJSONResponse(content).body == default_body(model, content)
+
+
+@pytest.mark.parametrize("has_orjson", [True, False])
+def test_decimal_and_integer_keys(has_orjson, monkeypatch):
+    monkeypatch.setattr(responses, "HAS_ORJSON", has_orjson)
+    content = {"level": Decimal("4.5"), "scores": {1: 3.0, 2: None}}
+    assert FastJSONResponse(content).body == b'{"level":4.5,"scores":{"1":3.0,"2":null}}'
+
+
+def post_both(client, monkeypatch, path: str, payload: dict):
+    bodies = []
+    for enabled in (True, False):
+        monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", enabled)
+        response = client.post(path, json=payload)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        bodies.append(response)
+    return bodies
+
+
+# 実際のルートで切り替えても同じバイト列を返す
+def test_routes_match_with_and_without_fast_json(client, monkeypatch):
+    reception_id = client.post("/user_info", json={
+        "store_id": 1, "category_id": 1, "age": 35, "gender": "female", "household": 3,
+    }).json()["reception_id"]
+    answers = [{"questionId": 1, "value": 1}, {"questionId": 2, "value": 1}]
+    scores = {"1": 5.0, "2": 4.75, "3": 4.5}
+
+    for path, payload in (
+        ("/recommend/score", {"receptionId": reception_id, "answers": answers}),
+        ("/recommend/score/batch", {"items": [{"receptionId": reception_id, "answers": answers}]}),
+        ("/recommend/confirm", {"receptionId": reception_id, "scores": scores}),
+    ):
+        fast, default = post_both(client, monkeypatch, path, payload)
+        assert fast.content == default.content, path
+
+    # 一括推薦は処理時間以外が一致する
+    fast, default = post_both(client, monkeypatch, "/recommend/confirm/batch", {
+        "items": [{"receptionId": reception_id, "scores": scores}],
+    })
+    assert fast.json()["results"] == default.json()["results"]
+    assert fast.json()["results"][0]["recommendedProducts"][0]["scores"] == {"1.0": 4.5, "2.0": 4.5, "3.0": 4.5}
+    assert sorted(fast.json()["timing"]) == sorted(default.json()["timing"])
@@ -0,0 +1,132 @@
+# 店員呼び出し通知 dispatcher のテスト（Slack はローカルのスタブ）
+import datetime
+
+import pytest
+
+from db_control import connect, models
+from db_control.logic.sales_call_dispatcher import SalesCallDispatcher
+
+
+class StubSlack:
+    class Response:
+        status_code = 200
+        text = "ok"
+
+    def __init__(self):
+        self.payloads = []
+
+    def post(self, url, data=None, timeout=None):
+        self.payloads.append(data)
+        return self.Response()
+
+
+@pytest.fixture
+def outbox(database):
+    with connect.SessionLocal() as db:
+        db.query(models.SalesCallNotification).delete()
+        db.commit()
+    return database
+
+
+def dispatcher(slack: StubSlack, **kwargs) -> SalesCallDispatcher:
+    return SalesCallDispatcher(connect.SessionLocal, "https://hooks.slack.invalid/test", http_session=slack, **kwargs)
+
+
+def add_notification(payload: str, reception_id: int = 1, **values) -> int:
+    with connect.SessionLocal() as db:
+        notification = models.SalesCallNotification(
+            reception_id=reception_id,
+            payload=payload,
+            status=values.pop("status", "pending"),
+            next_attempt_at=values.pop("next_attempt_at", datetime.datetime.utcnow() - datetime.timedelta(seconds=1)),
+            **values
+        )
+        db.add(notification)
+        db.commit()
+        return notification.id
+
+
+def status_of(notification_id: int) -> str:
+    with connect.SessionLocal() as db:
+        return db.get(models.SalesCallNotification, notification_id).status
+
+
+# 同時に送信待ちの呼び出しは最新の1件だけ送る
+def test_pending_calls_for_same_reception_are_coalesced(outbox):
+    slack = StubSlack()
+    first = add_notification('{"n": 1}')
+    second = add_notification('{"n": 2}')
+    other = add_notification('{"n": 3}', reception_id=2)
+
+    dispatcher(slack).dispatch_once()
+    assert sorted(slack.payloads) == ['{"n": 2}', '{"n": 3}']
+    assert (status_of(first), status_of(second), status_of(other)) == ("coalesced", "sent", "sent")
+
+
+# 送信後に同じ受付からもう一度呼ばれたら、既定では送る
+def test_repeated_call_after_sent_is_delivered(outbox):
+    slack = StubSlack()
+    sender = dispatcher(slack)
+    add_notification('{"n": 1}')
+    sender.dispatch_once()
+    again = add_notification('{"n": 2}')
+    sender.dispatch_once()
+    assert slack.payloads == ['{"n": 1}', '{"n": 2}']
+    assert status_of(again) == "sent"
+
+
+# 送信済みからの間隔でまとめるのは設定した場合だけ
+def test_coalesce_window_is_opt_in(outbox):
+    slack = StubSlack()
+    sender = dispatcher(slack, coalesce_seconds=30)
+    add_notification('{"n": 1}')
+    sender.dispatch_once()
+    again = add_notification('{"n": 2}')
+    sender.dispatch_once()
+    assert slack.payloads == ['{"n": 1}']
+    assert status_of(again) == "coalesced"
+
+
+# リース切れの送信中を2つのワーカーが同時に読んでも、取得できるのは片方だけ
+def test_expired_lease_is_claimed_once(outbox):
+    expired = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+    notification_id = add_notification('{"n": 1}', status="sending", next_attempt_at=expired)
+
+    first, second = dispatcher(StubSlack()), dispatcher(StubSlack())
+    with connect.SessionLocal() as db_first, connect.SessionLocal() as db_second:
+        stale = db_second.get(models.SalesCallNotification, notification_id)
+        seen = (stale.status, stale.attempts, stale.next_attempt_at)
+
+        # 先に一方のワーカーが取得する（状態は送信中のまま、リース期限だけが進む）
+        assert [n.id for n in first._claim_due(db_first)] == [notification_id]
+
+        lease = datetime.datetime.utcnow() + datetime.timedelta(seconds=60)
+        assert not second._update_if_unchanged(db_second, stale, seen, status="sending", next_attempt_at=lease)
+    assert status_of(notification_id) == "sending"
+
+
+def test_failed_delivery_is_retried_with_backoff(outbox):
+    class FailingSlack(StubSlack):
+        def post(self, url, data=None, timeout=None):
+            raise TimeoutError("slack timeout")
+
+    notification_id = add_notification('{"n": 1}')
+    sender = dispatcher(FailingSlack(), max_attempts=2, backoff=0)
+    sender.dispatch_once()
+    assert status_of(notification_id) == "pending"
+    sender.dispatch_once()
+    assert status_of(notification_id) == "failed"
+    assert (sender.retried, sender.failed) == (1, 1)
+
+
+# 受け付けた直後の呼び出しは次のポーリングを待たずに送る
+def test_new_call_is_due_immediately(outbox, client):
+    response = client.post("/call_sales", json={
+        "reception_id": 1,
+        "uuid": "tablet-1",
+        "frontend_url": "http://localhost:3000/staff/1",
+    })
+    assert response.status_code == 200
+    slack = StubSlack()
+    assert dispatcher(slack).dispatch_once() == 1
+    assert len(slack.payloads) == 1
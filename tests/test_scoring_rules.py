@@ -0,0 +1,30 @@
+# スコアリングルール（コンパイル済みの表とキャッシュ）のテスト
+from concurrent.futures import ThreadPoolExecutor
+
+from db_control import connect, models
+from db_control.logic import scoring_rules
+from db_control.logic.scoring_rules import ScoringRuleCache
+
+
+def test_default_table_is_compiled_once(monkeypatch):
+    monkeypatch.setattr(scoring_rules, "_default_table", None)
+    with ThreadPoolExecutor(8) as pool:
+        tables = list(pool.map(lambda _: scoring_rules.default_table(), range(32)))
+    assert all(table is tables[0] for table in tables)
+
+
+# ルールを変更すると次の確認で再コンパイルされる
+def test_rule_edit_is_picked_up_by_probe(database):
+    cache = ScoringRuleCache(probe_interval=0)
+    with connect.SessionLocal() as db:
+        before = cache.get(db).table_for(1).score([(2, 1)])
+        rule = models.ScoringRule(question_id=2, value=1, metrics_id=3, delta=1.0)
+        db.add(rule)
+        db.commit()
+        try:
+            after = cache.get(db).table_for(1).score([(2, 1)])
+        finally:
+            db.delete(rule)
+            db.commit()
+    assert (before[3], after[3]) == (4.5, 5.5)
+    assert cache.reloads == 1
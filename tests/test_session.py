@@ -0,0 +1,68 @@
+# /session（接客セッションの一括保存）のテスト
+from sqlalchemy import func, select
+
+from db_control import connect, crud, models
+
+
+def kiosk_session(**overrides) -> dict:
+    session = {
+        "store_id": 1,
+        "category_id": 1,
+        "age": 28,
+        "gender": "male",
+        "household": 2,
+        "answers": [{"questionId": 1, "answer": 1}, {"questionId": 2, "answer": 0}],
+        "priorities": [{"metrics_id": 1, "level": 5.0}, {"metrics_id": 2, "level": 4.5}],
+    }
+    session.update(overrides)
+    return session
+
+
+def test_session_is_saved(client):
+    response = client.post("/session", json=kiosk_session())
+    assert response.status_code == 200
+    reception_id = response.json()["reception_id"]
+    with connect.SessionLocal() as db:
+        assert db.get(models.Reception, reception_id).category_id == 1
+        answers = db.scalar(select(func.count()).where(models.AnswerInfo.reception_id == reception_id))
+        priorities = db.scalar(select(func.count()).where(models.Priority.reception_id == reception_id))
+    assert (answers, priorities) == (2, 2)
+
+
+def test_session_invalid_question_is_400(client):
+    response = client.post("/session", json=kiosk_session(answers=[{"questionId": 77, "answer": 1}]))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid question ID: 77"
+
+
+def test_session_save_failure_is_500(client, monkeypatch):
+    async def fail(db, rows):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(crud, "upsert_priorities_async", fail)
+    response = client.post("/session", json=kiosk_session())
+    assert response.status_code == 500
+    assert response.json()["detail"] == "セッションの保存に失敗しました: disk full"
+
+
+def test_bulk_reports_each_session(client):
+    response = client.post("/session/bulk", json={"sessions": [
+        kiosk_session(),
+        kiosk_session(answers=[{"questionId": 77, "answer": 1}]),
+    ]})
+    assert response.status_code == 200
+    first, second = response.json()["results"]
+    assert first["reception_id"] is not None and first["error"] is None
+    assert second == {"reception_id": None, "error": "Invalid question ID: 77"}
+
+
+def test_bulk_save_failure_marks_every_session(client, monkeypatch):
+    async def fail(db, rows):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(crud, "upsert_priorities_async", fail)
+    response = client.post("/session/bulk", json={"sessions": [kiosk_session(), kiosk_session()]})
+    assert response.status_code == 200
+    assert [result["error"] for result in response.json()["results"]] == [
+        "セッションの保存に失敗しました: disk full"
+    ] * 2
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from db_control import schemas
+from db_control.logic import similarity
+from db_control.logic.similarity import ProductMatrix
+
+
+def random_matrix(rng, products: int, metrics: int) -> ProductMatrix:
+    # 未登録の評価値（NaN）を含む商品×評価項目の行列
+    levels = rng.choice([1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0, np.nan], size=(products, metrics))
+    return ProductMatrix(np.arange(1, products + 1), np.arange(1, metrics + 1), levels)
+
+
+def random_users(rng, metrics: int, count: int) -> list:
+    return [
+        {m: float(rng.choice([0.25, 1.75, 3.3333, 4.1, 5.0])) for m in range(1, metrics + 1) if rng.random() < 0.8}
+        for _ in range(count)
+    ]
+
+
+# 従来の pandas 版 calculate_similarity（iterrows で1行ずつ距離を足す）と同じ計算
+# 商品は初出順、同点は安定ソートで初出順のまま
+def legacy_top_n(rows: list, user_scores: dict, top_n: int) -> list:
+    product_ids = list(dict.fromkeys(product_id for product_id, _, _ in rows))
+    distances = []
+    for pid in product_ids:
+        distance = 0
+        for product_id, mid, level in rows:
+            if product_id == pid and mid in user_scores:
+                distance += (user_scores[mid] - level) ** 2
+        distances.append((pid, np.sqrt(distance)))
+    distances.sort(key=lambda x: x[1])
+    return [int(pid) for pid, _ in distances[:top_n]]
+
+
+def random_rows(rng, products: int, metrics: int) -> list:
+    # product_metrics の行（並びはばらばら、評価項目の一部が未登録の商品を含む）
+    rows = [
+        (int(pid), mid, float(rng.choice([1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0])))
+        for pid in rng.permutation(np.arange(1, products + 1) * 7)
+        for mid in range(1, metrics + 1)
+        if rng.random() < 0.85
+    ]
+    return [rows[i] for i in rng.permutation(len(rows))]
+
+
+# ベクトル化した上位 N 件が従来の iterrows 版と同じ（順位・同点・未登録の評価項目）
+@pytest.mark.parametrize("seed", range(30))
+def test_top_n_matches_legacy_iterrows(seed):
+    rng = np.random.default_rng(seed)
+    rows = random_rows(rng, int(rng.integers(1, 120)), int(rng.integers(1, 10)))
+    matrix = ProductMatrix.from_rows(*zip(*rows)) if rows else ProductMatrix.from_rows([], [], [])
+    for user_scores in random_users(rng, 10, 10):
+        for top_n in (1, 3, 10):
+            assert matrix.top_n(user_scores, top_n) == legacy_top_n(rows, user_scores, top_n)
+
+
+# 一括計算（/recommend/confirm/batch）と1件ずつ（/recommend/confirm）で距離・順位が完全に一致する
+@pytest.mark.parametrize("seed", range(20))
+def test_distances_many_matches_single(seed):
+    rng = np.random.default_rng(seed)
+    matrix = random_matrix(rng, int(rng.integers(1, 400)), int(rng.integers(1, 12)))
+    users = random_users(rng, len(matrix.metric_ids), int(rng.integers(1, 40)))
+
+    distances = matrix.distances_many(users)
+    ranked = matrix.top_n_many(users, 5)
+    for i, user_scores in enumerate(users):
+        assert np.array_equal(distances[i], matrix.distances(user_scores))
+        assert ranked[i] == matrix.top_n(user_scores, 5)
+
+
+# 中間配列の分割の境界をまたいでも結果は変わらない
+def test_distances_many_chunked(monkeypatch):
+    rng = np.random.default_rng(0)
+    matrix = random_matrix(rng, 50, 9)
+    users = random_users(rng, 9, 25)
+    expected = matrix.distances_many(users)
+    monkeypatch.setattr(similarity, "DISTANCE_CHUNK_CELLS", 50 * 9 * 2)
+    assert np.array_equal(matrix.distances_many(users), expected)
+
+
+# 同じ受付が重複した一括推薦は受け付けない
+def test_batch_rejects_duplicate_reception_ids():
+    with pytest.raises(ValidationError, match="receptionId"):
+        schemas.ConfirmRecommendationBatch(items=[
+            {"receptionId": 1, "scores": {1: 3.0}},
+            {"receptionId": 2, "scores": {1: 3.0}},
+            {"receptionId": 1, "scores": {1: 4.0}},
+        ])
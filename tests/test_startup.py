@@ -0,0 +1,57 @@
+# ワーカー起動まわりのテスト（新しいプロセスで確認する）
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+PROBE = r"""
+import asyncio, sys
+from concurrent.futures import ThreadPoolExecutor
+import app
+asyncio.run(app.app.router.startup())
+assert "numpy" not in sys.modules, "numpy loaded at startup"
+
+from db_control.logic.similarity import ProductMatrix
+
+def rank(_):
+    matrix = ProductMatrix.from_rows([1, 1, 2, 2], [1, 2, 1, 2], [5.0, 1.0, 2.0, 4.0])
+    return matrix.top_n({1: 5.0, 2: 1.0}, 1)
+
+# numpy の初回読み込みが複数スレッドで同時に起きても失敗しない
+with ThreadPoolExecutor(16) as pool:
+    assert list(pool.map(rank, range(16))) == [[1]] * 16
+print("ok")
+"""
+
+
+def test_numpy_loads_on_first_use_from_many_threads(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}")
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+
+BOOTSTRAP_PROBE = r"""
+import asyncio
+from sqlalchemy import inspect
+import app
+from db_control import connect
+asyncio.run(app.app.router.startup())
+inspector = inspect(connect.engine)
+print(sorted(inspector.get_table_names()))
+unique = [c["name"] for c in inspector.get_unique_constraints("priority")]
+unique += [i["name"] for i in inspector.get_indexes("priority") if i.get("unique")]
+print(sorted(unique))
+"""
+
+
+# 既定では起動時に新しいテーブル・インデックスまで作成される
+def test_startup_bootstraps_schema_by_default(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'fresh.db'}")
+    env.pop("DB_BOOTSTRAP_ON_STARTUP", None)
+    result = subprocess.run([sys.executable, "-c", BOOTSTRAP_PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    tables, unique_keys = result.stdout.strip().splitlines()[-2:]
+    assert "'sales_call_notification'" in tables and "'scoring_rule'" in tables
+    assert "uq_priority_reception_metrics" in unique_keys
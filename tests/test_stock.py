@@ -0,0 +1,128 @@
+# 在庫による推薦の絞り込み（inStockOnly）と在庫キャッシュのテスト
+import pytest
+from sqlalchemy import delete, select
+
+from db_control import connect, models
+from db_control.logic.stock_cache import stock_cache
+
+# 受付カテゴリ1の距離順は 2, 5, 4, 6, 1, 3（2と5は同距離で元の並び順）
+SCORES = {"1": 5.0, "2": 4.75, "3": 4.5}
+
+
+def create_reception(client, store_id: int) -> int:
+    response = client.post("/user_info", json={
+        "store_id": store_id, "category_id": 1, "age": 28, "gender": "female", "household": 1,
+    })
+    assert response.status_code == 200
+    return response.json()["reception_id"]
+
+
+def ranked(reception_id: int) -> list:
+    with connect.SessionLocal() as db:
+        rows = db.execute(
+            select(models.Suggestion.product_id)
+            .where(models.Suggestion.reception_id == reception_id)
+            .order_by(models.Suggestion.ranking)
+        ).scalars().all()
+    return list(rows)
+
+
+def confirm(client, reception_id: int, **extra) -> list:
+    response = client.post("/recommend/confirm", json={"receptionId": reception_id, "scores": SCORES, **extra})
+    assert response.status_code == 200
+    returned = sorted(product["id"] for product in response.json()["recommendedProducts"])
+    assert returned == sorted(ranked(reception_id))
+    return ranked(reception_id)
+
+
+# 店舗1: 商品2は全色在庫切れ（色違いは合算）、商品5は一部の色だけ在庫あり
+# 店舗2: 商品2・3・6だけ在庫あり
+@pytest.fixture
+def stocked(client):
+    with connect.SessionLocal() as db:
+        if db.get(models.Store, 2) is None:
+            db.add(models.Store(id=2, name="池袋店", password="x", prefecture="東京都", is_available=True))
+        db.add_all([
+            models.Stock(store_id=1, product_id=1, color="白", number=1),
+            models.Stock(store_id=1, product_id=2, color="白", number=0),
+            models.Stock(store_id=1, product_id=2, color="黒", number=0),
+            models.Stock(store_id=1, product_id=4, color=None, number=2),
+            models.Stock(store_id=1, product_id=5, color="白", number=0),
+            models.Stock(store_id=1, product_id=5, color="黒", number=3),
+            models.Stock(store_id=2, product_id=2, color=None, number=1),
+            models.Stock(store_id=2, product_id=3, color=None, number=4),
+            models.Stock(store_id=2, product_id=6, color=None, number=1),
+        ])
+        db.commit()
+    stock_cache.invalidate()
+    yield
+    with connect.SessionLocal() as db:
+        db.execute(delete(models.Stock))
+        db.commit()
+    stock_cache.invalidate()
+
+
+def test_zero_stock_is_excluded(client, stocked):
+    reception_id = create_reception(client, store_id=1)
+    assert confirm(client, reception_id) == [2, 5, 4]
+    assert confirm(client, reception_id, inStockOnly=True) == [5, 4, 1]
+
+
+def test_masks_are_per_store(client, stocked):
+    store1 = create_reception(client, store_id=1)
+    store2 = create_reception(client, store_id=2)
+    # 在庫を管理していない店舗（stock 行がない）は絞り込まない
+    unmanaged = create_reception(client, store_id=99)
+    assert confirm(client, store1, inStockOnly=True) == [5, 4, 1]
+    assert confirm(client, store2, inStockOnly=True) == [2, 6, 3]
+    assert confirm(client, unmanaged, inStockOnly=True) == [2, 5, 4]
+
+    # 一括推薦でも受付ごとに店舗の在庫で絞り込む（inStockOnly も項目ごと）
+    response = client.post("/recommend/confirm/batch", json={"items": [
+        {"receptionId": store1, "scores": SCORES, "inStockOnly": True},
+        {"receptionId": store2, "scores": SCORES, "inStockOnly": True},
+        {"receptionId": unmanaged, "scores": SCORES, "inStockOnly": True},
+    ]})
+    assert response.status_code == 200
+    assert [ranked(r) for r in (store1, store2, unmanaged)] == [[5, 4, 1], [2, 6, 3], [2, 5, 4]]
+
+    response = client.post("/recommend/confirm/batch", json={"items": [
+        {"receptionId": store1, "scores": SCORES, "inStockOnly": False},
+        {"receptionId": store2, "scores": SCORES, "inStockOnly": True},
+    ]})
+    assert response.status_code == 200
+    assert [ranked(r) for r in (store1, store2)] == [[2, 5, 4], [2, 6, 3]]
+
+
+# ORM での在庫更新はコミット時に反映され、確認間隔（STOCK_PROBE_INTERVAL）を待たない
+def test_commit_invalidates_changed_store(client, stocked):
+    store1 = create_reception(client, store_id=1)
+    store2 = create_reception(client, store_id=2)
+    assert confirm(client, store1, inStockOnly=True) == [5, 4, 1]
+    assert confirm(client, store2, inStockOnly=True) == [2, 6, 3]
+    assert stock_cache.probe_interval >= 30
+    store_reloads = stock_cache.store_reloads
+
+    with connect.SessionLocal() as db:
+        restocked = db.execute(
+            select(models.Stock).where(models.Stock.store_id == 1, models.Stock.product_id == 2, models.Stock.color == "黒")
+        ).scalar_one()
+        restocked.number = 2
+        db.commit()
+    assert confirm(client, store1, inStockOnly=True) == [2, 5, 4]
+    assert confirm(client, store2, inStockOnly=True) == [2, 6, 3]
+    # 読み直したのは変更のあった店舗だけ
+    assert stock_cache.store_reloads == store_reloads + 1
+
+    # ロールバックした変更は反映しない
+    with connect.SessionLocal() as db:
+        db.add(models.Stock(store_id=2, product_id=5, color=None, number=9))
+        db.flush()
+        db.rollback()
+    assert confirm(client, store2, inStockOnly=True) == [2, 6, 3]
+    assert stock_cache.store_reloads == store_reloads + 1
+
+    with connect.SessionLocal() as db:
+        db.add(models.Stock(store_id=2, product_id=5, color=None, number=9))
+        db.commit()
+    assert confirm(client, store2, inStockOnly=True) == [2, 5, 6]